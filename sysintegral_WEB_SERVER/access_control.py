@@ -0,0 +1,85 @@
+import threading
+import time
+from typing import Callable, Dict, FrozenSet, Iterable, Optional
+
+from flask_login import UserMixin
+
+
+class Principal(UserMixin):
+    """
+    Usuario autenticado tal como lo ve la autorización: id, nombre, rol, los
+    establecimientos a los que accede y a qué establecimiento pertenece cada silo
+    de esos establecimientos. Es lo que devuelve load_user (current_user), así que
+    los chequeos de permisos son búsquedas en memoria, sin cargar relaciones.
+
+    Es inmutable: si cambian los permisos se descarta del caché y se arma otro.
+    """
+
+    def __init__(self, user_id: int, username: str, role: str, establishment_ids: Iterable[int],
+                 silo_establishments: Dict[int, int], load_establishments: Callable[[FrozenSet[int]], list]):
+        self.id = user_id
+        self.username = username
+        self.role = role
+        self.establishment_ids: FrozenSet[int] = frozenset(establishment_ids)
+        self.silo_establishments = silo_establishments
+        self._load_establishments = load_establishments
+
+    @property
+    def is_super_admin(self) -> bool:
+        return self.role == 'super_admin'
+
+    def can_access_establishment(self, establishment_id) -> bool:
+        if self.is_super_admin:
+            return True
+        return establishment_id in self.establishment_ids
+
+    def can_access_silo(self, silo_id) -> bool:
+        if self.is_super_admin:
+            return True
+        return self.silo_establishments.get(silo_id) in self.establishment_ids
+
+    @property
+    def establishments(self) -> list:
+        """Establecimientos del usuario (consulta la BD; para chequear acceso usar establishment_ids)"""
+        return self._load_establishments(self.establishment_ids)
+
+
+class PrincipalCache:
+    """
+    Principals por id de usuario, reutilizados entre requests durante `ttl` segundos.
+
+    `build(user_id)` arma el principal desde la BD (None si el usuario no existe,
+    y eso no se guarda). Al cambiar usuarios, membresías o silos se invalidan las
+    entradas afectadas; con varios procesos cada uno tiene su caché y el ttl acota
+    cuánto tarda en verse un cambio hecho en otro proceso.
+    """
+
+    def __init__(self, build: Callable[[int], Optional[Principal]], ttl: float):
+        self.build = build
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self._entries: Dict[int, tuple] = {}
+        self._generation = 0  # cambia con cada invalidación
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        with self.lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl:
+                return entry[0]
+            generation = self._generation
+        principal = self.build(user_id)
+        if principal is not None:
+            with self.lock:
+                # Si hubo una invalidación mientras se armaba, puede estar desactualizado
+                if generation == self._generation:
+                    self._entries[user_id] = (principal, time.monotonic())
+        return principal
+
+    def invalidate(self, user_id: Optional[int] = None):
+        """Descarta un usuario (o todos si user_id es None)"""
+        with self.lock:
+            self._generation += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
@@ -0,0 +1,84 @@
+import base64
+import json
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+
+
+def encode_cursor(value: Any, item_id: int) -> str:
+    """Cursor opaco (apto para URL) con la clave de orden (valor, id) de una fila"""
+    raw = json.dumps([value, item_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """Inversa de encode_cursor; ValueError si el cursor no es válido"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, item_id = json.loads(raw)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Cursor inválido: {cursor}') from e
+    if not isinstance(item_id, int):
+        raise ValueError(f'Cursor inválido: {cursor}')
+    return value, item_id
+
+
+def prefix_pattern(search: str) -> str:
+    """Patrón LIKE 'texto%' con los comodines escapados (se usa con escape='\\')"""
+    escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped + '%'
+
+
+class KeysetPage:
+    """
+    Una página de un listado ordenado por (columna, id), con los cursores para
+    pedir la anterior (before) y la siguiente (after); None si no hay.
+    """
+
+    def __init__(self, items: List, per_page: int, search: str = '',
+                 next_cursor: Optional[str] = None, prev_cursor: Optional[str] = None):
+        self.items = items
+        self.per_page = per_page
+        self.search = search
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def paginate(session, stmt, sort_column, id_column, per_page: int, search: str = '',
+             after: Optional[str] = None, before: Optional[str] = None) -> KeysetPage:
+    """
+    Pagina `stmt` (un select de un modelo) por cursor sobre (sort_column, id_column).
+
+    La búsqueda es por prefijo sobre sort_column, así que filtro y orden usan el
+    mismo índice y cada página cuesta lo mismo sin importar en cuál se esté.
+    Con `before` se lee hacia atrás desde ese cursor (página anterior).
+    """
+    if search:
+        stmt = stmt.where(sort_column.like(prefix_pattern(search), escape='\\'))
+
+    key = tuple_(sort_column, id_column)
+    backwards = before is not None
+    if backwards:
+        stmt = stmt.where(key < tuple_(*decode_cursor(before)))
+        stmt = stmt.order_by(sort_column.desc(), id_column.desc())
+    else:
+        if after is not None:
+            stmt = stmt.where(key > tuple_(*decode_cursor(after)))
+        stmt = stmt.order_by(sort_column, id_column)
+
+    items = list(session.execute(stmt.limit(per_page + 1)).unique().scalars())
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    if backwards:
+        items.reverse()
+
+    def cursor_of(item):
+        return encode_cursor(getattr(item, sort_column.key), getattr(item, id_column.key))
+
+    next_cursor = prev_cursor = None
+    if items:
+        if has_more or backwards:
+            next_cursor = cursor_of(items[-1])
+        if (has_more and backwards) or after is not None:
+            prev_cursor = cursor_of(items[0])
+    return KeysetPage(items, per_page, search, next_cursor=next_cursor, prev_cursor=prev_cursor)
@@ -1,17 +1,43 @@
-from datetime import datetime, timedelta
-import pytz
-from sqlalchemy import func, or_, desc
-from flask import Flask, render_template, request, redirect, url_for, flash, session, abort, jsonify, get_flashed_messages, current_app
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, or_, and_, desc, insert, text, inspect, update, select, tuple_, event, delete, cast, false, true, case, literal
+from sqlalchemy.orm import with_loader_criteria, lazyload, joinedload, selectinload
+from flask import Flask, render_template, request, redirect, url_for, flash, session, abort, jsonify, get_flashed_messages, current_app, Response, stream_with_context, g, has_request_context
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from functools import wraps
 from werkzeug.security import generate_password_hash, check_password_hash
 import requests
 from weather_cache import WeatherCache
+from telemetry_archive import TelemetryArchive
+from background_jobs import PeriodicJob
+from db_routing import REPLICA_BIND, ReplicaMonitor, RoutingSession, read_replica
+from compact_readings import AssignmentTimeline, encode_temperature, decode_temperature, to_epoch, from_epoch
+from ts_compression import CompressionRegistry, RECONSTRUCTION, resample
+from downsampling import downsample
+import heartbeat_bitmap
+import decision_history
+import silo_audit
+from access_control import Principal, PrincipalCache
+import admin_listing
+import provisioning
+from fleet_status import FleetStatusCache
+from live_updates import LiveCursor, format_event
+import time_service
+import production_analytics
+from sensor_stats import BarLayout, SensorState, SensorStatsRegistry
+import atexit
 import os
+import socket
 from dotenv import load_dotenv
 import json
+import heapq
+import csv
+import io
+import threading
+import time
 
 
 def format_datetime(dt, format='%Y-%m-%d %H:%M:%S'):
@@ -19,23 +45,14 @@ def format_datetime(dt, format='%Y-%m-%d %H:%M:%S'):
     if dt is None:
         return None
     if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=pytz.timezone('America/Argentina/Buenos_Aires'))
+        dt = time_service.localize(dt)
     return dt.strftime(format)
 
 def get_argentina_time():
     """
     Obtiene la hora actual de Argentina de forma explícita
     """
-    utc_now = datetime.utcnow()
-    utc_tz = pytz.UTC
-    utc_time = utc_tz.localize(utc_now)
-    argentina_tz = pytz.timezone('America/Argentina/Buenos_Aires')
-    argentina_time = utc_time.astimezone(argentina_tz)
-    
-    # Log para debug
-    app.logger.info(f"DEBUG get_argentina_time - UTC: {utc_time}, Argentina: {argentina_time}")
-    
-    return argentina_time
+    return time_service.now_local()
 
 def get_slot_name(minute):
     """
@@ -86,11 +103,103 @@ else:
 
 print(f"Database URI: mysql+pymysql://{MYSQL_USER}:****@{MYSQL_HOST}/{MYSQL_DATABASE}")
 
-# Configurar la URI de la base de datos
-app.config['SQLALCHEMY_DATABASE_URI'] = f'mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{MYSQL_DATABASE}'
+# Configurar la URI de la base de datos (DATABASE_URI permite usar otra, p. ej. SQLite en local)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URI') or f'mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}/{MYSQL_DATABASE}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-db = SQLAlchemy(app)
+# Réplica de lectura opcional para las vistas pesadas (reportes, historiales)
+if os.environ.get('REPLICA_DATABASE_URI'):
+    app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: os.environ['REPLICA_DATABASE_URI']}
+# Retraso máximo aceptado de la réplica; si se supera, las lecturas van al primario
+app.config['REPLICA_MAX_LAG'] = float(os.environ.get('REPLICA_MAX_LAG', 30))  # segundos
+app.config['REPLICA_HEARTBEAT_INTERVAL'] = int(os.environ.get('REPLICA_HEARTBEAT_INTERVAL', 5))  # segundos
+
+# Archivo frío de telemetría (lecturas y tiempos de funcionamiento antiguos)
+app.config['ARCHIVE_DIR'] = os.environ.get('ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive'))
+app.config['ARCHIVE_AFTER_DAYS'] = int(os.environ.get('ARCHIVE_AFTER_DAYS', 365))
+app.config['ARCHIVE_CHUNK_SIZE'] = int(os.environ.get('ARCHIVE_CHUNK_SIZE', 5000))
+
+# Formato de almacenamiento de lecturas de temperatura: 'legacy' (lectura_temperatura)
+# o 'compact' (lectura_temperatura_compacta, epoch + centésimas de grado)
+app.config['READING_STORAGE_MODE'] = os.environ.get('READING_STORAGE_MODE', 'legacy')
+# Payload crudo de las lecturas: 0 = no se guarda, 1 = todas, N = una de cada N por sensor
+app.config['RAW_PAYLOAD_SAMPLE_RATE'] = int(os.environ.get('RAW_PAYLOAD_SAMPLE_RATE', 0))
+# Cantidad de procesos que atienden la app (workers de PythonAnywhere o gunicorn)
+app.config['WEB_WORKERS'] = int(os.environ.get('WEB_WORKERS', os.environ.get('WEB_CONCURRENCY', 1)))
+# Compresión de lecturas al ingresar: 'none', 'deadband' o 'swinging_door'. El estado
+# vive en memoria: todas las lecturas deben llegar a un único proceso (ver ts_compression.py),
+# así que no se puede habilitar con WEB_WORKERS > 1
+app.config['TEMP_COMPRESSION'] = os.environ.get('TEMP_COMPRESSION', 'none')
+app.config['TEMP_COMPRESSION_TOLERANCE'] = float(os.environ.get('TEMP_COMPRESSION_TOLERANCE', 0.2))  # °C
+# Máximo entre puntos guardados de un sensor estable; como mucho la mitad de la ventana
+# en la que un sensor se muestra 'activo', para que su última lectura guardada no envejezca
+SENSOR_ACTIVE_WINDOW = timedelta(minutes=30)
+app.config['TEMP_COMPRESSION_MAX_INTERVAL'] = min(
+    int(os.environ.get('TEMP_COMPRESSION_MAX_INTERVAL', 900)), int(SENSOR_ACTIVE_WINDOW.total_seconds()) // 2
+)  # segundos
+# Cada cuántos segundos se guardan las muestras retenidas por swinging door de sensores que dejaron de reportar
+app.config['TEMP_COMPRESSION_FLUSH_INTERVAL'] = int(os.environ.get('TEMP_COMPRESSION_FLUSH_INTERVAL', 60))
+
+# Estadísticas por sensor calculadas al recibir lecturas y umbrales de alertas
+app.config['SENSOR_STATS_HALFLIFE'] = int(os.environ.get('SENSOR_STATS_HALFLIFE', 6 * 3600))  # segundos
+app.config['SENSOR_STATS_HOTSPOT_DELTA'] = float(os.environ.get('SENSOR_STATS_HOTSPOT_DELTA', 3.0))  # °C sobre el resto de la barra
+app.config['SENSOR_STATS_RISING_RATE'] = float(os.environ.get('SENSOR_STATS_RISING_RATE', 1.0))  # °C por día
+app.config['SENSOR_STATS_GRADIENT_DELTA'] = float(os.environ.get('SENSOR_STATS_GRADIENT_DELTA', 5.0))  # °C entre posiciones vecinas
+app.config['SENSOR_STATS_CHECKPOINT_INTERVAL'] = int(os.environ.get('SENSOR_STATS_CHECKPOINT_INTERVAL', 300))  # segundos
+# Cada cuánto se recarga la disposición de barras (la de este proceso se recarga al cambiarla)
+app.config['SENSOR_LAYOUT_REFRESH_INTERVAL'] = int(os.environ.get('SENSOR_LAYOUT_REFRESH_INTERVAL', 60))  # segundos
+
+# Cada cuántos segundos se avanza el resumen diario de disponibilidad de dispositivos
+app.config['AVAILABILITY_JOB_INTERVAL'] = int(os.environ.get('AVAILABILITY_JOB_INTERVAL', 600))
+
+# Auditoría de silos: por defecto se escribe en la misma transacción del cambio;
+# con SILO_AUDIT_ASYNC=true la escribe un hilo en segundo plano después del commit
+app.config['SILO_AUDIT_ASYNC'] = os.environ.get('SILO_AUDIT_ASYNC', 'false').lower() == 'true'
+app.config['SILO_AUDIT_WRITER_INTERVAL'] = int(os.environ.get('SILO_AUDIT_WRITER_INTERVAL', 2))  # segundos
+app.config['SILO_AUDIT_WRITER_BATCH'] = int(os.environ.get('SILO_AUDIT_WRITER_BATCH', 1000))
+
+# Cada cuántos segundos se recalcula el estado online/warning/offline de las placas
+app.config['DEVICE_STATUS_SWEEP_INTERVAL'] = int(os.environ.get('DEVICE_STATUS_SWEEP_INTERVAL', 30))
+
+# Panel de silos de user_silo_settings: establecimientos por página y vigencia del estado calculado
+app.config['SILO_DASHBOARD_PAGE_SIZE'] = int(os.environ.get('SILO_DASHBOARD_PAGE_SIZE', 3))
+app.config['SILO_DASHBOARD_CACHE_TTL'] = int(os.environ.get('SILO_DASHBOARD_CACHE_TTL', 120))  # segundos
+
+# Historial de cambios de silos: filas por página (se cargan más al bajar)
+app.config['SILO_CHANGE_LOG_PAGE_SIZE'] = int(os.environ.get('SILO_CHANGE_LOG_PAGE_SIZE', 100))
+
+# Listados de administración (usuarios, establecimientos, silos, placas, sensores y barras): filas por página
+app.config['ADMIN_PAGE_SIZE'] = int(os.environ.get('ADMIN_PAGE_SIZE', 50))
+
+# Stream de valores en vivo (/api/live). Cada conexión ocupa un worker mientras dura, así
+# que solo se habilita con un servidor con hilos o asíncrono (no con los workers
+# sincrónicos de PythonAnywhere); deshabilitado, las páginas consultan periódicamente.
+app.config['LIVE_STREAM_ENABLED'] = os.environ.get('LIVE_STREAM_ENABLED', 'false').lower() == 'true'
+# Duración máxima de cada conexión (el navegador se reconecta solo y se recalculan los
+# permisos), cada cuánto se consulta la tabla compartida y cada cuánto se envía un ping
+app.config['LIVE_STREAM_MAX_AGE'] = int(os.environ.get('LIVE_STREAM_MAX_AGE', 300))  # segundos
+app.config['LIVE_STREAM_POLL'] = int(os.environ.get('LIVE_STREAM_POLL', 2))  # segundos
+app.config['LIVE_STREAM_PING'] = int(os.environ.get('LIVE_STREAM_PING', 15))  # segundos
+
+# Vigencia (segundos) de los permisos cacheados de cada usuario (ver access_control.py)
+app.config['PRINCIPAL_CACHE_TTL'] = int(os.environ.get('PRINCIPAL_CACHE_TTL', 60))
+
+# Alta masiva (/api/provisioning): máximo de filas por archivo
+app.config['PROVISIONING_MAX_ROWS'] = int(os.environ.get('PROVISIONING_MAX_ROWS', 2000))
+
+# Cada cuántos segundos se recalcula el estado de la flota que muestra la barra de navegación
+app.config['FLEET_STATUS_INTERVAL'] = int(os.environ.get('FLEET_STATUS_INTERVAL', 5))
+
+# Borrado en segundo plano de los datos de silos y establecimientos eliminados
+app.config['PURGE_BATCH_SIZE'] = int(os.environ.get('PURGE_BATCH_SIZE', 5000))  # filas por transacción
+app.config['PURGE_JOB_INTERVAL'] = int(os.environ.get('PURGE_JOB_INTERVAL', 30))  # segundos
+# Reintentos de una tarea con error: espera de PURGE_RETRY_DELAY segundos que se duplica en cada intento
+app.config['PURGE_MAX_ATTEMPTS'] = int(os.environ.get('PURGE_MAX_ATTEMPTS', 5))
+app.config['PURGE_RETRY_DELAY'] = int(os.environ.get('PURGE_RETRY_DELAY', 60))  # segundos
+# Lease de una tarea de borrado: si su worker no lo renueva en este tiempo, otro la retoma
+app.config['PURGE_LEASE'] = int(os.environ.get('PURGE_LEASE', 300))  # segundos
+
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
 
 # Tablas de equilibrio de humedad para granos.
 # Formato: {Temperatura: {Humedad Relativa: Contenido de Humedad de Equilibrio (%)}}
@@ -156,6 +265,32 @@ def super_admin_required(f):
 # Crear instancia global del caché de pronósticos
 weather_cache = WeatherCache(max_establishments=20)
 
+# Archivo frío de telemetría
+telemetry_archive = TelemetryArchive(app.config['ARCHIVE_DIR'])
+
+# Estado de compresión de lecturas de temperatura por sensor
+if app.config['TEMP_COMPRESSION'] != 'none' and app.config['WEB_WORKERS'] > 1:
+    raise RuntimeError(
+        f"TEMP_COMPRESSION={app.config['TEMP_COMPRESSION']} requiere un único proceso "
+        f"y WEB_WORKERS={app.config['WEB_WORKERS']}; usar TEMP_COMPRESSION=none"
+    )
+temperature_compressor = CompressionRegistry(
+    app.config['TEMP_COMPRESSION'],
+    tolerance=app.config['TEMP_COMPRESSION_TOLERANCE'],
+    max_interval=app.config['TEMP_COMPRESSION_MAX_INTERVAL']
+)
+
+# Estadísticas en memoria por sensor y alertas por barra (punto caliente, tendencia, gradiente)
+sensor_statistics = SensorStatsRegistry(
+    halflife=app.config['SENSOR_STATS_HALFLIFE'],
+    hotspot_delta=app.config['SENSOR_STATS_HOTSPOT_DELTA'],
+    rising_rate_per_day=app.config['SENSOR_STATS_RISING_RATE'],
+    gradient_delta=app.config['SENSOR_STATS_GRADIENT_DELTA']
+)
+
+# Resultados de /api/produccion/analytics, invalidados por granja al recibir datos
+production_cache = production_analytics.AnalyticsCache(ttl=300)
+
 # Tabla de relación muchos a muchos entre usuarios y establecimientos
 user_establishments = db.Table('user_establishments',
     db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
@@ -170,7 +305,7 @@ class User(UserMixin, db.Model):
     created_by_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     
     establishments = db.relationship('Establishment', secondary=user_establishments, 
-                                   lazy='subquery', backref=db.backref('users', lazy=True))
+                                   lazy='select', backref=db.backref('users', lazy=True))
     created_users = db.relationship('User', backref=db.backref('created_by', remote_side=[id]))
 
     def set_password(self, password):
@@ -200,7 +335,9 @@ class Establishment(db.Model):
     # Nuevos campos para la corriente máxima y el sensor
     max_operating_current = db.Column(db.Float, nullable=True) 
     current_sensor_id = db.Column(db.String(80), nullable=True) # ID del sensor de corriente
+    deleted_at = db.Column(db.DateTime, nullable=True)  # eliminado; los datos se borran en segundo plano
     silos = db.relationship('Silo', backref='establishment', lazy=True, cascade='all, delete-orphan')
+    __table_args__ = (db.Index('ix_establishment_name_id', 'name', 'id'),)
 
 class Silo(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -217,13 +354,17 @@ class Silo(db.Model):
     aerator_position = db.Column(db.Integer, nullable=False)  # Posición del aireador (1-8)
     modified = db.Column(db.Boolean, default=False)
     manual_mode = db.Column(db.String(10), default='auto')  # 'auto', 'on', 'off'
-    __table_args__ = (db.UniqueConstraint('establishment_id', 'aerator_position', name='unique_aerator_position'),)
+    deleted_at = db.Column(db.DateTime, nullable=True)  # eliminado; los datos se borran en segundo plano
+    __table_args__ = (
+        db.UniqueConstraint('establishment_id', 'aerator_position', name='unique_aerator_position'),
+        db.Index('ix_silo_name_id', 'name', 'id'),
+    )
 
 class SiloChangeLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     silo_id = db.Column(db.Integer, db.ForeignKey('silo.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    timestamp = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.timezone('America/Argentina/Buenos_Aires')))
+    timestamp = db.Column(db.DateTime, nullable=False, default=time_service.now_local)
     field_changed = db.Column(db.String(50), nullable=False)
     old_value = db.Column(db.String(100), nullable=False)
     new_value = db.Column(db.String(100), nullable=False)
@@ -231,39 +372,74 @@ class SiloChangeLog(db.Model):
     silo = db.relationship('Silo', backref=db.backref('change_logs', lazy=True))
     user = db.relationship('User', backref=db.backref('silo_changes', lazy=True))
 
+    # Orden del historial (timestamp, id) descendente, general y por silo
+    __table_args__ = (
+        db.Index('ix_silo_change_log_ts_id', 'timestamp', 'id'),
+        db.Index('ix_silo_change_log_silo_ts_id', 'silo_id', 'timestamp', 'id'),
+    )
+
 class Board(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     mac_address = db.Column(db.String(17), unique=True, nullable=False)  # Format: XX:XX:XX:XX:XX:XX
-    registration_date = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.timezone('America/Argentina/Buenos_Aires')))
+    registration_date = db.Column(db.DateTime, nullable=False, default=time_service.now_local)
     establishment_id = db.Column(db.Integer, db.ForeignKey('establishment.id'), nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=True)  # eliminada junto con su establecimiento
     establishment = db.relationship('Establishment', backref=db.backref('boards', lazy=True))
 
 class DeviceHeartbeat(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     mac_address = db.Column(db.String(17), db.ForeignKey('board.mac_address'), nullable=False)
-    last_heartbeat = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.timezone('America/Argentina/Buenos_Aires')))
+    last_heartbeat = db.Column(db.DateTime, nullable=False, default=time_service.now_local)
     status = db.Column(db.String(20), nullable=False, default='offline')  # online, offline, warning
     firmware_version = db.Column(db.String(10), nullable=True)  # Versión del firmware
     board = db.relationship('Board', backref=db.backref('heartbeat', uselist=False))
 
+class DeviceStatusTransition(db.Model):
+    """Cambios de estado de una placa registrados por sweep_device_status"""
+    __tablename__ = 'device_status_transition'
+    id = db.Column(db.Integer, primary_key=True)
+    mac_address = db.Column(db.String(17), db.ForeignKey('board.mac_address'), nullable=False)
+    from_status = db.Column(db.String(20), nullable=False)
+    to_status = db.Column(db.String(20), nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)    # cuándo ocurrió (según el último heartbeat)
+    detected_at = db.Column(db.DateTime, nullable=False)  # cuándo lo detectó el barrido
+    __table_args__ = (db.Index('ix_device_status_transition_mac_ts', 'mac_address', 'timestamp'),)
+
 class Esp32Reboot(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     mac_address = db.Column(db.String(17), db.ForeignKey('board.mac_address'), nullable=False)
-    reboot_time = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.timezone('America/Argentina/Buenos_Aires')))
+    reboot_time = db.Column(db.DateTime, nullable=False, default=time_service.now_local)
     reason = db.Column(db.String(100), nullable=True)  # Razón del reinicio (si se proporciona)
     board = db.relationship('Board', backref=db.backref('reboots', lazy=True))
 
 class AeratorRuntime(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     silo_id = db.Column(db.Integer, db.ForeignKey('silo.id'), nullable=False)
-    timestamp = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.timezone('America/Argentina/Buenos_Aires')))
+    timestamp = db.Column(db.DateTime, nullable=False, default=time_service.now_local)
     runtime_hours = db.Column(db.Float, nullable=False)  # Duración en horas
     silo = db.relationship('Silo', backref=db.backref('runtimes', lazy=True))
 
+class AeratorRuntimeDaily(db.Model):
+    """Libro de horas de aireación: total diario por silo (se actualiza junto con AeratorRuntime)"""
+    __tablename__ = 'aerator_runtime_daily'
+    silo_id = db.Column(db.Integer, db.ForeignKey('silo.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    runtime_hours = db.Column(db.Float, nullable=False, default=0)
+    runs = db.Column(db.Integer, nullable=False, default=0)
+
+class AeratorRuntimeTotal(db.Model):
+    """Total histórico de horas de aireación por silo y último registro"""
+    __tablename__ = 'aerator_runtime_total'
+    silo_id = db.Column(db.Integer, db.ForeignKey('silo.id'), primary_key=True)
+    total_hours = db.Column(db.Float, nullable=False, default=0)
+    runs = db.Column(db.Integer, nullable=False, default=0)
+    last_runtime_at = db.Column(db.DateTime, nullable=True)
+    last_duration = db.Column(db.Float, nullable=True)
+
 class ProtectionAlert(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     silo_id = db.Column(db.Integer, db.ForeignKey('silo.id'), nullable=False)
-    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    timestamp = db.Column(db.DateTime, nullable=False, default=time_service.now_naive)
     active = db.Column(db.Boolean, default=True)
     
     silo = db.relationship('Silo', backref=db.backref('protection_alerts', lazy=True))
@@ -272,7 +448,7 @@ class DeviceActionLog(db.Model):
     """Registro de acciones/intentos de los ESP32 (encender/apagar aireadores)"""
     id = db.Column(db.Integer, primary_key=True)
     mac_address = db.Column(db.String(17), db.ForeignKey('board.mac_address'), nullable=False)
-    timestamp = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.timezone('America/Argentina/Buenos_Aires')))
+    timestamp = db.Column(db.DateTime, nullable=False, default=time_service.now_local)
     action = db.Column(db.String(10), nullable=False)  # 'ON', 'OFF'
     position = db.Column(db.Integer, nullable=False)  # Posición del aireador (1-8)
     result = db.Column(db.String(20), nullable=False)  # 'success', 'error'
@@ -281,18 +457,110 @@ class DeviceActionLog(db.Model):
     board = db.relationship('Board', backref=db.backref('action_logs', lazy=True))
 
 class DeviceHeartbeatHistory(db.Model):
-    """Historial de heartbeats cada 20 minutos, retenido por 7 días"""
+    """
+    Historial de heartbeats cada 20 minutos (formato anterior, una fila por slot).
+    Ya no se escribe: se reemplazó por DeviceHeartbeatBitmap y solo se lee para migrar.
+    """
     id = db.Column(db.Integer, primary_key=True)
     mac_address = db.Column(db.String(17), db.ForeignKey('board.mac_address'), nullable=False)
-    timestamp = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.timezone('America/Argentina/Buenos_Aires')))
+    timestamp = db.Column(db.DateTime, nullable=False, default=time_service.now_local)
     
     board = db.relationship('Board', backref=db.backref('heartbeat_history', lazy=True))
 
+class DeviceHeartbeatBitmap(db.Model):
+    """
+    Presencia de heartbeats por dispositivo y día: un bit por slot de 20 minutos
+    (72 por día), repartidos en dos columnas de 36 bits. Retenido por 7 días.
+    """
+    __tablename__ = 'device_heartbeat_bitmap'
+    mac_address = db.Column(db.String(17), db.ForeignKey('board.mac_address'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    slots_am = db.Column(db.BigInteger, nullable=False, default=0)  # slots 0-35 (00:00 a 11:59)
+    slots_pm = db.Column(db.BigInteger, nullable=False, default=0)  # slots 36-71 (12:00 a 23:59)
+
+    @property
+    def bitmap(self):
+        return heartbeat_bitmap.combine(self.slots_am, self.slots_pm)
+
+class DeviceAvailabilityDaily(db.Model):
+    """Resumen diario por dispositivo: slots de heartbeat recibidos/esperados y reinicios"""
+    __tablename__ = 'device_availability_daily'
+    mac_address = db.Column(db.String(17), db.ForeignKey('board.mac_address'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True, index=True)
+    received_slots = db.Column(db.SmallInteger, nullable=False, default=0)
+    expected_slots = db.Column(db.SmallInteger, nullable=False, default=0)
+    reboot_count = db.Column(db.Integer, nullable=False, default=0)
+    reboot_reasons = db.Column(db.Text, nullable=True)  # JSON {razón: cantidad}
+    updated_at = db.Column(db.DateTime, nullable=False, default=time_service.now_local)
+
+class ScheduleDecision(db.Model):
+    """
+    Programa de aireación calculado por get_24h_states para un establecimiento y
+    una hora, como máscaras de 8 bits (un bit por posición de aireador). Se agrega
+    una revisión solo cuando cambia respecto de la anterior para esa hora.
+    """
+    __tablename__ = 'schedule_decision'
+    establishment_id = db.Column(db.Integer, db.ForeignKey('establishment.id'), primary_key=True)
+    hour_ts = db.Column(db.Integer, primary_key=True)      # inicio de la hora, segundos epoch
+    computed_ts = db.Column(db.Integer, primary_key=True)  # cuándo se calculó, segundos epoch
+    silo_mask = db.Column(db.SmallInteger, nullable=False)    # posiciones con silo
+    on_mask = db.Column(db.SmallInteger, nullable=False)      # posiciones encendidas
+    forced_mask = db.Column(db.SmallInteger, nullable=False)  # posiciones apagadas a la fuerza
+    # Motivos de apagado por posición, un nibble cada una (decision_history.FORCED_OFF_REASONS)
+    position_reasons = db.Column(db.BigInteger, nullable=False, default=0)
+    # Formato anterior: motivos de toda la hora, sin distinguir posición (las filas nuevas guardan 0)
+    reasons = db.Column(db.SmallInteger, nullable=False, default=0)
+
+class PurgeTask(db.Model):
+    """
+    Borrado en segundo plano de los datos de un silo o establecimiento eliminado.
+    Guarda el paso en curso y las filas borradas. Un worker toma la tarea con un
+    lease (claimed_by, heartbeat_at) que renueva en cada lote; si el proceso se
+    corta, la tarea sigue en 'running' y otro worker la retoma recién cuando el
+    lease vence (cada paso es idempotente). Una tarea con error se reintenta con
+    espera creciente hasta PURGE_MAX_ATTEMPTS.
+    """
+    __tablename__ = 'purge_task'
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)  # 'silo' o 'establishment'
+    entity_id = db.Column(db.Integer, nullable=False)
+    entity_name = db.Column(db.String(100), nullable=True)
+    requested_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    status = db.Column(db.String(10), nullable=False, default='pending', index=True)  # pending, running, done, error
+    step = db.Column(db.String(50), nullable=True)
+    deleted_rows = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=time_service.now_local)
+    updated_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)  # ejecuciones que terminaron en error
+    claimed_by = db.Column(db.String(64), nullable=True)   # proceso que la está ejecutando
+    heartbeat_at = db.Column(db.DateTime, nullable=True)   # última renovación del lease
+
+class LiveValue(db.Model):
+    """
+    Último valor de cada clave en vivo (corriente, temperatura, estado de placa) para
+    /api/live, compartido por todos los procesos. La versión solo avanza cuando el
+    valor cambia, así los streams solo envían cambios.
+    """
+    __tablename__ = 'live_value'
+    kind = db.Column(db.String(20), primary_key=True)   # 'corriente', 'temperatura' o 'estado'
+    ident = db.Column(db.String(64), primary_key=True)  # device_id, sensor_id o mac_address
+    # La versión va antes que el valor: el upsert de MySQL asigna en el orden de las columnas
+    version = db.Column(db.BigInteger, nullable=False, index=True)  # milisegundos epoch del cambio
+    value = db.Column(db.Text, nullable=False)           # JSON
+
+class ReplicationHeartbeat(db.Model):
+    """Marca de tiempo que escribe el primario para medir el retraso de la réplica"""
+    __tablename__ = 'replication_heartbeat'
+    id = db.Column(db.Integer, primary_key=True)
+    ts = db.Column(db.Integer, nullable=False)  # segundos epoch (UTC)
+
 class GlobalAeratorControl(db.Model):
     """Control global de aireadores - permite al super_admin desactivar todos los aireadores"""
     id = db.Column(db.Integer, primary_key=True)
     enabled = db.Column(db.Boolean, default=True, nullable=False)  # True = aireadores pueden funcionar, False = todos desactivados
-    last_modified = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.timezone('America/Argentina/Buenos_Aires')))
+    last_modified = db.Column(db.DateTime, nullable=False, default=time_service.now_local)
     modified_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     
     modified_by = db.relationship('User', backref=db.backref('global_aerator_modifications', lazy=True))
@@ -305,16 +573,77 @@ class LecturaTemperatura(db.Model):
     barra_id = db.Column(db.Integer, db.ForeignKey('barra_sensores.id'), nullable=True)
     silo_id = db.Column(db.Integer, db.ForeignKey('silo.id'), nullable=True)
     temperatura = db.Column(db.Float, nullable=False)
-    timestamp = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.timezone('America/Argentina/Buenos_Aires')))
+    timestamp = db.Column(db.DateTime, nullable=False, default=time_service.now_local)
     raw_payload = db.Column(db.Text, nullable=True)
 
     sensor = db.relationship('SensorTemperatura', backref=db.backref('lecturas', lazy=True))
     barra = db.relationship('BarraSensores', backref=db.backref('lecturas', lazy=True))
     silo = db.relationship('Silo', backref=db.backref('lecturas', lazy=True))
 
+    __table_args__ = (
+        db.Index('ix_lectura_temperatura_sensor_ts', 'sensor_id', 'timestamp'),
+    )
+
     def __repr__(self):
         return f'<LecturaTemperatura sensor_id={self.sensor_id} temp={self.temperatura} t={self.timestamp}>'
 
+class LecturaTemperaturaCompacta(db.Model):
+    """
+    Lectura de temperatura en formato compacto: timestamp en segundos epoch y
+    temperatura en centésimas de grado. La barra y el silo solo se guardan cuando
+    no coinciden con el historial de asignaciones (mapeo_explicito=True).
+    """
+    __tablename__ = 'lectura_temperatura_compacta'
+    id = db.Column(db.Integer, primary_key=True)
+    sensor_id = db.Column(db.Integer, db.ForeignKey('sensor_temperatura.id'), nullable=False)
+    ts = db.Column(db.Integer, nullable=False)  # segundos epoch (UTC)
+    temp_centi = db.Column(db.SmallInteger, nullable=False)  # temperatura * 100
+    mapeo_explicito = db.Column(db.Boolean, nullable=False, default=False)
+    barra_id = db.Column(db.Integer, nullable=True)
+    silo_id = db.Column(db.Integer, nullable=True)
+    raw_payload = db.Column(db.Text, nullable=True)  # solo para lecturas muestreadas
+
+    __table_args__ = (
+        db.Index('ix_lectura_compacta_sensor_ts', 'sensor_id', 'ts'),
+    )
+
+    @property
+    def temperatura(self):
+        return decode_temperature(self.temp_centi)
+
+    @property
+    def timestamp(self):
+        return from_epoch(self.ts)
+
+    def __repr__(self):
+        return f'<LecturaTemperaturaCompacta sensor_id={self.sensor_id} temp={self.temperatura} ts={self.ts}>'
+
+class SensorAsignacionHistorial(db.Model):
+    """Intervalos de asignación de cada sensor a barra/silo (hasta=None es la asignación vigente)"""
+    __tablename__ = 'sensor_asignacion_historial'
+    id = db.Column(db.Integer, primary_key=True)
+    sensor_id = db.Column(db.Integer, db.ForeignKey('sensor_temperatura.id'), nullable=False, index=True)
+    barra_id = db.Column(db.Integer, nullable=True)
+    silo_id = db.Column(db.Integer, nullable=True)
+    desde = db.Column(db.Integer, nullable=False)  # segundos epoch
+    hasta = db.Column(db.Integer, nullable=True)   # segundos epoch, exclusivo
+
+class SensorStatsCheckpoint(db.Model):
+    """
+    Último checkpoint de las estadísticas en memoria de cada sensor (ver sensor_stats.py).
+    Es el estado compartido entre procesos: gana siempre el de ``ultimo_ts`` más nuevo.
+    """
+    __tablename__ = 'sensor_stats_checkpoint'
+    sensor_id = db.Column(db.Integer, db.ForeignKey('sensor_temperatura.id'), primary_key=True)
+    media = db.Column(db.Float, nullable=False)
+    varianza = db.Column(db.Float, nullable=False)
+    tasa = db.Column(db.Float, nullable=False)  # °C por hora
+    ultimo_valor = db.Column(db.Float, nullable=False)
+    lecturas = db.Column(db.Integer, nullable=False)
+    # Última columna: MySQL aplica el ON DUPLICATE KEY UPDATE en orden y las demás
+    # columnas se comparan contra el ultimo_ts anterior
+    ultimo_ts = db.Column(db.Integer, nullable=False)  # segundos epoch
+
 class SensorTemperatura(db.Model):
     __tablename__ = 'sensor_temperatura'
     id = db.Column(db.Integer, primary_key=True)
@@ -396,48 +725,364 @@ class EggData(db.Model):
     __tablename__ = 'egg_data'
     id = db.Column(db.Integer, primary_key=True)
     granja_id = db.Column(db.Integer, nullable=False)
-    timestamp = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.timezone('America/Argentina/Buenos_Aires')))
+    timestamp = db.Column(db.DateTime, nullable=False, default=time_service.now_local)
+    fecha = db.Column(db.Date, nullable=True)  # Fecha local (Argentina) del registro; un registro por granja y día
     galpon_1 = db.Column(db.Integer, nullable=False)
     galpon_2 = db.Column(db.Integer, nullable=False)
     galpon_3 = db.Column(db.Integer, nullable=False)
     galpon_4 = db.Column(db.Integer, nullable=False)
     total = db.Column(db.Integer, nullable=False)
-    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.timezone('America/Argentina/Buenos_Aires')))
+    created_at = db.Column(db.DateTime, nullable=False, default=time_service.now_local)
 
     def __repr__(self):
         return f'<EggData granja_id={self.granja_id} total={self.total} timestamp={self.timestamp}>'
 
+    __table_args__ = (db.Index('uq_egg_data_granja_fecha', 'granja_id', 'fecha', unique=True),)
+
 
 class MortalityData(db.Model):
     """Modelo para almacenar datos de mortalidad de granjas"""
     __tablename__ = 'mortality_data'
     id = db.Column(db.Integer, primary_key=True)
     granja_id = db.Column(db.Integer, nullable=False)
-    timestamp = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.timezone('America/Argentina/Buenos_Aires')))
+    timestamp = db.Column(db.DateTime, nullable=False, default=time_service.now_local)
+    fecha = db.Column(db.Date, nullable=True)  # Fecha local (Argentina) del registro; un registro por granja y día
     galpon_1 = db.Column(db.Integer, nullable=False)
     galpon_2 = db.Column(db.Integer, nullable=False)
     galpon_3 = db.Column(db.Integer, nullable=False)
     galpon_4 = db.Column(db.Integer, nullable=False)
     total = db.Column(db.Integer, nullable=False)
-    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(pytz.timezone('America/Argentina/Buenos_Aires')))
+    created_at = db.Column(db.DateTime, nullable=False, default=time_service.now_local)
 
     def __repr__(self):
         return f'<MortalityData granja_id={self.granja_id} total={self.total} timestamp={self.timestamp}>'
 
+    __table_args__ = (db.Index('uq_mortality_data_granja_fecha', 'granja_id', 'fecha', unique=True),)
+
 def standardize_mac(mac):
     """Estandariza el formato de la dirección MAC"""
     return mac.upper()
 
+def _upsert(model, values, index_elements, update):
+    """
+    Inserta una fila o, si ya existe la clave, la actualiza en una sola sentencia:
+    INSERT ... ON DUPLICATE KEY UPDATE en MySQL y ON CONFLICT DO UPDATE en SQLite.
+    En otros motores se hace fila por fila (ver _upsert_rows).
+
+    Args:
+        model: Modelo de la tabla
+        values: Valores de la fila a insertar (o lista de filas, en una sola sentencia)
+        index_elements: Columnas de la clave única que define el conflicto
+        update: Función que recibe la fila propuesta (inserted/excluded) y devuelve
+                {columna: expresión} para actualizar la fila existente
+    """
+    table = model.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        stmt = mysql_insert(table).values(values)
+        stmt = stmt.on_duplicate_key_update(**update(stmt.inserted))
+    elif dialect == 'sqlite':
+        stmt = sqlite_insert(table).values(values)
+        stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_=update(stmt.excluded))
+    else:
+        _upsert_rows(table, values if isinstance(values, list) else [values], index_elements, update)
+        return
+    db.session.execute(stmt)
+
+class _ProposedRow:
+    """Fila propuesta para `update` en _upsert_rows: cada columna como parámetro ligado"""
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    def __getattr__(self, name):
+        return literal(self._row.get(name), type_=self._table.c[name].type)
+
+def _upsert_rows(table, rows, index_elements, update):
+    """
+    Upsert genérico para motores sin INSERT ... ON CONFLICT: por cada fila un
+    UPDATE por la clave y, si no existía, un INSERT dentro de un savepoint. Si otra
+    transacción insertó la misma clave entre medio, se repite el UPDATE.
+    """
+    for row in rows:
+        key = and_(*(table.c[column] == row[column] for column in index_elements))
+        stmt = table.update().where(key).values(update(_ProposedRow(table, row)))
+        if db.session.execute(stmt).rowcount:
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert().values(row))
+        except IntegrityError:
+            db.session.execute(stmt)
+
+def _ensure_column(model, column_name, ddl):
+    """Agrega una columna a una tabla existente si falta (db.create_all no altera tablas)"""
+    table = model.__tablename__
+    columns = {column['name'] for column in inspect(db.engine).get_columns(table)}
+    if column_name not in columns:
+        db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {column_name} {ddl}'))
+        db.session.commit()
+        app.logger.info(f'Columna {table}.{column_name} agregada')
+        return True
+    return False
+
+def _ensure_index(model, index_name, columns, unique=False):
+    """Crea un índice en una tabla existente si falta"""
+    table = model.__tablename__
+    inspector = inspect(db.engine)
+    existing = {index['name'] for index in inspector.get_indexes(table)}
+    existing |= {constraint['name'] for constraint in inspector.get_unique_constraints(table)}
+    if index_name not in existing:
+        db.session.execute(text(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX {index_name} ON {table} ({', '.join(columns)})"
+        ))
+        db.session.commit()
+        app.logger.info(f'Índice {index_name} creado')
+        return True
+    return False
+
+def migrate_production_dates():
+    """
+    Completa la fecha local de EggData y MortalityData, deja un único registro
+    por (granja_id, fecha) (el último recibido) y crea el índice único.
+
+    En EggData el último registro del día reemplaza a los anteriores. En
+    MortalityData cada registro son bajas distintas, así que antes de borrar los
+    duplicados se suman sus galpones y total en el registro que queda.
+    """
+    mortality_columns = ('galpon_1', 'galpon_2', 'galpon_3', 'galpon_4', 'total')
+    for model in (EggData, MortalityData):
+        _ensure_column(model, 'fecha', 'DATE NULL')
+        db.session.execute(
+            update(model).where(model.fecha.is_(None)).values(fecha=func.date(model.timestamp))
+        )
+        duplicated = db.session.query(model.granja_id, model.fecha, func.max(model.id))\
+            .group_by(model.granja_id, model.fecha).having(func.count(model.id) > 1).all()
+        deleted = 0
+        for granja_id, fecha, keep_id in duplicated:
+            same_day = (model.granja_id == granja_id, model.fecha == fecha)
+            if model is MortalityData:
+                totals = db.session.query(*(func.sum(getattr(model, column)) for column in mortality_columns))\
+                    .filter(*same_day).one()
+                db.session.execute(
+                    update(model).where(model.id == keep_id).values(dict(zip(mortality_columns, totals)))
+                )
+            deleted += model.query.filter(*same_day, model.id != keep_id).delete(synchronize_session=False)
+        db.session.commit()
+        if duplicated:
+            app.logger.info(
+                '%s: %d días duplicados consolidados, %d registros eliminados%s',
+                model.__tablename__, len(duplicated), deleted,
+                ' (bajas sumadas en el registro conservado)' if model is MortalityData else ''
+            )
+        _ensure_index(model, f'uq_{model.__tablename__}_granja_fecha', ['granja_id', 'fecha'], unique=True)
+
+def upsert_production_records(model, granja_id, records):
+    """
+    Inserta o reemplaza registros diarios de producción/mortalidad de una granja
+    con una sola sentencia (clave única granja_id + fecha local). No hace commit.
+
+    Args:
+        model: EggData o MortalityData
+        records: Lista de (timestamp con zona horaria, {galpon_1..galpon_4, total})
+    """
+    argentina_tz = time_service.LOCAL_TZ
+    now = time_service.now_naive()
+    rows = []
+    for timestamp, values in records:
+        local_timestamp = timestamp.astimezone(argentina_tz)
+        rows.append({
+            'granja_id': granja_id,
+            'fecha': local_timestamp.date(),
+            'timestamp': local_timestamp.replace(tzinfo=None),
+            'created_at': now,
+            **values
+        })
+    _upsert(model, rows, ['granja_id', 'fecha'],
+            lambda inserted: {column: getattr(inserted, column) for column in
+                              ('timestamp', 'galpon_1', 'galpon_2', 'galpon_3', 'galpon_4', 'total')})
+    # El caché se invalida recién en el commit (ver _invalidate_production_cache)
+    db.session.info.setdefault('production_changes', set()).add(granja_id)
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _invalidate_production_cache(session):
+    for granja_id in session.info.pop('production_changes', ()):
+        production_cache.invalidate(granja_id)
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _discard_production_changes(session, previous_transaction):
+    session.info.pop('production_changes', None)
+
+def record_runtime(silo_id, runtime_hours, timestamp=None):
+    """
+    Registra un tiempo de funcionamiento y actualiza el libro de horas (total del
+    día y total histórico del silo) en la misma transacción. No hace commit.
+    """
+    timestamp = timestamp or time_service.now_local()
+    runtime = AeratorRuntime(silo_id=silo_id, runtime_hours=runtime_hours, timestamp=timestamp)
+    db.session.add(runtime)
+
+    daily = AeratorRuntimeDaily.__table__
+    _upsert(AeratorRuntimeDaily,
+            {'silo_id': silo_id, 'day': timestamp.date(), 'runtime_hours': runtime_hours, 'runs': 1},
+            ['silo_id', 'day'],
+            lambda inserted: {'runtime_hours': daily.c.runtime_hours + inserted.runtime_hours,
+                              'runs': daily.c.runs + 1})
+    total = AeratorRuntimeTotal.__table__
+    last_runtime_at = timestamp.replace(tzinfo=None)
+    _upsert(AeratorRuntimeTotal,
+            {'silo_id': silo_id, 'total_hours': runtime_hours, 'runs': 1,
+             'last_runtime_at': last_runtime_at, 'last_duration': runtime_hours},
+            ['silo_id'],
+            lambda inserted: {'total_hours': total.c.total_hours + inserted.total_hours,
+                              'runs': total.c.runs + 1,
+                              'last_runtime_at': inserted.last_runtime_at,
+                              'last_duration': inserted.last_duration})
+    return runtime
+
+def rebuild_runtime_ledger():
+    """
+    Reconstruye el libro de horas a partir de AeratorRuntime, incluidas las filas
+    que ya se movieron al archivo frío.
+
+    Returns:
+        int: Cantidad de silos con horas registradas
+    """
+    daily = {}
+    totals = {}
+
+    def add(silo_id, timestamp, hours):
+        key = (silo_id, timestamp.date())
+        day_hours, day_runs = daily.get(key, (0.0, 0))
+        daily[key] = (day_hours + hours, day_runs + 1)
+        total = totals.setdefault(silo_id, {'total_hours': 0.0, 'runs': 0, 'last_runtime_at': None, 'last_duration': None})
+        total['total_hours'] += hours
+        total['runs'] += 1
+        if total['last_runtime_at'] is None or timestamp > total['last_runtime_at']:
+            total['last_runtime_at'] = timestamp
+            total['last_duration'] = hours
+
+    for row in telemetry_archive.iter_rows('aerator_runtime'):
+        add(row['silo_id'], row['timestamp'], row['runtime_hours'])
+    for silo_id, timestamp, hours in db.session.query(
+            AeratorRuntime.silo_id, AeratorRuntime.timestamp, AeratorRuntime.runtime_hours
+    ).yield_per(5000):
+        add(silo_id, timestamp, hours)
+
+    # Solo silos que todavía existen
+    silo_ids = {silo_id for (silo_id,) in db.session.query(Silo.id)}
+    AeratorRuntimeDaily.query.delete()
+    AeratorRuntimeTotal.query.delete()
+    daily_rows = [
+        {'silo_id': silo_id, 'day': day, 'runtime_hours': hours, 'runs': runs}
+        for (silo_id, day), (hours, runs) in daily.items() if silo_id in silo_ids
+    ]
+    total_rows = [{'silo_id': silo_id, **total} for silo_id, total in totals.items() if silo_id in silo_ids]
+    if daily_rows:
+        db.session.execute(insert(AeratorRuntimeDaily), daily_rows)
+    if total_rows:
+        db.session.execute(insert(AeratorRuntimeTotal), total_rows)
+    db.session.commit()
+    return len(total_rows)
+
+def record_heartbeat_slot(mac_address, when):
+    """Marca el slot de 20 minutos de `when` (hora local) en el bitmap del día (sin commit)"""
+    column, bit = heartbeat_bitmap.slot_column(heartbeat_bitmap.slot_index(when))
+    table = DeviceHeartbeatBitmap.__table__
+    values = {'mac_address': mac_address, 'day': when.date(), 'slots_am': 0, 'slots_pm': 0}
+    values[column] = bit
+    _upsert(DeviceHeartbeatBitmap, values, ['mac_address', 'day'],
+            lambda inserted: {column: table.c[column].op('|')(bit)})
+
+def get_heartbeat_bitmaps(mac_addresses, start_day, end_day):
+    """
+    Bitmaps de 72 bits por (mac, día) para varios dispositivos en una sola consulta.
+    Los días sin heartbeats no aparecen en el resultado.
+    """
+    if not mac_addresses:
+        return {}
+    rows = DeviceHeartbeatBitmap.query.filter(
+        DeviceHeartbeatBitmap.mac_address.in_(mac_addresses),
+        DeviceHeartbeatBitmap.day >= start_day,
+        DeviceHeartbeatBitmap.day <= end_day
+    ).all()
+    return {(row.mac_address, row.day): row.bitmap for row in rows}
+
+def migrate_heartbeat_history_to_bitmaps(chunk_size=5000):
+    """
+    Pasa las filas de DeviceHeartbeatHistory a bitmaps diarios y las borra.
+    Cada bloque se migra en una transacción; se puede interrumpir y retomar.
+
+    Returns:
+        int: Cantidad de filas migradas
+    """
+    migrated = 0
+    while True:
+        rows = DeviceHeartbeatHistory.query.order_by(DeviceHeartbeatHistory.id).limit(chunk_size).all()
+        if not rows:
+            break
+        bitmaps = {}
+        for row in rows:
+            key = (row.mac_address, row.timestamp.date())
+            bitmaps[key] = bitmaps.get(key, 0) | 1 << heartbeat_bitmap.slot_index(row.timestamp)
+
+        table = DeviceHeartbeatBitmap.__table__
+        for (mac_address, day), bitmap in bitmaps.items():
+            slots_am, slots_pm = heartbeat_bitmap.split(bitmap)
+            _upsert(DeviceHeartbeatBitmap,
+                    {'mac_address': mac_address, 'day': day, 'slots_am': slots_am, 'slots_pm': slots_pm},
+                    ['mac_address', 'day'],
+                    lambda inserted: {'slots_am': table.c.slots_am.op('|')(inserted.slots_am),
+                                      'slots_pm': table.c.slots_pm.op('|')(inserted.slots_pm)})
+        DeviceHeartbeatHistory.query.filter(
+            DeviceHeartbeatHistory.id.in_([row.id for row in rows])
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        migrated += len(rows)
+    return migrated
+
+def _load_establishments(establishment_ids):
+    return Establishment.query.filter(Establishment.id.in_(establishment_ids)).order_by(Establishment.id).all()
+
+def build_principal(user_id):
+    """Arma el principal de un usuario: rol, establecimientos accesibles y silo -> establecimiento"""
+    row = db.session.query(User.id, User.username, User.role).filter(User.id == user_id).first()
+    if row is None:
+        return None
+    establishment_ids = []
+    silo_establishments = {}
+    if row.role != 'super_admin':
+        establishment_ids = [establishment_id for establishment_id, in db.session.query(Establishment.id)
+                             .join(user_establishments, user_establishments.c.establishment_id == Establishment.id)
+                             .filter(user_establishments.c.user_id == user_id)]
+        if establishment_ids:
+            silo_establishments = dict(db.session.query(Silo.id, Silo.establishment_id)
+                                       .filter(Silo.establishment_id.in_(establishment_ids)).all())
+    return Principal(row.id, row.username, row.role, establishment_ids, silo_establishments, _load_establishments)
+
+principals = PrincipalCache(build_principal, ttl=app.config['PRINCIPAL_CACHE_TTL'])
+
 @login_manager.user_loader
 def load_user(user_id):
-    # Usar db.session.get() en lugar de query.get()
-    return db.session.get(User, int(user_id))
+    # current_user es el principal cacheado: sin consultas mientras siga vigente
+    return principals.get(int(user_id))
 
-def init_db():
-    """Inicializa la base de datos y el caché de pronósticos"""
+def migrate_db():
+    """
+    Crea las tablas que falten y aplica las migraciones de esquema y de datos.
+    Cada paso comprueba si ya se hizo, así que se puede ejecutar en cada arranque.
+    """
     with app.app_context():
         db.create_all()
         
+        # Marca de eliminación de establecimientos, silos y placas (antes de cualquier consulta)
+        try:
+            migrate_soft_delete_columns()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Error al agregar las columnas de eliminación')
+        
         # Crear super_admin si no existe
         if not User.query.filter_by(role='super_admin').first():
             super_admin = User(
@@ -447,25 +1092,164 @@ def init_db():
             super_admin.set_password('admin123')
             db.session.add(super_admin)
             db.session.commit()
-            print('Super administrador creado exitosamente')
-            
+            app.logger.info('Super administrador creado exitosamente')
+        
+        # Construir el libro de horas de aireación la primera vez
+        try:
+            if not AeratorRuntimeTotal.query.first() and AeratorRuntime.query.first():
+                app.logger.info(f'Libro de horas de aireación reconstruido: {rebuild_runtime_ledger()} silos')
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Error al reconstruir el libro de horas de aireación')
+        
+        # Índices del historial de cambios de silos (tablas creadas antes de declararlos)
+        try:
+            _ensure_index(SiloChangeLog, 'ix_silo_change_log_ts_id', ['timestamp', 'id'])
+            _ensure_index(SiloChangeLog, 'ix_silo_change_log_silo_ts_id', ['silo_id', 'timestamp', 'id'])
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Error al crear los índices del historial de cambios')
+        
+        # Índice para la última lectura de cada sensor en la tabla legacy
+        try:
+            _ensure_index(LecturaTemperatura, 'ix_lectura_temperatura_sensor_ts', ['sensor_id', 'timestamp'])
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Error al crear el índice de lecturas por sensor')
+        
+        # Índices de la búsqueda por prefijo de los listados de administración
+        try:
+            _ensure_index(Establishment, 'ix_establishment_name_id', ['name', 'id'])
+            _ensure_index(Silo, 'ix_silo_name_id', ['name', 'id'])
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Error al crear los índices de los listados')
+        
+        # Motivos de apagado por posición en el historial de decisiones
+        try:
+            _ensure_column(ScheduleDecision, 'position_reasons', 'BIGINT NOT NULL DEFAULT 0')
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Error al agregar los motivos por posición')
+        
+        # Fecha local y clave única de los registros de huevos y mortalidad
+        try:
+            migrate_production_dates()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Error al migrar fechas de producción')
+        
+        # Migrar el historial de heartbeats del formato anterior (una fila por slot)
+        try:
+            migrated = migrate_heartbeat_history_to_bitmaps()
+            if migrated:
+                app.logger.info(f'Historial de heartbeats migrado a bitmaps: {migrated} registros')
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Error al migrar historial de heartbeats')
+        
+        # Intentos y lease de las tareas de borrado
+        try:
+            _ensure_column(PurgeTask, 'attempts', 'INTEGER NOT NULL DEFAULT 0')
+            _ensure_column(PurgeTask, 'claimed_by', 'VARCHAR(64) NULL')
+            _ensure_column(PurgeTask, 'heartbeat_at', 'DATETIME NULL')
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Error al agregar los intentos de borrado')
+
+def start_background_jobs():
+    """Inicia el caché de pronósticos y las tareas periódicas de este proceso"""
+    with app.app_context():
         # Iniciar el caché de pronósticos con todos los establecimientos
         establishments = Establishment.query.all()
         weather_cache.start(establishments)
+        
+        # Resumen de disponibilidad de dispositivos (se avanza en segundo plano)
+        availability_job.start(app)
+        
+        # Estado de las placas (único escritor de DeviceHeartbeat.status) y de la flota
+        device_status_job.start(app)
+        fleet_status_job.start(app)
+        
+        # Muestras retenidas por la compresión de sensores que dejaron de reportar
+        if temperature_compressor.enabled:
+            compression_flush_job.start(app)
+        
+        # Estadísticas por sensor: disposición de barras, último checkpoint y guardado periódico
+        try:
+            refresh_sensor_stats_layout()
+            restore_sensor_stats()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Error al cargar estadísticas de sensores')
+        sensor_stats_job.start(app)
+        sensor_layout_job.start(app)
+        
+        # Escritor de auditoría de silos en segundo plano
+        silo_audit_job.start(app)
+        
+        # Borrado en segundo plano de silos y establecimientos eliminados
+        purge_job.start(app)
+        
+        # Heartbeat de replicación (solo si hay réplica de lectura configurada)
+        if REPLICA_BIND in app.config.get('SQLALCHEMY_BINDS', {}):
+            replication_heartbeat_job.start(app)
+
+_init_lock = threading.Lock()
+_initialized = False
+
+def init_db():
+    """
+    Migra la base de datos e inicia las tareas en segundo plano, una vez por proceso.
 
-def log_silo_change(silo_id, user_id, field, old_value, new_value):
+    Con `python app.py` se llama al arrancar; bajo WSGI (PythonAnywhere) el bloque
+    __main__ no se ejecuta y lo llama el primer request de cada proceso.
+    """
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        _initialized = True
+        migrate_db()
+        start_background_jobs()
+
+@app.before_request
+def _init_process():
+    if not _initialized and not app.config.get('TESTING'):
+        init_db()
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Aplica las migraciones de la base de datos (flask --app app init-db)"""
+    migrate_db()
+    print('Base de datos migrada')
+
+def log_silo_change(silo_id, user_id, field, old_value, new_value, asynchronous=None):
     """
     Registra un cambio en un silo en el log.
+
+    No escribe en el momento: el registro queda en la unidad de trabajo del request
+    y se inserta junto con los demás (un solo INSERT) en el próximo commit, dentro
+    de la misma transacción que el cambio del silo. Con `asynchronous` (o
+    SILO_AUDIT_ASYNC) se encola para el escritor en segundo plano cuando esa
+    transacción se confirma; si el escritor no está corriendo en este proceso se
+    inserta en el commit como cualquier otro registro.
     """
-    log_entry = SiloChangeLog(
-        silo_id=silo_id,
-        user_id=user_id,
-        field_changed=field,
-        old_value=str(old_value),
-        new_value=str(new_value)
-    )
-    db.session.add(log_entry)
-    db.session.commit()
+    entry = {
+        'silo_id': silo_id,
+        'user_id': user_id,
+        'timestamp': time_service.now_naive(),
+        'field_changed': field,
+        'old_value': str(old_value),
+        'new_value': str(new_value)
+    }
+    if asynchronous is None:
+        asynchronous = app.config['SILO_AUDIT_ASYNC']
+    # El registro sigue la suerte de la transacción actual: se inicia si todavía no
+    # hay una, para que un rollback sin otras escrituras también lo descarte
+    if not db.session().in_transaction():
+        db.session.begin()
+    silo_audit.add_pending(entry, queued=asynchronous and silo_audit_job.thread.is_alive())
 
 def get_weather_data(establishment):
     """
@@ -490,7 +1274,7 @@ def get_sun_hours(latitude, longitude, date=None):
         dict: {'sunrise_hour': int, 'sunset_hour': int} o None si falla
     """
     if date is None:
-        date = datetime.now(pytz.timezone('America/Argentina/Buenos_Aires')).date()
+        date = time_service.today()
     
     # Crear clave de cache
     cache_key = f"{latitude}_{longitude}_{date}"
@@ -518,7 +1302,7 @@ def get_sun_hours(latitude, longitude, date=None):
         
         if data['status'] == 'OK':
             # Convertir a hora local de Argentina
-            tz_argentina = pytz.timezone('America/Argentina/Buenos_Aires')
+            tz_argentina = time_service.LOCAL_TZ
             
             sunrise_utc = datetime.fromisoformat(data['results']['sunrise'].replace('Z', '+00:00'))
             sunset_utc = datetime.fromisoformat(data['results']['sunset'].replace('Z', '+00:00'))
@@ -654,7 +1438,25 @@ def get_user_establishments():
     if current_user.role == 'super_admin':
         return Establishment.query.all()
     else:
-        return current_user.establishments
+        return current_user.establishments  # consulta por los ids del principal
+
+def admin_page(stmt, sort_column, id_column, normalize_search=None):
+    """
+    Página de un listado de administración según los parámetros del request:
+    q (búsqueda por prefijo sobre sort_column), after / before (cursores) y per_page.
+    Ver admin_listing.paginate y las macros de listing_macros.html.
+    """
+    per_page = min(max(request.args.get('per_page', app.config['ADMIN_PAGE_SIZE'], type=int), 1), 200)
+    search = request.args.get('q', '').strip()
+    if normalize_search:
+        search = normalize_search(search)
+    try:
+        return admin_listing.paginate(db.session, stmt, sort_column, id_column, per_page, search=search,
+                                      after=request.args.get('after') or None,
+                                      before=request.args.get('before') or None)
+    except ValueError:
+        flash('El cursor de paginación no es válido; se muestra la primera página.', 'warning')
+        return admin_listing.paginate(db.session, stmt, sort_column, id_column, per_page, search=search)
 
 def get_silos_operation_status(establishment, base_time):
     """
@@ -684,6 +1486,7 @@ def get_silos_operation_status(establishment, base_time):
 
     current_time = datetime.strptime(base_time, '%Y-%m-%d %H:00')
     silos_status = []
+    device_status = get_device_status_for_establishment(establishment)
     
     # Procesar cada silo
     for silo in establishment.silos:
@@ -786,11 +1589,86 @@ def get_silos_operation_status(establishment, base_time):
             'should_operate': current_should_operate,
             'silo': silo,
             'mode': current_mode_str,
-            'device_status_info': get_device_status_for_establishment(silo.establishment)
+            'device_status_info': device_status
         })
 
     return silos_status
 
+def evaluate_establishment_silos(establishment, current_time):
+    """
+    Estado de la hora `current_time` ('YYYY-MM-DD HH:00') de los silos de un
+    establecimiento: {silo_id: {'should_operate', 'mode'}}. Se guarda en caché por
+    SILO_DASHBOARD_CACHE_TTL segundos; la clave incluye la configuración de los
+    silos, así que un cambio de configuración se ve en el momento.
+    """
+    settings = tuple(
+        (silo.id, silo.manual_mode, silo.min_temperature, silo.max_temperature, silo.min_humidity,
+         silo.max_humidity, silo.peak_hours_shutdown, silo.use_sun_schedule, silo.air_start_hour, silo.air_end_hour)
+        for silo in establishment.silos
+    )
+    key = (current_time, settings)
+    evaluation = silo_dashboard_cache.get(establishment.id, key)
+    if evaluation is None:
+        evaluation = {
+            status['silo_id']: {'should_operate': status['should_operate'], 'mode': status['mode']}
+            for status in get_silos_operation_status(establishment, current_time)
+            if status['hour'] == current_time
+        }
+        silo_dashboard_cache.set(establishment.id, key, evaluation)
+    return evaluation
+
+silo_dashboard_cache = production_analytics.AnalyticsCache(ttl=app.config['SILO_DASHBOARD_CACHE_TTL'])
+
+@app.route('/api/silo_dashboard')
+@login_required
+def silo_dashboard():
+    """
+    Filas de silos de user_silo_settings, paginadas por establecimiento ('page',
+    'per_page'; opcional 'establishment_id'). Devuelve los datos y el HTML de las
+    filas; 'row_offset' es la cantidad de filas ya mostradas (para alternar colores).
+    'notifications' trae los modos inteligentes desactivados al evaluar los silos.
+    """
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', app.config['SILO_DASHBOARD_PAGE_SIZE'], type=int), 1), 20)
+    query = Establishment.query
+    if current_user.role != 'super_admin':
+        query = query.filter(Establishment.id.in_(current_user.establishment_ids))
+    if request.args.get('establishment_id', type=int):
+        query = query.filter(Establishment.id == request.args.get('establishment_id', type=int))
+    establishments = query.order_by(Establishment.id).offset((page - 1) * per_page).limit(per_page + 1).all()
+    has_more = len(establishments) > per_page
+    establishments = establishments[:per_page]
+
+    current_time = time_service.now_local().strftime('%Y-%m-%d %H:00')
+    device_statuses = {entry['id']: entry['status'] for entry in current_fleet_status()['establishments']}
+    silos_status = []
+    data = []
+    for establishment in establishments:
+        evaluation = evaluate_establishment_silos(establishment, current_time)
+        device_status = device_statuses.get(establishment.id)
+        silos = []
+        for silo in establishment.silos:
+            if silo.id not in evaluation:
+                continue
+            silos_status.append({'silo': silo, 'hour': current_time, 'device_status_info': device_status,
+                                 **evaluation[silo.id]})
+            silos.append({'silo_id': silo.id, 'name': silo.name, 'manual_mode': silo.manual_mode,
+                          **evaluation[silo.id]})
+        data.append({'id': establishment.id, 'name': establishment.name,
+                     'device_status': device_status, 'silos': silos})
+
+    return jsonify({
+        'page': page,
+        'per_page': per_page,
+        'next_page': page + 1 if has_more else None,
+        'hour': current_time,
+        'establishments': data,
+        # La evaluación es la que desactiva los modos inteligentes: se sacan después de evaluar
+        'notifications': session.pop('intelligent_mode_disabled_notifications', []),
+        'html': render_template('silo_status_rows.html', silos_status=silos_status,
+                                row_offset=request.args.get('row_offset', 0, type=int))
+    })
+
 def check_device_status(last_heartbeat):
     """
     Determina el estado de un dispositivo basado en su último heartbeat
@@ -798,11 +1676,11 @@ def check_device_status(last_heartbeat):
     if not last_heartbeat:
         return 'offline'
         
-    now = datetime.now(pytz.timezone('America/Argentina/Buenos_Aires'))
+    now = time_service.now_local()
     
     # Asegurarse de que last_heartbeat tenga zona horaria
     if last_heartbeat.tzinfo is None:
-        last_heartbeat = last_heartbeat.replace(tzinfo=pytz.timezone('America/Argentina/Buenos_Aires'))
+        last_heartbeat = time_service.localize(last_heartbeat)
     
     time_diff = now - last_heartbeat
     
@@ -849,7 +1727,8 @@ def login():
             print(f"Password check result: {password_check}")
             
             if password_check:
-                login_user(user)
+                principals.invalidate(user.id)
+                login_user(principals.get(user.id))
                 flash(f'Bienvenido, {user.username}!', 'success')
                 # Redirigir según el rol del usuario
                 if user.role == 'user':
@@ -914,10 +1793,7 @@ def create_user():
         return redirect(url_for('index'))
     
     # Si es admin, solo mostrar los establecimientos asignados a él
-    if current_user.role == 'admin':
-        available_establishments = current_user.establishments
-    else:
-        available_establishments = Establishment.query.all()
+    available_establishments = get_user_establishments()
     
     if request.method == 'POST':
         username = request.form.get('username')
@@ -939,8 +1815,7 @@ def create_user():
         for est_id in selected_establishments:
             establishment = Establishment.query.get(int(est_id))
             # Verificar que el admin tenga acceso al establecimiento
-            if establishment and (current_user.role == 'super_admin' or 
-                                establishment in current_user.establishments):
+            if establishment and current_user.can_access_establishment(establishment.id):
                 user.establishments.append(establishment)
         
         db.session.add(user)
@@ -982,6 +1857,7 @@ def create_establishment():
         )
         db.session.add(new_establishment)
         db.session.commit()
+        fleet_status.invalidate()
         flash('Establecimiento creado exitosamente')
         return redirect(url_for('index'))
 
@@ -994,14 +1870,15 @@ def manage_users():
         flash('No tienes permiso para gestionar usuarios', 'error')
         return redirect(url_for('index'))
     
+    stmt = select(User).options(selectinload(User.establishments))
     if current_user.role == 'super_admin':
-        users = User.query.filter(User.id != current_user.id).all()
+        stmt = stmt.where(User.id != current_user.id)
     else:
         # Para admin, mostrar solo los usuarios que ha creado
-        users = User.query.filter_by(created_by_id=current_user.id).all()
+        stmt = stmt.where(User.created_by_id == current_user.id)
     
-    establishments = get_user_establishments()
-    return render_template('manage_users.html', users=users, establishments=establishments)
+    page = admin_page(stmt, User.username, User.id)
+    return render_template('manage_users.html', users=page.items, page=page)
 
 @app.route('/edit_user/<int:user_id>', methods=['GET', 'POST'])
 @login_required
@@ -1054,9 +1931,8 @@ def edit_user(user_id):
                 establishments = Establishment.query.filter(Establishment.id.in_(establishment_ids)).all()
             else:
                 # Admin solo puede asignar establecimientos a los que tiene acceso
-                accessible_establishments = set(current_user.establishments)
                 establishments = [e for e in Establishment.query.filter(Establishment.id.in_(establishment_ids)).all()
-                                if e in accessible_establishments]
+                                if current_user.can_access_establishment(e.id)]
             
             user.establishments = establishments
             db.session.commit()
@@ -1106,8 +1982,8 @@ def manage_establishments():
         flash('Solo el super administrador puede gestionar establecimientos')
         return redirect(url_for('index'))
     
-    establishments = Establishment.query.all()
-    return render_template('manage_establishments.html', establishments=establishments)
+    page = admin_page(select(Establishment), Establishment.name, Establishment.id)
+    return render_template('manage_establishments.html', establishments=page.items, page=page)
 
 @app.route('/edit_establishment/<int:establishment_id>', methods=['GET', 'POST'])
 @login_required
@@ -1135,6 +2011,7 @@ def edit_establishment(establishment_id):
             return render_template('edit_establishment.html', establishment=establishment)
         
         db.session.commit()
+        fleet_status.invalidate()
         flash('Establecimiento actualizado exitosamente')
         return redirect(url_for('manage_establishments'))
     
@@ -1150,35 +2027,19 @@ def delete_establishment(establishment_id):
     establishment = Establishment.query.get_or_404(establishment_id)
     
     try:
-        # Get all silos for this establishment
-        silos = Silo.query.filter_by(establishment_id=establishment_id).all()
-        
-        # Delete all aerator runtime records for these silos
-        for silo in silos:
-            AeratorRuntime.query.filter_by(silo_id=silo.id).delete()
-            ProtectionAlert.query.filter_by(silo_id=silo.id).delete()
-            SiloChangeLog.query.filter_by(silo_id=silo.id).delete()
-        
-        # Get all boards for this establishment
-        boards = Board.query.filter_by(establishment_id=establishment_id).all()
-        
-        # Delete all related records for these boards
-        for board in boards:
-            # Delete device heartbeat history records
-            DeviceHeartbeatHistory.query.filter_by(mac_address=board.mac_address).delete()
-            # Delete device heartbeat records
-            DeviceHeartbeat.query.filter_by(mac_address=board.mac_address).delete()
-            # Delete ESP32 reboot records
-            Esp32Reboot.query.filter_by(mac_address=board.mac_address).delete()
-            # Delete device action logs
-            DeviceActionLog.query.filter_by(mac_address=board.mac_address).delete()
-            # Finally delete the board
-            db.session.delete(board)
-        
-        # Now delete the establishment (which will cascade delete silos)
-        db.session.delete(establishment)
+        # Se marca como eliminado (deja de verse en todas las consultas) y los
+        # datos se borran en segundo plano
+        now = time_service.now_naive()
+        for silo in establishment.silos:
+            _mark_silo_deleted(silo, now)
+        for board in Board.query.filter_by(establishment_id=establishment_id).all():
+            board.deleted_at = now
+        establishment.deleted_at = now
+        db.session.add(PurgeTask(entity='establishment', entity_id=establishment.id,
+                                 entity_name=establishment.name, requested_by_id=current_user.id))
         db.session.commit()
-        flash('Establecimiento eliminado exitosamente')
+        fleet_status.invalidate()
+        flash('Establecimiento eliminado exitosamente. Sus datos se borrarán en segundo plano.')
     except Exception as e:
         db.session.rollback()
         flash('Error al eliminar el establecimiento: ' + str(e), 'error')
@@ -1330,14 +2191,14 @@ def manage_silos():
         flash('No tienes permiso para gestionar silos', 'error')
         return redirect(url_for('index'))
     
-    if current_user.role == 'super_admin':
-        silos = Silo.query.all()
-    else:
+    stmt = select(Silo).options(joinedload(Silo.establishment), lazyload(Silo.barra_sensores_asociada))
+    if current_user.role != 'super_admin':
         # Para admin, obtener solo los silos de sus establecimientos
-        establishment_ids = [e.id for e in current_user.establishments]
-        silos = Silo.query.filter(Silo.establishment_id.in_(establishment_ids)).all()
+        establishment_ids = current_user.establishment_ids
+        stmt = stmt.where(Silo.establishment_id.in_(establishment_ids))
     
-    return render_template('manage_silos.html', silos=silos)
+    page = admin_page(stmt, Silo.name, Silo.id)
+    return render_template('manage_silos.html', silos=page.items, page=page)
 
 @app.route('/delete_silo/<int:silo_id>', methods=['POST'])
 @login_required
@@ -1354,26 +2215,13 @@ def delete_silo(silo_id):
         return redirect(url_for('manage_silos'))
 
     try:
-        # Eliminar todos los registros relacionados en todas las tablas
-        # 1. Eliminar registros de AeratorRuntime
-        AeratorRuntime.query.filter_by(silo_id=silo_id).delete()
-        
-        # 2. Eliminar registros de ProtectionAlert
-        ProtectionAlert.query.filter_by(silo_id=silo_id).delete()
-        
-        # 3. Eliminar registros de LecturaTemperatura
-        LecturaTemperatura.query.filter_by(silo_id=silo_id).delete()
-        
-        # 4. Eliminar registros de SiloChangeLog
-        SiloChangeLog.query.filter_by(silo_id=silo_id).delete()
-        
-        # 5. Eliminar configuración de aireación
-        AerationConfig.query.filter_by(silo_id=silo_id).delete()
-        
-        # Finalmente eliminar el silo
-        db.session.delete(silo)
+        # Se marca como eliminado (deja de verse en todas las consultas) y los
+        # registros relacionados se borran en segundo plano
+        _mark_silo_deleted(silo, time_service.now_naive())
+        db.session.add(PurgeTask(entity='silo', entity_id=silo.id, entity_name=silo.name,
+                                 requested_by_id=current_user.id))
         db.session.commit()
-        flash('Silo eliminado exitosamente', 'success')
+        flash('Silo eliminado exitosamente. Sus datos se borrarán en segundo plano.', 'success')
     except Exception as e:
         db.session.rollback()
         flash(f'Error al eliminar el silo: {str(e)}', 'error')
@@ -1385,9 +2233,8 @@ def delete_silo(silo_id):
 def get_silo_weather(silo_id):
     silo = Silo.query.get_or_404(silo_id)
     # Verificar que el usuario tenga acceso al silo
-    if current_user.role != 'super_admin':  # super_admin puede acceder a todos los silos
-        if not any(silo in establishment.silos for establishment in current_user.establishments):
-            return jsonify({'error': 'No tienes permiso para acceder a este silo'}), 403
+    if not current_user.can_access_silo(silo.id):
+        return jsonify({'error': 'No tienes permiso para acceder a este silo'}), 403
     
     operation_hours = get_silo_operation_hours(silo_id)
     if operation_hours is None:
@@ -1399,8 +2246,6 @@ def get_silo_weather(silo_id):
 @login_required
 def user_silo_settings():
     selected_silo = None
-    silos_status = []  # Lista para almacenar el estado de cada silo
-    current_time = datetime.now(pytz.timezone('America/Argentina/Buenos_Aires')).strftime('%Y-%m-%d %H:00')
 
     if request.method == 'POST':
         silo_id = request.form.get('silo_id')
@@ -1458,61 +2303,18 @@ def user_silo_settings():
     
     elif request.args.get('silo_id'):
         silo = Silo.query.get_or_404(request.args.get('silo_id'))
-        if current_user.role == 'super_admin' or any(silo in establishment.silos for establishment in current_user.establishments):
+        if current_user.can_access_silo(silo.id):
             selected_silo = silo
     
     # Obtener el filtro de establecimiento (solo para super_admin)
     selected_establishment_id = request.args.get('establishment_id', type=int)
     
-    # Obtener establecimientos según el rol del usuario
-    if current_user.role == 'super_admin':
-        all_establishments = Establishment.query.all()
-        # Si hay un filtro, usar solo ese establecimiento
-        if selected_establishment_id:
-            establishments = [est for est in all_establishments if est.id == selected_establishment_id]
-        else:
-            establishments = all_establishments
-    else:
-        all_establishments = current_user.establishments
-        establishments = current_user.establishments
-    
-    # Procesar silos por establecimiento para minimizar llamadas al servicio meteorológico
-    for establishment in establishments:
-        # Obtener el estado del dispositivo para este establecimiento
-        device_info = get_device_status_for_establishment(establishment)
-        
-        all_operation_statuses = get_silos_operation_status(establishment, current_time)
-        # Filtrar solo el estado de la hora actual para la operación del silo
-        current_operation_statuses = [op_status for op_status in all_operation_statuses if op_status['hour'] == current_time]
-        
-        # Añadir la información del estado del dispositivo a cada estado de operación del silo
-        for op_status in current_operation_statuses:
-            op_status['device_status_info'] = device_info  # Aquí agregamos la info del dispositivo
-            silos_status.append(op_status) # Agregamos el estado combinado a la lista final
-    
-    # Obtener la lista completa de silos para el selector
-    if current_user.role == 'super_admin':
-        silos = Silo.query.all()
-    else:
-        silos = []
-        for establishment in current_user.establishments:
-            silos.extend(establishment.silos)
-
-    # Obtener y limpiar notificaciones de desactivación automática del modo inteligente
-    intelligent_mode_notifications = session.pop('intelligent_mode_disabled_notifications', [])
-    
-    # Mostrar notificaciones como flash messages
-    for notification in intelligent_mode_notifications:
-        flash(
-            f'⚠️ Modo inteligente del silo "{notification["silo_name"]}" fue desactivado automáticamente. '
-            f'Motivo: {notification["reason"]}. Se cambió a modo automático.',
-            'warning'
-        )
+    # Establecimientos para el filtro; las filas de silos las carga la página desde /api/silo_dashboard
+    # (las notificaciones de modo inteligente desactivado llegan con esas filas)
+    all_establishments = get_user_establishments()
 
     return render_template('user_silo_settings.html', 
-                         silos=silos, 
                          selected_silo=selected_silo,
-                         silos_status=silos_status,
                          all_establishments=all_establishments,
                          selected_establishment_id=selected_establishment_id)
 
@@ -1523,10 +2325,13 @@ def manage_esp32_devices():
         flash('No tienes permisos para acceder a esta página', 'danger')
         return redirect(url_for('index'))
     
-    devices = Board.query.all() if current_user.role == 'super_admin' else Board.query.join(Establishment).filter(Establishment.id.in_([e.id for e in current_user.establishments])).all()
+    stmt = select(Board).options(joinedload(Board.establishment))
+    if current_user.role != 'super_admin':
+        stmt = stmt.where(Board.establishment_id.in_(current_user.establishment_ids))
+    page = admin_page(stmt, Board.mac_address, Board.id, normalize_search=standardize_mac)
     establishments = get_user_establishments()
     
-    return render_template('manage_esp32_devices.html', devices=devices, establishments=establishments)
+    return render_template('manage_esp32_devices.html', devices=page.items, page=page, establishments=establishments)
 
 @app.route('/esp32_reboots')
 @login_required
@@ -1545,7 +2350,7 @@ def esp32_reboots():
         if heartbeat and heartbeat.last_heartbeat:
             device_heartbeats[device.mac_address] = {
                 'last_heartbeat': heartbeat.last_heartbeat,
-                'status': heartbeat.status
+                'status': current_device_status(heartbeat)
             }
         else:
             device_heartbeats[device.mac_address] = {
@@ -1596,13 +2401,14 @@ def register_esp32_device():
     # Crear nuevo dispositivo ESP32
     new_device = Board(
         mac_address=mac_address.upper(),
-        registration_date=datetime.now(pytz.timezone('America/Argentina/Buenos_Aires')),
+        registration_date=time_service.now_local(),
         establishment_id=establishment_id
     )
     
     try:
         db.session.add(new_device)
         db.session.commit()
+        fleet_status.invalidate()
         flash('Dispositivo ESP32 registrado exitosamente', 'success')
     except Exception as e:
         db.session.rollback()
@@ -1622,10 +2428,12 @@ def delete_esp32_device(device_id):
         heartbeat = DeviceHeartbeat.query.filter_by(mac_address=device.mac_address).first()
         if heartbeat:
             db.session.delete(heartbeat)
+        DeviceStatusTransition.query.filter_by(mac_address=device.mac_address).delete()
             
         # Then delete the device
         db.session.delete(device)
         db.session.commit()
+        fleet_status.invalidate()
         flash('Dispositivo ESP32 eliminado exitosamente', 'success')
     except Exception as e:
         db.session.rollback()
@@ -1644,7 +2452,7 @@ def toggle_global_aerator_control():
         
         control = get_global_aerator_control()
         control.enabled = enabled
-        control.last_modified = datetime.now(pytz.timezone('America/Argentina/Buenos_Aires'))
+        control.last_modified = time_service.now_local()
         control.modified_by_id = current_user.id
         
         db.session.commit()
@@ -1691,32 +2499,118 @@ def get_available_positions_ajax(establishment_id):
     available_positions = get_available_positions(establishment_id)
     return jsonify({'positions': available_positions})
 
+# Nombres de los campos de Silo que registra log_silo_change
+SILO_CHANGE_FIELD_LABELS = {
+    'name': 'Nombre',
+    'min_temperature': 'Temperatura Mínima',
+    'max_temperature': 'Temperatura Máxima',
+    'min_humidity': 'Humedad Mínima',
+    'max_humidity': 'Humedad Máxima',
+    'peak_hours_shutdown': 'Apagado en Hora Pico',
+    'aerator_position': 'Posición del Aireador',
+    'air_start_hour': 'Hora de Inicio de Aireación',
+    'air_end_hour': 'Hora de Fin de Aireación',
+    'use_sun_schedule': 'Horario Solar'
+}
+
+SILO_CHANGE_LOG_CSV_FIELDS = ['id', 'timestamp', 'establishment_name', 'silo_name', 'username',
+                              'field_changed', 'old_value', 'new_value']
+
+def _parse_change_log_time(value, end=False):
+    """Fecha (YYYY-MM-DD, el día completo) o fecha y hora ISO 8601 de los filtros del historial"""
+    if len(value) == 10:
+        day = datetime.combine(date.fromisoformat(value), datetime.min.time())
+        return day + timedelta(days=1) if end else day
+    return datetime.fromisoformat(value).replace(tzinfo=None)
+
+def _silo_change_log_filters(args):
+    """Filtros del historial a partir de los parámetros del request (ValueError si alguno es inválido)"""
+    after = None
+    if args.get('after'):
+        timestamp, _, log_id = args['after'].rpartition(',')
+        after = (datetime.fromisoformat(timestamp), int(log_id))
+    return {
+        'establishment': args.get('establishment', type=int),
+        'silo': args.get('silo', type=int),
+        'user': args.get('user', type=int),
+        'field': args.get('field') or None,
+        'desde': _parse_change_log_time(args['desde']) if args.get('desde') else None,
+        'hasta': _parse_change_log_time(args['hasta'], end=True) if args.get('hasta') else None,
+        'after': after
+    }
+
+def _change_log_cursor(row):
+    return f'{row.timestamp.isoformat()},{row.id}'
+
+def silo_change_log_statement(filters, limit=None):
+    """
+    Consulta del historial de cambios de silos visible para el usuario actual,
+    ordenada por (timestamp, id) descendente. La paginación es por cursor: con
+    filters['after'] = (timestamp, id) de la última fila vista sigue desde ahí,
+    así cada página cuesta lo mismo sin importar cuántas se leyeron antes.
+    """
+    stmt = select(
+        SiloChangeLog.id, SiloChangeLog.timestamp, SiloChangeLog.field_changed,
+        SiloChangeLog.old_value, SiloChangeLog.new_value, SiloChangeLog.silo_id,
+        Silo.name.label('silo_name'), Establishment.id.label('establishment_id'),
+        Establishment.name.label('establishment_name'), User.username
+    ).join(Silo, Silo.id == SiloChangeLog.silo_id)\
+     .join(Establishment, Establishment.id == Silo.establishment_id)\
+     .join(User, User.id == SiloChangeLog.user_id)
+
+    if current_user.role != 'super_admin':
+        stmt = stmt.where(Establishment.id.in_(current_user.establishment_ids))
+    if filters['establishment']:
+        stmt = stmt.where(Establishment.id == filters['establishment'])
+    if filters['silo']:
+        stmt = stmt.where(SiloChangeLog.silo_id == filters['silo'])
+    if filters['user']:
+        stmt = stmt.where(SiloChangeLog.user_id == filters['user'])
+    if filters['field']:
+        stmt = stmt.where(SiloChangeLog.field_changed == filters['field'])
+    if filters['desde']:
+        stmt = stmt.where(SiloChangeLog.timestamp >= filters['desde'])
+    if filters['hasta']:
+        stmt = stmt.where(SiloChangeLog.timestamp < filters['hasta'])
+    if filters['after']:
+        stmt = stmt.where(tuple_(SiloChangeLog.timestamp, SiloChangeLog.id) < tuple_(*filters['after']))
+
+    stmt = stmt.order_by(SiloChangeLog.timestamp.desc(), SiloChangeLog.id.desc())
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+def silo_change_log_page(filters, per_page):
+    """Una página del historial y el cursor de la siguiente (None si no hay más)"""
+    rows = db.session.execute(silo_change_log_statement(filters, limit=per_page + 1)).all()
+    next_cursor = _change_log_cursor(rows[per_page - 1]) if len(rows) > per_page else None
+    return rows[:per_page], next_cursor
+
+def _change_log_per_page():
+    return min(max(request.args.get('per_page', app.config['SILO_CHANGE_LOG_PAGE_SIZE'], type=int), 1), 500)
+
 @app.route('/silo_change_log')
 @login_required
+@read_replica
 def silo_change_log():
     # Obtener parámetros de filtro
     establishment_id = request.args.get('establishment')
     silo_id = request.args.get('silo')
+    try:
+        filters = _silo_change_log_filters(request.args)
+    except ValueError as e:
+        flash(f'Filtro inválido: {str(e)}', 'danger')
+        return redirect(url_for('silo_change_log'))
     
     # Obtener establecimientos accesibles para el usuario
     if current_user.role == 'super_admin':
         establishments = Establishment.query.all()
+        users = User.query.order_by(User.username).all()
     else:
         establishments = current_user.establishments
-    
-    # Base query para los logs
-    query = SiloChangeLog.query.join(SiloChangeLog.silo).join(Silo.establishment)
-    
-    # Aplicar filtros según el rol del usuario
-    if current_user.role != 'super_admin':
-        establishment_ids = [e.id for e in current_user.establishments]
-        query = query.filter(Establishment.id.in_(establishment_ids))
-    
-    # Aplicar filtros de establecimiento y silo si están presentes
-    if establishment_id:
-        query = query.filter(Establishment.id == establishment_id)
-    if silo_id:
-        query = query.filter(SiloChangeLog.silo_id == silo_id)
+        users = User.query.join(User.establishments)\
+            .filter(Establishment.id.in_([e.id for e in establishments]))\
+            .distinct().order_by(User.username).all()
     
     # Obtener silos para el filtro
     if establishment_id:
@@ -1725,19 +2619,92 @@ def silo_change_log():
         if current_user.role == 'super_admin':
             silos = Silo.query.all()
         else:
-            silos = []
-            for establishment in current_user.establishments:
-                silos.extend(establishment.silos)
+            silos = Silo.query.filter(Silo.establishment_id.in_(current_user.establishment_ids)).all()
     
-    # Ordenar logs por fecha descendente
-    logs = query.order_by(SiloChangeLog.timestamp.desc()).all()
+    # Primera página; las siguientes se piden a /api/silo_change_log con el cursor
+    logs, next_cursor = silo_change_log_page(filters, _change_log_per_page())
     
     return render_template('silo_change_log.html', 
                          logs=logs,
+                         next_cursor=next_cursor,
+                         field_labels=SILO_CHANGE_FIELD_LABELS,
                          establishments=establishments,
                          silos=silos,
+                         users=users,
                          selected_establishment=establishment_id,
-                         selected_silo=silo_id)
+                         selected_silo=silo_id,
+                         selected_user=request.args.get('user', ''),
+                         selected_field=request.args.get('field', ''),
+                         selected_desde=request.args.get('desde', ''),
+                         selected_hasta=request.args.get('hasta', ''))
+
+@app.route('/api/silo_change_log')
+@login_required
+@read_replica
+def silo_change_log_api():
+    """
+    Página siguiente del historial de cambios. Mismos filtros que /silo_change_log
+    (establishment, silo, user, field, desde, hasta) más after=<cursor> y per_page.
+    Devuelve las filas, su HTML y next_cursor (None cuando no hay más).
+    """
+    try:
+        filters = _silo_change_log_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': f'Parámetro inválido: {str(e)}'}), 400
+
+    logs, next_cursor = silo_change_log_page(filters, _change_log_per_page())
+    return jsonify({
+        'logs': [{
+            'id': log.id,
+            'timestamp': log.timestamp.isoformat(),
+            'establishment_id': log.establishment_id,
+            'establishment_name': log.establishment_name,
+            'silo_id': log.silo_id,
+            'silo_name': log.silo_name,
+            'username': log.username,
+            'field_changed': log.field_changed,
+            'old_value': log.old_value,
+            'new_value': log.new_value
+        } for log in logs],
+        'next_cursor': next_cursor,
+        'html': render_template('silo_change_log_rows.html', logs=logs, field_labels=SILO_CHANGE_FIELD_LABELS)
+    })
+
+@app.route('/silo_change_log/export')
+@login_required
+@read_replica
+def export_silo_change_log():
+    """
+    Exporta en CSV (en streaming) el historial con los filtros de la pantalla.
+    Recorre la misma consulta por cursor en lotes, sin cargar todo en memoria;
+    con after=<cursor> retoma una exportación cortada.
+    """
+    try:
+        filters = _silo_change_log_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': f'Parámetro inválido: {str(e)}'}), 400
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=SILO_CHANGE_LOG_CSV_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        pending = 0
+        stmt = silo_change_log_statement(filters).execution_options(yield_per=EXPORT_BATCH_SIZE)
+        for row in db.session.execute(stmt):
+            item = row._asdict()
+            item['timestamp'] = item['timestamp'].isoformat()
+            writer.writerow(item)
+            pending += 1
+            if pending >= 500:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+        yield buffer.getvalue()
+
+    return Response(stream_with_context(generate()), mimetype='text/csv', headers={
+        'Content-Disposition': 'attachment; filename=silo_change_log.csv'
+    })
 
 @app.route('/delete_silo_logs', methods=['POST'])
 @login_required
@@ -1852,9 +2819,112 @@ def get_esp32_silo_config():
         app.logger.error(f"Error en get_esp32_silo_config: {str(e)}")
         return jsonify({'error': 'Error interno del servidor'}), 500
 
-@app.route('/api/esp32/get_24h_states', methods=['POST'])
-def get_24h_states():
-    data = request.get_json()
+def record_schedule_decisions(establishment_id, hours_states):
+    """
+    Guarda el programa de 24 horas calculado para un establecimiento, agregando
+    una revisión solo para las horas cuya decisión cambió. No hace commit.
+    """
+    encoded = {
+        to_epoch(datetime.strptime(entry['hour'], '%Y-%m-%d %H:00')): decision_history.encode_hour(entry['states'])
+        for entry in hours_states
+    }
+    latest = {}
+    for row in ScheduleDecision.query.filter(
+            ScheduleDecision.establishment_id == establishment_id,
+            ScheduleDecision.hour_ts.in_(list(encoded))
+    ).order_by(ScheduleDecision.computed_ts):
+        latest[row.hour_ts] = (row.silo_mask, row.on_mask, row.forced_mask, row.position_reasons)
+
+    computed_ts = _now_epoch()
+    rows = [{
+        'establishment_id': establishment_id,
+        'hour_ts': hour_ts,
+        'computed_ts': computed_ts,
+        'silo_mask': masks[0],
+        'on_mask': masks[1],
+        'forced_mask': masks[2],
+        'position_reasons': masks[3],
+        'reasons': 0
+    } for hour_ts, masks in encoded.items() if latest.get(hour_ts) != masks]
+    if rows:
+        _upsert(ScheduleDecision, rows, ['establishment_id', 'hour_ts', 'computed_ts'],
+                lambda inserted: {column: getattr(inserted, column) for column in
+                                  ('silo_mask', 'on_mask', 'forced_mask', 'position_reasons', 'reasons')})
+    return len(rows)
+
+def _serialize_schedule_decision(row, silos_by_position):
+    states = decision_history.decode_hour(row.silo_mask, row.on_mask, row.forced_mask,
+                                          row.position_reasons, legacy_reasons=row.reasons)
+    for state in states:
+        state['silo_id'] = silos_by_position.get(state['position'])
+    return {
+        'hour': from_epoch(row.hour_ts).strftime('%Y-%m-%d %H:00'),
+        'computed_at': from_epoch(row.computed_ts).isoformat(),
+        'states': states
+    }
+
+@app.route('/api/establishment/<int:establishment_id>/decision_history')
+@login_required
+def schedule_decision_history(establishment_id):
+    """
+    Programa de aireación que se envió a los dispositivos de un establecimiento.
+
+    Con 'hora' (YYYY-MM-DDTHH) devuelve todas las revisiones de esa hora y la
+    vigente al momento 'al' (ISO 8601, por defecto el fin de la hora). Sin 'hora'
+    devuelve la última revisión de cada hora entre 'desde' y 'hasta' (máx. 31 días).
+    """
+    Establishment.query.get_or_404(establishment_id)
+    if not current_user.can_access_establishment(establishment_id):
+        return jsonify({'error': 'Acceso no autorizado'}), 403
+    # Posición -> silo actual (las máscaras solo guardan posiciones)
+    silos_by_position = dict(
+        db.session.query(Silo.aerator_position, Silo.id).filter(Silo.establishment_id == establishment_id)
+    )
+
+    try:
+        if request.args.get('hora'):
+            hour = time_service.hour_bucket(datetime.fromisoformat(request.args['hora']).replace(tzinfo=None))
+            as_of = datetime.fromisoformat(request.args['al']).replace(tzinfo=None) if request.args.get('al') \
+                else hour + timedelta(hours=1)
+            revisions = ScheduleDecision.query.filter_by(
+                establishment_id=establishment_id, hour_ts=to_epoch(hour)
+            ).order_by(ScheduleDecision.computed_ts).all()
+            in_force = [row for row in revisions if row.computed_ts <= to_epoch(as_of)]
+            return jsonify({
+                'status': 'success',
+                'hour': hour.strftime('%Y-%m-%d %H:00'),
+                'as_of': as_of.isoformat(),
+                'decision': _serialize_schedule_decision(in_force[-1], silos_by_position) if in_force else None,
+                'revisions': [_serialize_schedule_decision(row, silos_by_position) for row in revisions]
+            })
+        start, end = _parse_history_range()
+    except ValueError:
+        return jsonify({'error': 'Formato de fecha inválido. Use formato ISO 8601'}), 400
+    if end - start > timedelta(days=31):
+        return jsonify({'error': 'El rango máximo es de 31 días'}), 400
+
+    final = {}
+    revision_counts = {}
+    for row in ScheduleDecision.query.filter(
+            ScheduleDecision.establishment_id == establishment_id,
+            ScheduleDecision.hour_ts >= to_epoch(time_service.hour_bucket(start)),
+            ScheduleDecision.hour_ts <= to_epoch(end)
+    ).order_by(ScheduleDecision.hour_ts, ScheduleDecision.computed_ts):
+        final[row.hour_ts] = row
+        revision_counts[row.hour_ts] = revision_counts.get(row.hour_ts, 0) + 1
+    return jsonify({
+        'status': 'success',
+        'desde': start.isoformat(),
+        'hasta': end.isoformat(),
+        'data': [
+            {**_serialize_schedule_decision(row, silos_by_position), 'revisions': revision_counts[hour_ts]}
+            for hour_ts, row in final.items()
+        ]
+    })
+
+@app.route('/api/esp32/get_24h_states', methods=['POST'])
+def get_24h_states():
+    data = request.get_json()
     mac_address = data.get('mac_address')
     
     if not mac_address:
@@ -1871,7 +2941,7 @@ def get_24h_states():
 
     silos = Silo.query.filter_by(establishment_id=establishment.id).all()
     if not silos:
-        current_time_for_response = datetime.now(pytz.timezone('America/Argentina/Buenos_Aires')).replace(minute=0, second=0, microsecond=0)
+        current_time_for_response = time_service.hour_bucket(time_service.now_local())
         empty_hourly_states = []
         for i in range(24):
             hour_dt = current_time_for_response + timedelta(hours=i)
@@ -1884,7 +2954,7 @@ def get_24h_states():
     # Obtener datos meteorológicos para el establecimiento (una sola vez)
     weather_data_list = get_weather_data(establishment)
     
-    current_time = datetime.now(pytz.timezone('America/Argentina/Buenos_Aires'))
+    current_time = time_service.now_local()
     current_time_rounded_str = current_time.replace(minute=0, second=0, microsecond=0).strftime('%Y-%m-%d %H:00')
 
     # Inicializar la estructura de respuesta para 24 horas
@@ -1956,6 +3026,13 @@ def get_24h_states():
         'states': hours_states_response
     }
     
+    # Historial compacto de lo que se le indicó a los dispositivos
+    try:
+        record_schedule_decisions(establishment.id, hours_states_response)
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error al guardar el historial de decisiones de {establishment.id}: {str(e)}")
+    
     # Marcar todos los silos del establecimiento como no modificados
     for silo in silos:
         if silo.modified:
@@ -2016,12 +3093,8 @@ def log_runtime():
         if not silo:
             return jsonify({'error': 'Silo no encontrado para esta posición'}), 404
 
-        # Registrar el tiempo de funcionamiento
-        runtime = AeratorRuntime(
-            silo_id=silo.id,
-            runtime_hours=float(duration)
-        )
-        db.session.add(runtime)
+        # Registrar el tiempo de funcionamiento (y el libro de horas)
+        record_runtime(silo.id, float(duration))
         db.session.commit()
 
         return jsonify({'message': 'Tiempo de funcionamiento registrado correctamente'}), 200
@@ -2076,11 +3149,7 @@ def log_aerator_state():
                 app.logger.info(f" - En minutos: {duration_float * 60:.1f}")
                 app.logger.info(f" - En segundos: {duration_float * 3600:.0f}")
                 
-                runtime = AeratorRuntime(
-                    silo_id=silo.id,
-                    runtime_hours=duration_float
-                )
-                db.session.add(runtime)
+                record_runtime(silo.id, duration_float)
                 db.session.commit()
                 
                 app.logger.info(f"Tiempo de funcionamiento registrado exitosamente")
@@ -2128,72 +3197,32 @@ def device_heartbeat():
         heartbeat = DeviceHeartbeat.query.filter_by(mac_address=mac_address).first()
         if not heartbeat:
             app.logger.info(f"Creando nuevo registro de heartbeat para MAC: {mac_address}")
-            heartbeat = DeviceHeartbeat(mac_address=mac_address, last_heartbeat=datetime.now(pytz.timezone('America/Argentina/Buenos_Aires')))
+            heartbeat = DeviceHeartbeat(mac_address=mac_address, last_heartbeat=time_service.now_local())
             db.session.add(heartbeat)
         
         # Actualizar timestamp y estado usando función que garantiza hora correcta de Argentina
         now = get_argentina_time()
         
-        # DEBUG: Log de timestamps para investigar discrepancia
-        app.logger.info(f"DEBUG - Timestamp Argentina corregido: {now}")
-        app.logger.info(f"DEBUG - Timestamp UTC: {datetime.utcnow()}")
-        app.logger.info(f"DEBUG - Zona horaria: {now.tzinfo}")
-        
         # Asegurarse de que last_heartbeat tenga zona horaria
         if heartbeat.last_heartbeat is None:
             heartbeat.last_heartbeat = now
         elif heartbeat.last_heartbeat.tzinfo is None:
-            heartbeat.last_heartbeat = heartbeat.last_heartbeat.replace(tzinfo=pytz.timezone('America/Argentina/Buenos_Aires'))
+            heartbeat.last_heartbeat = time_service.localize(heartbeat.last_heartbeat)
         
-        old_status = heartbeat.status
+        # El estado (online/warning/offline) lo actualiza sweep_device_status
         heartbeat.last_heartbeat = now
-        heartbeat.status = 'online'
         if firmware_version:
             heartbeat.firmware_version = firmware_version
         
-        # Determinar slot de tiempo fijo basado en los minutos actuales
-        current_minute = now.minute
-        if current_minute <= 20:
-            slot_start = 0
-            slot_end = 20
-            slot_name = "0-20"
-        elif current_minute <= 40:
-            slot_start = 21
-            slot_end = 40
-            slot_name = "21-40"
-        else:
-            slot_start = 41
-            slot_end = 59
-            slot_name = "41-59"
-        
-        # Crear timestamp normalizado para el slot (usar el minuto medio del slot)
-        slot_middle_minute = (slot_start + slot_end) // 2
-        normalized_time = now.replace(minute=slot_middle_minute, second=0, microsecond=0)
-        
-        app.logger.info(f"Heartbeat en slot {slot_name} (minuto {current_minute}), timestamp normalizado: {normalized_time}")
-        
-        # Verificar si ya existe un registro para este slot específico
-        should_save_history = False
-        existing_history = DeviceHeartbeatHistory.query.filter(
-            DeviceHeartbeatHistory.mac_address == mac_address,
-            DeviceHeartbeatHistory.timestamp >= normalized_time.replace(minute=slot_start),
-            DeviceHeartbeatHistory.timestamp <= normalized_time.replace(minute=slot_end, second=59)
-        ).first()
-        
-        if not existing_history:
-            # No existe registro para este slot, guardarlo
-            should_save_history = True
-            app.logger.info(f"No existe registro para slot {slot_name}, guardando en historial")
-        else:
-            app.logger.info(f"Ya existe registro para slot {slot_name}, descartando heartbeat")
-        
-        if should_save_history:
-            history_entry = DeviceHeartbeatHistory(mac_address=mac_address, timestamp=normalized_time)
-            db.session.add(history_entry)
+        # Marcar el slot de 20 minutos en el bitmap del día (OR idempotente, sin consulta previa)
+        slot_name = get_slot_name(now.minute)
         
         try:
+            record_heartbeat_slot(mac_address, now)
+            # El barrido detecta warning/offline; la vuelta a online se ve en el momento
+            publish_live_values([('estado', mac_address, 'online')])
             db.session.commit()
-            app.logger.info(f"Heartbeat actualizado: MAC={mac_address}, Estado anterior={old_status}, Nuevo estado=online, Historial={'guardado' if should_save_history else 'no guardado'}")
+            app.logger.info(f"Heartbeat actualizado: MAC={mac_address}, Slot={now.strftime('%H')}:{slot_name}")
         except Exception as db_error:
             app.logger.error(f"Error al guardar heartbeat en la base de datos: {str(db_error)}")
             db.session.rollback()
@@ -2243,9 +3272,9 @@ def device_reboot():
         app.logger.info(f"Purgando datos de historial de heartbeats anteriores a: {seven_days_ago}")
         
         try:
-            # Purgar historial de heartbeats antiguos
-            deleted_heartbeats = DeviceHeartbeatHistory.query.filter(
-                DeviceHeartbeatHistory.timestamp < seven_days_ago
+            # Purgar historial de heartbeats antiguos (bitmaps de días completos)
+            deleted_heartbeats = DeviceHeartbeatBitmap.query.filter(
+                DeviceHeartbeatBitmap.day < seven_days_ago.date()
             ).delete()
             
             # Purgar logs de acciones antiguos (también 7 días)
@@ -2345,79 +3374,80 @@ def get_device_status_endpoint(mac_address):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Tiempo sin heartbeat tras el cual una placa pasa a 'warning' y a 'offline'
+DEVICE_WARNING_AFTER = timedelta(minutes=2)
+DEVICE_OFFLINE_AFTER = timedelta(minutes=5)
+
+def heartbeat_status(last_heartbeat, now):
+    """Estado que corresponde al último heartbeat (naive = hora local) en el instante `now`"""
+    time_diff = now - time_service.localize(last_heartbeat)
+    if time_diff > DEVICE_OFFLINE_AFTER:
+        return 'offline'
+    if time_diff > DEVICE_WARNING_AFTER:
+        return 'warning'
+    return 'online'
+
+def current_device_status(heartbeat):
+    """
+    Estado de una placa tal como lo dejó el barrido de estados (sweep_device_status).
+    Si el barrido no corrió en este proceso en los últimos dos intervalos (por
+    ejemplo, un worker recién iniciado), se calcula desde el último heartbeat.
+    """
+    last_run = device_status_job.last_run
+    stale_after = timedelta(seconds=2 * device_status_job.interval)
+    if heartbeat.last_heartbeat and (last_run is None or time_service.now_naive() - last_run > stale_after):
+        return heartbeat_status(heartbeat.last_heartbeat, time_service.now_local())
+    return heartbeat.status
+
+def device_status_info(board, heartbeat):
+    """
+    Estado de la placa de un establecimiento según current_device_status, sin
+    consultar ni escribir la base de datos.
+    """
+    if not board:
+        return {
+            'status': 'no_device', 
+            'status_message': 'Sin dispositivo configurado',
+            'last_heartbeat_offline': None,
+            'firmware_version': 'N/A'
+        }
+    if not heartbeat:
+        return {
+            'status': 'no_data', # Nuevo estado para dispositivo registrado pero sin datos
+            'status_message': 'Dispositivo sin datos de actividad',
+            'last_heartbeat_offline': None,
+            'firmware_version': 'N/A'
+        }
+    
+    status = current_device_status(heartbeat)
+    status_info = {
+        'status': status, 
+        'status_message': 'Desconocido',
+        'last_heartbeat_offline': None,
+        'firmware_version': heartbeat.firmware_version if heartbeat.firmware_version else 'N/A'
+    }
+    
+    if status == 'online':
+        status_info['status_message'] = 'Dispositivo conectado'
+    elif status == 'offline':
+        status_info['status_message'] = 'Dispositivo desconectado'
+        if heartbeat.last_heartbeat: # Usar el valor original de la BBDD
+            status_info['last_heartbeat_offline'] = format_datetime(heartbeat.last_heartbeat)
+    elif status == 'warning':
+        status_info['status_message'] = 'Dispositivo con conexión inestable'
+        if heartbeat.last_heartbeat: # Usar el valor original de la BBDD
+            status_info['last_heartbeat_offline'] = format_datetime(heartbeat.last_heartbeat)
+    
+    return status_info
+
 def get_device_status_for_establishment(establishment):
     """
-    Obtiene el estado del dispositivo para un establecimiento
+    Obtiene el estado del dispositivo para un establecimiento (solo lectura)
     """
     try:
         board = Board.query.filter_by(establishment_id=establishment.id).first()
-        if not board:
-            app.logger.debug(f"No se encontró placa para el establecimiento {establishment.name}")
-            return {
-                'status': 'no_device', 
-                'status_message': 'Sin dispositivo configurado',
-                'last_heartbeat_offline': None,
-                'firmware_version': 'N/A'
-            }
-            
-        heartbeat = DeviceHeartbeat.query.filter_by(mac_address=board.mac_address).first()
-        if not heartbeat:
-            app.logger.debug(f"No se encontró heartbeat para la placa {board.mac_address}")
-            return {
-                'status': 'no_data', # Nuevo estado para dispositivo registrado pero sin datos
-                'status_message': 'Dispositivo sin datos de actividad',
-                'last_heartbeat_offline': None,
-                'firmware_version': 'N/A'
-            }
-            
-        now = datetime.now(pytz.timezone('America/Argentina/Buenos_Aires'))
-        
-        # Asegurarse de que last_heartbeat tenga zona horaria
-        if heartbeat.last_heartbeat is None:
-            last_heartbeat = now
-        elif heartbeat.last_heartbeat.tzinfo is None:
-            last_heartbeat = pytz.timezone('America/Argentina/Buenos_Aires').localize(heartbeat.last_heartbeat)
-            
-        time_diff = now - last_heartbeat
-        
-        app.logger.debug(f"Último heartbeat de {board.mac_address} hace {time_diff.total_seconds() / 60:.1f} minutos")
-        
-        # Actualizar el estado en la base de datos y retornarlo
-        if time_diff > timedelta(minutes=5):
-            new_status = 'offline'
-            app.logger.info(f"Dispositivo {board.mac_address} marcado como offline (último heartbeat hace {time_diff.total_seconds() / 60:.1f} minutos)")
-        elif time_diff > timedelta(minutes=2):
-            new_status = 'warning'
-            app.logger.info(f"Dispositivo {board.mac_address} marcado como warning (último heartbeat hace {time_diff.total_seconds() / 60:.1f} minutos)")
-        else:
-            new_status = 'online'
-            app.logger.debug(f"Dispositivo {board.mac_address} online (último heartbeat hace {time_diff.total_seconds() / 60:.1f} minutos)")
-        
-        # Solo actualizar si el estado ha cambiado
-        if heartbeat.status != new_status:
-            app.logger.info(f"Actualizando estado de {board.mac_address} de {heartbeat.status} a {new_status}")
-            heartbeat.status = new_status
-            db.session.commit()
-        
-        status_info = {
-            'status': new_status, 
-            'status_message': 'Desconocido',
-            'last_heartbeat_offline': None,  # Asegurar inicialización correcta aquí
-            'firmware_version': heartbeat.firmware_version if heartbeat.firmware_version else 'N/A'
-        }
-        
-        if new_status == 'online':
-            status_info['status_message'] = 'Dispositivo conectado'
-        elif new_status == 'offline':
-            status_info['status_message'] = 'Dispositivo desconectado'
-            if heartbeat and heartbeat.last_heartbeat: # Usar el valor original de la BBDD
-                status_info['last_heartbeat_offline'] = format_datetime(heartbeat.last_heartbeat)
-        elif new_status == 'warning':
-            status_info['status_message'] = 'Dispositivo con conexión inestable'
-            if heartbeat and heartbeat.last_heartbeat: # Usar el valor original de la BBDD
-                status_info['last_heartbeat_offline'] = format_datetime(heartbeat.last_heartbeat)
-        
-        return status_info
+        heartbeat = DeviceHeartbeat.query.filter_by(mac_address=board.mac_address).first() if board else None
+        return device_status_info(board, heartbeat)
         
     except Exception as e:
         app.logger.error(f"Error obteniendo estado del dispositivo: {str(e)}")
@@ -2454,26 +3484,196 @@ def utility_processor():
         return value.strftime(format)
 
     def get_active_alerts():
-        return ProtectionAlert.query.filter_by(active=True).order_by(ProtectionAlert.timestamp.desc()).all()
+        return current_fleet_status()['alerts']
 
-    def get_all_establishments():
-        return Establishment.query.all()
-
-    def get_establishment_status(establishment):
-        """Obtiene el estado del dispositivo para un establecimiento específico."""
-        status_dict = get_device_status_for_establishment(establishment)
-        app.logger.info(f"[DEBUG BASE.HTML] Est: '{establishment.name}', Status_dict: {status_dict}") # Log para depuración
-        return status_dict
+    def get_fleet_status():
+        """Estado de los establecimientos visibles para el usuario (de la foto de la flota)"""
+        establishments = current_fleet_status()['establishments']
+        if current_user.role == 'super_admin':
+            return establishments
+        establishment_ids = current_user.establishment_ids
+        return [entry for entry in establishments if entry['id'] in establishment_ids]
 
     return dict(
         format_datetime=format_datetime,
         get_active_alerts=get_active_alerts,
-        get_all_establishments=get_all_establishments,
-        get_establishment_status=get_establishment_status
+        get_fleet_status=get_fleet_status
     )
 
+def sweep_device_status():
+    """
+    Recalcula el estado de todas las placas a partir de su último heartbeat en una
+    sola pasada. Es el único que escribe DeviceHeartbeat.status: guarda cada cambio
+    como transición con la hora en que realmente ocurrió (el heartbeat que la
+    reactivó, o el último heartbeat más el umbral de warning/offline), así la
+    duración de los cortes no depende de cada cuánto corre el barrido.
+
+    Cada worker corre su propio barrido: el cambio de estado es un UPDATE
+    condicionado al estado leído, y la transición solo se guarda si ese UPDATE
+    modificó la fila. Si dos barridos ven el mismo cambio, lo registra uno solo.
+
+    Returns:
+        int: Cantidad de transiciones registradas
+    """
+    now = time_service.now_local()
+    transitions = []
+    live_values = []
+    for heartbeat in DeviceHeartbeat.query.filter(DeviceHeartbeat.last_heartbeat.isnot(None)):
+        new_status = heartbeat_status(heartbeat.last_heartbeat, now)
+        live_values.append(('estado', heartbeat.mac_address, new_status))
+        if new_status == heartbeat.status:
+            continue
+        changed = db.session.execute(
+            update(DeviceHeartbeat)
+            .where(DeviceHeartbeat.id == heartbeat.id, DeviceHeartbeat.status == heartbeat.status)
+            .values(status=new_status)
+            .execution_options(synchronize_session=False)
+        ).rowcount == 1
+        if not changed:
+            continue  # otro barrido ya registró este cambio
+        last_heartbeat = time_service.to_storage(heartbeat.last_heartbeat)
+        if new_status == 'online':
+            changed_at = last_heartbeat
+        elif new_status == 'warning':
+            changed_at = last_heartbeat + DEVICE_WARNING_AFTER
+        else:
+            changed_at = last_heartbeat + DEVICE_OFFLINE_AFTER
+        transitions.append({
+            'mac_address': heartbeat.mac_address,
+            'from_status': heartbeat.status,
+            'to_status': new_status,
+            'timestamp': changed_at,
+            'detected_at': time_service.to_storage(now)
+        })
+    if transitions:
+        db.session.execute(insert(DeviceStatusTransition), transitions)
+    publish_live_values(live_values)
+    db.session.commit()
+    if transitions:
+        fleet_status.invalidate()
+    return len(transitions)
+
+device_status_job = PeriodicJob('device_status_sweep', app.config['DEVICE_STATUS_SWEEP_INTERVAL'], sweep_device_status)
+
+@app.route('/api/device_status_transitions')
+@login_required
+@read_replica
+def device_status_transitions():
+    """
+    Cambios de estado de una placa ('mac_address') entre 'desde' y 'hasta'
+    (ISO 8601, por defecto últimos 30 días) y los cortes (offline) con su duración.
+    """
+    mac_address = request.args.get('mac_address')
+    if not mac_address:
+        return jsonify({'error': 'mac_address es requerido'}), 400
+    board = Board.query.filter_by(mac_address=standardize_mac(mac_address)).first()
+    if not board:
+        return jsonify({'error': 'Dispositivo no registrado'}), 404
+    if not current_user.can_access_establishment(board.establishment_id):
+        return jsonify({'error': 'Acceso no autorizado'}), 403
+    try:
+        start, end = _parse_history_range()
+    except ValueError:
+        return jsonify({'error': 'Formato de fecha inválido. Use formato ISO 8601'}), 400
+
+    transitions = DeviceStatusTransition.query.filter(
+        DeviceStatusTransition.mac_address == board.mac_address,
+        DeviceStatusTransition.timestamp >= start,
+        DeviceStatusTransition.timestamp <= end
+    ).order_by(DeviceStatusTransition.timestamp, DeviceStatusTransition.id).all()
+
+    # Un corte va desde que pasa a offline hasta que vuelve a estar online
+    outages = []
+    outage_start = None
+    for transition in transitions:
+        if transition.to_status == 'offline' and outage_start is None:
+            outage_start = transition.timestamp
+        elif transition.to_status == 'online' and outage_start is not None:
+            outages.append({
+                'desde': outage_start.isoformat(),
+                'hasta': transition.timestamp.isoformat(),
+                'minutos': round((transition.timestamp - outage_start).total_seconds() / 60, 1)
+            })
+            outage_start = None
+    if outage_start is not None:
+        outages.append({'desde': outage_start.isoformat(), 'hasta': None, 'minutos': None})
+
+    return jsonify({
+        'mac_address': board.mac_address,
+        'transitions': [{
+            'from_status': transition.from_status,
+            'to_status': transition.to_status,
+            'timestamp': transition.timestamp.isoformat(),
+            'detected_at': transition.detected_at.isoformat()
+        } for transition in transitions],
+        'outages': outages
+    })
+
+def build_fleet_status():
+    """
+    Calcula la foto de la flota con una cantidad fija de consultas (establecimientos,
+    placas, heartbeats y alertas activas), sin importar cuántos establecimientos haya.
+    """
+    establishments = Establishment.query.order_by(Establishment.id).all()
+    boards = {}
+    for board in Board.query.order_by(Board.id):
+        boards.setdefault(board.establishment_id, board)
+    heartbeats = {}
+    if boards:
+        heartbeats = {
+            heartbeat.mac_address: heartbeat
+            for heartbeat in DeviceHeartbeat.query.filter(
+                DeviceHeartbeat.mac_address.in_([board.mac_address for board in boards.values()])
+            )
+        }
+
+    alerts = []
+    alert_counts = {}
+    for alert, silo, establishment in db.session.query(ProtectionAlert, Silo, Establishment)\
+            .join(Silo, ProtectionAlert.silo_id == Silo.id)\
+            .join(Establishment, Silo.establishment_id == Establishment.id)\
+            .filter(ProtectionAlert.active == True)\
+            .order_by(ProtectionAlert.timestamp.desc()):
+        alert_counts[establishment.id] = alert_counts.get(establishment.id, 0) + 1
+        alerts.append({
+            'id': alert.id,
+            'establishment_id': establishment.id,
+            'establishment_name': establishment.name,
+            'silo_name': silo.name,
+            'silo_position': silo.aerator_position,
+            'timestamp': alert.timestamp
+        })
+
+    entries = []
+    for establishment in establishments:
+        board = boards.get(establishment.id)
+        entries.append({
+            'id': establishment.id,
+            'name': establishment.name,
+            'status': device_status_info(board, heartbeats.get(board.mac_address) if board else None),
+            'active_alerts': alert_counts.get(establishment.id, 0)
+        })
+    return {'establishments': entries, 'alerts': alerts, 'built_at': time_service.now_local().isoformat()}
+
+def refresh_fleet_status():
+    snapshot = build_fleet_status()
+    fleet_status.set(snapshot)
+    return len(snapshot['establishments'])
+
+def current_fleet_status():
+    """Foto vigente de la flota; si no hay (o venció), se calcula en el momento"""
+    snapshot = fleet_status.get()
+    if snapshot is None:
+        snapshot = build_fleet_status()
+        fleet_status.set(snapshot)
+    return snapshot
+
+fleet_status = FleetStatusCache(max_age=3 * app.config['FLEET_STATUS_INTERVAL'])
+fleet_status_job = PeriodicJob('fleet_status', app.config['FLEET_STATUS_INTERVAL'], refresh_fleet_status)
+
 @app.route('/raw_stats', methods=['GET'])
 @login_required
+@read_replica
 def raw_stats():
     try:
         # Obtener el periodo de tiempo desde el parámetro de la URL
@@ -2489,12 +3689,28 @@ def raw_stats():
         app.logger.info(f"Obtenidos {len(establishments)} establecimientos")
         
         stats = []
-        tz = pytz.timezone('America/Argentina/Buenos_Aires')
-        end_date = datetime.now(tz)
+        end_date = time_service.now_local()
         start_date = end_date - timedelta(days=days)
         
         app.logger.info(f"Buscando datos desde {start_date} hasta {end_date} (periodo: {days} días)")
 
+        # Libro de horas de todos los silos visibles: totales diarios del periodo y totales históricos
+        silo_ids = [silo.id for establishment in establishments for silo in establishment.silos]
+        daily_by_silo = {}
+        totals = {}
+        if silo_ids:
+            for silo_id, day, hours in db.session.query(
+                    AeratorRuntimeDaily.silo_id, AeratorRuntimeDaily.day, AeratorRuntimeDaily.runtime_hours
+            ).filter(
+                AeratorRuntimeDaily.silo_id.in_(silo_ids),
+                AeratorRuntimeDaily.day >= start_date.date()
+            ).order_by(AeratorRuntimeDaily.day):
+                daily_by_silo.setdefault(silo_id, {})[day.isoformat()] = float(hours)
+            totals = {
+                total.silo_id: total
+                for total in AeratorRuntimeTotal.query.filter(AeratorRuntimeTotal.silo_id.in_(silo_ids))
+            }
+
         for establishment in establishments:
             app.logger.info(f"Procesando establecimiento: {establishment.name}")
             
@@ -2502,53 +3718,16 @@ def raw_stats():
             device_status = get_device_status_for_establishment(establishment)
             
             for silo in establishment.silos:
-                app.logger.info(f"Procesando silo: {silo.name} (posición {silo.aerator_position})")
-                
-                # Obtener registros de tiempo de funcionamiento de los últimos 30 días
-                runtimes = AeratorRuntime.query.filter(
-                    AeratorRuntime.silo_id == silo.id,
-                    AeratorRuntime.timestamp >= start_date,
-                    AeratorRuntime.timestamp <= end_date
-                ).order_by(AeratorRuntime.timestamp.desc()).all()
-                
-                app.logger.info(f"Encontrados {len(runtimes)} registros en los últimos 30 días")
-                
-                # Calcular tiempo total de funcionamiento del último mes
-                total_hours = sum(runtime.runtime_hours for runtime in runtimes) if runtimes else 0
-                last_runtime = runtimes[0] if runtimes else None
+                # Horas por día del periodo y total del periodo
+                daily_hours = daily_by_silo.get(silo.id, {})
+                total_hours = sum(daily_hours.values())
+                days_with_data = sum(1 for hours in daily_hours.values() if hours > 0)
 
-                # Obtener total histórico
-                all_runtimes = AeratorRuntime.query.filter_by(silo_id=silo.id).all()
-                total_hours_all_time = sum(r.runtime_hours for r in all_runtimes)
-
-                # Calcular horas por día para los últimos 30 días
-                daily_hours = {}
-                days_with_data = 0
-                
-                if runtimes:
-                    current_date = None
-                    daily_total = 0
-                    
-                    for runtime in sorted(runtimes, key=lambda x: x.timestamp):
-                        runtime_date = runtime.timestamp.date()
-                        
-                        if current_date is None:
-                            current_date = runtime_date
-                            daily_total = runtime.runtime_hours
-                        elif runtime_date == current_date:
-                            daily_total += runtime.runtime_hours
-                        else:
-                            if daily_total > 0:
-                                days_with_data += 1
-                            daily_hours[current_date.isoformat()] = float(daily_total)
-                            current_date = runtime_date
-                            daily_total = runtime.runtime_hours
-                    
-                    # No olvidar el último día
-                    if daily_total > 0:
-                        days_with_data += 1
-                    if current_date:
-                        daily_hours[current_date.isoformat()] = float(daily_total)
+                # Total histórico y último registro (solo si cae dentro del periodo)
+                total = totals.get(silo.id)
+                total_hours_all_time = total.total_hours if total else 0.0
+                last_runtime = total if total and total.last_runtime_at and \
+                    total.last_runtime_at >= start_date.replace(tzinfo=None) else None
 
                 # Calcular promedio diario solo para días con datos
                 avg_daily_hours = total_hours / days_with_data if days_with_data > 0 else 0
@@ -2558,8 +3737,8 @@ def raw_stats():
                     'silo_name': silo.name,
                     'position': silo.aerator_position,
                     'device_status': device_status,
-                    'last_runtime': format_datetime(last_runtime.timestamp) if last_runtime else None,
-                    'last_duration': float(last_runtime.runtime_hours) if last_runtime else 0.0,
+                    'last_runtime': format_datetime(last_runtime.last_runtime_at) if last_runtime else None,
+                    'last_duration': float(last_runtime.last_duration) if last_runtime else 0.0,
                     'total_hours': float(total_hours),
                     'days_with_data': int(days_with_data),
                     'avg_daily_hours': float(avg_daily_hours),
@@ -2572,6 +3751,54 @@ def raw_stats():
         app.logger.error(f"Error en raw_stats: {str(e)}")
         return render_template('raw_stats.html', stats=[], error=str(e), period='30')
 
+@app.route('/api/get_aerator_stats/<int:silo_id>')
+@login_required
+def get_aerator_stats(silo_id):
+    """
+    Estadísticas del aireador de un silo: horas totales (del libro de horas),
+    estado actual y último cambio (según el log de acciones del ESP32) y las
+    últimas entradas de actividad.
+    """
+    silo = Silo.query.get_or_404(silo_id)
+    if not current_user.can_access_establishment(silo.establishment_id):
+        return jsonify({'error': 'Acceso no autorizado'}), 403
+
+    try:
+        total = db.session.get(AeratorRuntimeTotal, silo_id)
+
+        # Acciones ON/OFF exitosas del aireador de este silo
+        board_macs = [mac for (mac,) in db.session.query(Board.mac_address).filter_by(establishment_id=silo.establishment_id)]
+        actions = DeviceActionLog.query.filter(
+            DeviceActionLog.mac_address.in_(board_macs),
+            DeviceActionLog.position == silo.aerator_position,
+            DeviceActionLog.result == 'success'
+        ).order_by(DeviceActionLog.timestamp.desc()).limit(20).all() if board_macs else []
+
+        runtimes = AeratorRuntime.query.filter_by(silo_id=silo_id)\
+            .order_by(AeratorRuntime.timestamp.desc()).limit(20).all()
+
+        history = [
+            {'timestamp': a.timestamp.isoformat(), 'action': a.action, 'duration': None}
+            for a in actions
+        ] + [
+            {'timestamp': r.timestamp.isoformat(), 'action': 'OFF', 'duration': r.runtime_hours}
+            for r in runtimes
+        ]
+        history.sort(key=lambda entry: entry['timestamp'], reverse=True)
+
+        return jsonify({
+            'silo_id': silo_id,
+            'total_hours': float(total.total_hours) if total else 0.0,
+            'runs': total.runs if total else 0,
+            'current_state': actions[0].action if actions else 'OFF',
+            'last_change': actions[0].timestamp.isoformat() if actions else (
+                total.last_runtime_at.isoformat() if total and total.last_runtime_at else None),
+            'history': history[:20]
+        })
+    except Exception as e:
+        app.logger.error(f"Error en get_aerator_stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/reset_password/<int:user_id>', methods=['GET', 'POST'])
 @login_required
 def reset_password(user_id):
@@ -2623,6 +3850,9 @@ def recibir_corriente():
         try:
             current_value = float(data['corriente'])
             device_current_values[device_id] = current_value
+            if app.config['LIVE_STREAM_ENABLED']:
+                publish_live_values([('corriente', device_id, current_value)])
+                db.session.commit()
             print(f"Valor de corriente recibido para {device_id}: {current_value}") # Log
             return jsonify({'status': 'ok', 'mensaje': 'Valor recibido para ' + device_id}), 200
         except ValueError:
@@ -2765,17 +3995,15 @@ def _get_latest_silo_temperatures(silo_id):
         return {}
 
     latest_temperatures = {}
+    # Últimas lecturas de todos los sensores de la barra (formato legacy y compacto)
+    latest_readings = get_latest_readings(_bar_sensor_ids(barra_sensores))
     # Iterar sobre los campos sensorX_id de BarraSensores
     for i in range(1, 9):  # Para sensor1_id hasta sensor8_id
         sensor_id_attr = f'sensor{i}_id'
         sensor_id = getattr(barra_sensores, sensor_id_attr, None)
         
         if sensor_id:
-            # Obtener la última lectura para este sensor_id
-            # Se asume que LecturaTemperatura, desc y current_app están disponibles en este contexto.
-            last_reading = LecturaTemperatura.query.filter_by(sensor_id=sensor_id)\
-                .order_by(desc(LecturaTemperatura.timestamp))\
-                .first()
+            last_reading = latest_readings.get(sensor_id)
             
             if last_reading:
                 latest_temperatures[sensor_id] = {
@@ -2900,9 +4128,8 @@ def _check_temperature_data_freshness(latest_temperatures, max_age_days=7):
         return False, None
     
     from datetime import datetime, timedelta
-    import pytz
     
-    now = datetime.now(pytz.timezone('America/Argentina/Buenos_Aires'))
+    now = time_service.now_local()
     max_age = timedelta(days=max_age_days)
     oldest_timestamp = None
     
@@ -2912,7 +4139,7 @@ def _check_temperature_data_freshness(latest_temperatures, max_age_days=7):
             
             # Convertir timestamp a timezone-aware si no lo está
             if timestamp.tzinfo is None:
-                timestamp = pytz.timezone('America/Argentina/Buenos_Aires').localize(timestamp)
+                timestamp = time_service.localize(timestamp)
             
             # Encontrar el timestamp más antiguo
             if oldest_timestamp is None or timestamp < oldest_timestamp:
@@ -2963,7 +4190,7 @@ def _evaluate_intelligent_mode(silo, grain_type, hour_weather_data):
                 'silo_id': silo.id,
                 'silo_name': silo.name,
                 'reason': f"Datos de sensores muy antiguos ({age_str})",
-                'timestamp': datetime.now(pytz.timezone('America/Argentina/Buenos_Aires')).isoformat()
+                'timestamp': time_service.now_local().isoformat()
             }
             session['intelligent_mode_disabled_notifications'].append(notification)
             session.modified = True
@@ -3115,7 +4342,7 @@ def _get_silo_operation_forecast(silo, weather_data_list, grain_type=None):
             # Guardamos el objeto datetime completo por si se necesita más adelante,
             # ya que es la hora local correcta del pronóstico.
             # Lo hacemos "aware" de su zona horaria para evitar confusiones.
-            gmt3_tz = pytz.timezone('America/Argentina/Buenos_Aires')
+            gmt3_tz = time_service.LOCAL_TZ
             forecast_time_gmt3 = gmt3_tz.localize(local_forecast_time_naive)
         except ValueError:
             # Si el formato de la hora es incorrecto, marcar como no seguro.
@@ -3228,13 +4455,8 @@ def get_silo_operation_hours(silo_id):
         return None # o jsonify({'error': 'Datos meteorológicos no disponibles'}), 500
 
     # Filtrar weather_data para que comience desde la hora actual (GMT-3)
-    gmt3_tz = pytz.timezone('America/Argentina/Buenos_Aires')
-    utc_tz = pytz.utc
-    
-    # Calcular current_time_gmt3 de forma robusta
-    current_utc_time_for_filter = datetime.now(utc_tz)
-    current_gmt3_time_for_filter_ref = current_utc_time_for_filter.astimezone(gmt3_tz)
-    current_time_gmt3 = current_gmt3_time_for_filter_ref.replace(minute=0, second=0, microsecond=0)
+    gmt3_tz = time_service.LOCAL_TZ
+    current_time_gmt3 = time_service.hour_bucket(time_service.now_local())
     # print(f"[get_silo_operation_hours DBG] current_time_gmt3 for filtering: {current_time_gmt3}")
 
     weather_data_filtered = []
@@ -3419,11 +4641,8 @@ def manage_sensors():
         all_establishments = Establishment.query.all()
     else:
         # Admin regular solo puede ver sus establecimientos con sensores
-        establishments_with_sensors = []
-        for establishment in current_user.establishments:
-            if establishment.current_sensor_id:
-                establishments_with_sensors.append(establishment)
         all_establishments = current_user.establishments
+        establishments_with_sensors = [e for e in all_establishments if e.current_sensor_id]
     
     return render_template('manage_sensors.html', 
                           establishments=establishments_with_sensors,
@@ -3525,6 +4744,129 @@ def get_current_value(sensor_id):
     else:
         return jsonify({'status': 'error', 'mensaje': f'No se ha recibido ningún valor para el dispositivo {sensor_id}'}), 404
 
+# Campo con el identificador, campo con el valor y tipo del identificador de cada evento de /api/live
+LIVE_EVENT_FIELDS = {
+    'corriente': ('device_id', 'corriente', str),
+    'temperatura': ('sensor_id', 'temperatura', int),
+    'estado': ('mac_address', 'status', str)
+}
+
+def publish_live_values(values):
+    """
+    Guarda en LiveValue los últimos valores [(tipo, identificador, valor)] en una
+    sola sentencia; la versión de cada clave solo avanza si el valor cambió. No
+    hace commit (se confirma con la transacción de quien publica).
+    """
+    if not values or not app.config['LIVE_STREAM_ENABLED']:
+        return
+    version = int(time.time() * 1000)
+    rows = {(kind, str(ident)): json.dumps(value) for kind, ident, value in values}
+    # La versión se compara con el valor anterior (ver el orden de columnas de LiveValue)
+    _upsert(LiveValue, [
+        {'kind': kind, 'ident': ident, 'value': value, 'version': version}
+        for (kind, ident), value in rows.items()
+    ], ['kind', 'ident'], lambda inserted: {
+        'version': case((LiveValue.value != inserted.value, inserted.version), else_=LiveValue.version),
+        'value': inserted.value
+    })
+
+def live_update_targets():
+    """
+    Claves en vivo que el usuario actual puede ver, con los datos fijos que
+    acompañan cada evento: corriente de los sensores de sus establecimientos (solo
+    admin y super_admin, como /api/current_value), temperatura de los sensores de
+    las barras asignadas a sus silos y estado de sus placas.
+    """
+    establishment_ids = None if current_user.role == 'super_admin' else current_user.establishment_ids
+    targets = {}
+
+    if current_user.role in ['super_admin', 'admin']:
+        query = db.session.query(Establishment.id, Establishment.current_sensor_id, Establishment.max_operating_current)\
+            .filter(Establishment.current_sensor_id.isnot(None))
+        if establishment_ids is not None:
+            query = query.filter(Establishment.id.in_(establishment_ids))
+        for establishment_id, sensor_id, max_current in query:
+            targets[('corriente', str(sensor_id))] = {'establishment_id': establishment_id, 'max_corriente': max_current}
+
+    sensor_columns = [getattr(BarraSensores, f'sensor{i}_id') for i in range(1, 9)]
+    query = db.session.query(Silo.id, Silo.establishment_id, *sensor_columns)\
+        .join(BarraSensores, BarraSensores.silo_asignado_id == Silo.id)
+    if establishment_ids is not None:
+        query = query.filter(Silo.establishment_id.in_(establishment_ids))
+    for silo_id, establishment_id, *sensor_ids in query:
+        for sensor_id in sensor_ids:
+            if sensor_id:
+                targets[('temperatura', str(sensor_id))] = {'silo_id': silo_id, 'establishment_id': establishment_id}
+
+    query = db.session.query(Board.mac_address, Board.establishment_id)
+    if establishment_ids is not None:
+        query = query.filter(Board.establishment_id.in_(establishment_ids))
+    for mac_address, establishment_id in query:
+        targets[('estado', mac_address)] = {'establishment_id': establishment_id}
+
+    return targets, establishment_ids is None
+
+@app.route('/api/live')
+@login_required
+def live_stream():
+    """
+    Stream (Server-Sent Events) con los cambios de corriente, temperatura y estado
+    de placa que el usuario puede ver, en una sola conexión. Al conectarse envía
+    el último valor conocido de cada uno y después solo lo que cambia; un evento
+    'listo' marca el fin de ese envío inicial. Con Last-Event-ID (reconexión del
+    navegador) solo envía lo que cambió desde entonces. La conexión se cierra
+    cada LIVE_STREAM_MAX_AGE segundos y el navegador se reconecta solo.
+
+    Los valores se leen de LiveValue cada LIVE_STREAM_POLL segundos, así se ven
+    los publicados por cualquier proceso. Requiere LIVE_STREAM_ENABLED.
+    """
+    if not app.config['LIVE_STREAM_ENABLED']:
+        return jsonify({'error': 'Stream en vivo deshabilitado; consulte los valores periódicamente'}), 404
+    targets, sees_everything = live_update_targets()
+    # Un super_admin ve todo, incluso sensores y placas agregados después de conectarse
+    keys = None if sees_everything else set(targets)
+    cursor = LiveCursor(request.headers.get('Last-Event-ID', 0, type=int))
+    max_age = app.config['LIVE_STREAM_MAX_AGE']
+    poll = app.config['LIVE_STREAM_POLL']
+    ping = app.config['LIVE_STREAM_PING']
+
+    def changed_values():
+        rows = db.session.query(LiveValue.version, LiveValue.kind, LiveValue.ident, LiveValue.value)\
+            .filter(LiveValue.version > cursor.since()).all()
+        # Cerrar la transacción: la próxima consulta tiene que ver lo confirmado mientras tanto
+        db.session.rollback()
+        return cursor.advance(
+            (version, (kind, ident), value) for version, kind, ident, value in rows
+            if keys is None or (kind, ident) in keys
+        )
+
+    def generate():
+        deadline = time.monotonic() + max_age
+        last_sent = time.monotonic()
+        yield 'retry: 5000\n\n'
+        first = True
+        while True:
+            for version, (kind, ident), value in changed_values():
+                id_field, value_field, ident_type = LIVE_EVENT_FIELDS[kind]
+                data = {id_field: ident_type(ident), value_field: json.loads(value), **targets.get((kind, ident), {})}
+                yield format_event(kind, data, event_id=version)
+                last_sent = time.monotonic()
+            if first:
+                yield format_event('listo', {'version': cursor.version})
+                first = False
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if time.monotonic() - last_sent >= ping:
+                yield ': ping\n\n'
+                last_sent = time.monotonic()
+            time.sleep(min(poll, remaining))
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # sin buffer en nginx
+    })
+
 # ---------------------------------------------------------------------------
 # Rutas para la gestión de Sensores de Temperatura (Solo Super Admin)
 # ---------------------------------------------------------------------------
@@ -3533,8 +4875,8 @@ def get_current_value(sensor_id):
 @login_required
 @super_admin_required
 def manage_temperature_sensors():
-    sensores = SensorTemperatura.query.order_by(SensorTemperatura.id).all()
-    return render_template('temperature_management/manage_temperature_sensors.html', sensores=sensores)
+    page = admin_page(select(SensorTemperatura), SensorTemperatura.numero_serie, SensorTemperatura.id)
+    return render_template('temperature_management/manage_temperature_sensors.html', sensores=page.items, page=page)
 
 @app.route('/add_temperature_sensor', methods=['GET', 'POST'])
 @login_required
@@ -3673,8 +5015,16 @@ def get_all_sensor_ids_assigned_in_any_bar(session):
 @login_required
 @super_admin_required
 def manage_sensor_bars():
-    barras = BarraSensores.query.order_by(BarraSensores.nombre).all()
-    return render_template('temperature_management/manage_sensor_bars.html', barras=barras)
+    # El listado solo cuenta los sensores (sensorN_id): sin cargar los 8 sensores de cada barra
+    stmt = select(BarraSensores).options(
+        *(lazyload(getattr(BarraSensores, f'sensor{i}')) for i in range(1, 9)),
+        joinedload(BarraSensores.establecimiento),
+        joinedload(BarraSensores.silo_asignado).options(
+            joinedload(Silo.establishment), lazyload(Silo.barra_sensores_asociada)
+        )
+    )
+    page = admin_page(stmt, BarraSensores.nombre, BarraSensores.id)
+    return render_template('temperature_management/manage_sensor_bars.html', barras=page.items, page=page)
 
 @app.route('/add_sensor_bar', methods=['GET', 'POST'])
 @login_required
@@ -3756,6 +5106,7 @@ def add_sensor_bar():
                 sensor8_id=sensor_ids_from_form[7]
             )
             db.session.add(nueva_barra)
+            sync_sensor_assignments(_bar_sensor_ids(nueva_barra))
             db.session.commit()
             flash('Barra de sensores añadida correctamente. Puede asignarla a un silo desde la lista.', 'success')
             return redirect(url_for('manage_sensor_bars'))
@@ -3811,9 +5162,11 @@ def edit_sensor_bar(bar_id):
         
         try:
             # Assign collected sensor IDs to the bar object
+            previous_sensor_ids = _bar_sensor_ids(barra)
             for i in range(1, 9):
                 model_attr_name = f'sensor{i}_id'
                 setattr(barra, model_attr_name, selected_sensor_ids_map.get(model_attr_name))
+            sync_sensor_assignments(previous_sensor_ids + _bar_sensor_ids(barra))
             
             db.session.commit()
             flash('Asignaciones de sensores actualizadas correctamente.', 'success')
@@ -3891,6 +5244,7 @@ def assign_bar_to_silo_view(bar_id):
                 barra.establecimiento_id = silo_to_assign.establishment_id
                 flash(f'El establecimiento de la barra "{barra.nombre}" ha sido actualizado a "{silo_to_assign.establishment.name}" para coincidir con el silo.', 'info')
 
+            sync_sensor_assignments(_bar_sensor_ids(barra))
             db.session.commit()
             flash(f'Barra "{barra.nombre}" asignada correctamente al silo "{silo_to_assign.name}".', 'success')
             return redirect(url_for('manage_sensor_bars'))
@@ -3949,6 +5303,7 @@ def deassign_bar_from_silo(bar_id):
     silo_original_nombre = barra.silo_asignado.name
     try:
         barra.silo_asignado_id = None
+        sync_sensor_assignments(_bar_sensor_ids(barra))
         db.session.commit()
         flash(f'Barra "{barra.nombre}" desasignada correctamente del silo "{silo_original_nombre}".', 'success')
     except Exception as e:
@@ -3973,7 +5328,9 @@ def delete_sensor_bar(bar_id):
         return redirect(url_for('manage_sensor_bars'))
 
     try:
+        sensor_ids = _bar_sensor_ids(bar)
         db.session.delete(bar)
+        sync_sensor_assignments(sensor_ids)
         db.session.commit()
         flash(f'Barra de sensores "{bar.nombre}" eliminada correctamente.', 'success')
     except Exception as e:
@@ -4026,6 +5383,7 @@ def assign_bar_to_silo_action(bar_id):
         bar.silo_asignado_id = silo_to_assign.id
         bar.establecimiento_id = silo_to_assign.establishment_id
         # Las relaciones se actualizan automáticamente por SQLAlchemy al commitear las FKs
+        sync_sensor_assignments(_bar_sensor_ids(bar))
 
         db.session.commit()
         flash(f'Barra "{bar.nombre}" asignada correctamente al silo "{silo_to_assign.name}" (Est: {silo_to_assign.establishment.name}).', 'success')
@@ -4038,6 +5396,188 @@ def assign_bar_to_silo_action(bar_id):
         
     return redirect(url_for('manage_sensor_bars'))
 
+# ---------------------------------------------------------------------------
+# Alta masiva de silos, placas, sensores y barras (Solo Super Admin)
+# ---------------------------------------------------------------------------
+
+def check_provisioning_plan(plan):
+    """Valida el plan contra la BD con una consulta por tipo de dato, sin importar el tamaño del archivo"""
+    establishment_ids = plan.establishment_ids
+    existing_establishments = set(db.session.scalars(
+        select(Establishment.id).where(Establishment.id.in_(establishment_ids))
+    )) if establishment_ids else set()
+
+    existing_silos = []
+    if establishment_ids:
+        rows = db.session.execute(
+            select(Silo.id, Silo.establishment_id, Silo.name, Silo.aerator_position, BarraSensores.id)
+            .outerjoin(BarraSensores, BarraSensores.silo_asignado_id == Silo.id)
+            .where(Silo.establishment_id.in_(establishment_ids))
+        ).all()
+        existing_silos = [provisioning.ExistingSilo(silo_id, est_id, name, position, bar_id is not None)
+                          for silo_id, est_id, name, position, bar_id in rows]
+
+    # Las placas eliminadas conservan su MAC (única) hasta la purga
+    existing_macs = set(db.session.scalars(
+        select(Board.mac_address).where(Board.mac_address.in_(plan.macs)).execution_options(include_deleted=True)
+    )) if plan.macs else set()
+    existing_serials = dict(db.session.execute(
+        select(SensorTemperatura.numero_serie, SensorTemperatura.id)
+        .where(SensorTemperatura.numero_serie.in_(plan.serials))
+    ).all()) if plan.serials else {}
+    existing_bar_names = set(db.session.scalars(
+        select(BarraSensores.nombre).where(BarraSensores.nombre.in_(plan.bar_names))
+    )) if plan.bar_names else set()
+    assigned_sensor_ids = get_all_sensor_ids_assigned_in_any_bar(db.session) if plan.bars else set()
+
+    plan.check(existing_establishments, existing_silos, existing_macs, existing_serials,
+               existing_bar_names, assigned_sensor_ids)
+
+def apply_provisioning_plan(plan):
+    """
+    Inserta un plan ya validado con un INSERT por tabla (sensores, silos, placas,
+    barras y el historial de asignaciones). No hace commit: todo queda en la
+    transacción del request. Los ids generados se leen por sus claves únicas
+    (número de serie, posición en el establecimiento, nombre de barra).
+    """
+    now = time_service.now_local()
+
+    if plan.sensors:
+        db.session.execute(insert(SensorTemperatura), [
+            {'numero_serie': sensor['numero_serie'], 'descripcion': sensor['descripcion']}
+            for sensor in plan.sensors
+        ])
+    if plan.silos:
+        silo_fields = ('name', 'establishment_id', 'min_temperature', 'max_temperature', 'min_humidity',
+                       'max_humidity', 'peak_hours_shutdown', 'air_start_hour', 'air_end_hour', 'aerator_position')
+        db.session.execute(insert(Silo), [
+            dict({field: silo[field] for field in silo_fields}, modified=False)
+            for silo in plan.silos
+        ])
+    if plan.boards:
+        db.session.execute(insert(Board), [
+            {'mac_address': board['mac_address'], 'registration_date': now,
+             'establishment_id': board['establishment_id']}
+            for board in plan.boards
+        ])
+    if not plan.bars:
+        return
+
+    sensor_ids = dict(db.session.execute(
+        select(SensorTemperatura.numero_serie, SensorTemperatura.id)
+        .where(SensorTemperatura.numero_serie.in_(plan.serials))
+    ).all())
+    bar_establishments = {bar['establishment_id'] for bar in plan.bars if bar['silo_position'] is not None}
+    silo_ids = {
+        (est_id, position): silo_id for silo_id, est_id, position in db.session.execute(
+            select(Silo.id, Silo.establishment_id, Silo.aerator_position)
+            .where(Silo.establishment_id.in_(bar_establishments))
+        )
+    } if bar_establishments else {}
+
+    bar_rows = []
+    for bar in plan.bars:
+        silo_id = bar['silo_id']
+        if bar['silo_position'] is not None:
+            silo_id = silo_ids[(bar['establishment_id'], bar['silo_position'])]
+        row = {'nombre': bar['nombre'], 'establecimiento_id': bar['establishment_id'], 'silo_asignado_id': silo_id}
+        for slot, serial in zip(provisioning.BAR_SLOTS, bar['sensores']):
+            row[f'{slot}_id'] = sensor_ids[serial] if serial else None
+        bar_rows.append(row)
+    db.session.execute(insert(BarraSensores), bar_rows)
+
+    # Historial de asignaciones, igual que sync_sensor_assignments pero en bloque
+    bar_ids = dict(db.session.execute(
+        select(BarraSensores.nombre, BarraSensores.id).where(BarraSensores.nombre.in_(plan.bar_names))
+    ).all())
+    now_ts = to_epoch(now)
+    assignments = [
+        {'sensor_id': row[f'{slot}_id'], 'barra_id': bar_ids[row['nombre']],
+         'silo_id': row['silo_asignado_id'], 'desde': now_ts}
+        for row in bar_rows for slot in provisioning.BAR_SLOTS if row[f'{slot}_id']
+    ]
+    db.session.execute(
+        update(SensorAsignacionHistorial)
+        .where(SensorAsignacionHistorial.sensor_id.in_([a['sensor_id'] for a in assignments]),
+               SensorAsignacionHistorial.hasta.is_(None))
+        .values(hasta=now_ts)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(insert(SensorAsignacionHistorial), assignments)
+    mark_sensor_layout_changed()
+
+@app.route('/provisioning')
+@login_required
+@super_admin_required
+def provisioning_view():
+    establishments = Establishment.query.order_by(Establishment.name).all()
+    return render_template('provisioning.html', establishments=establishments,
+                           max_rows=app.config['PROVISIONING_MAX_ROWS'])
+
+@app.route('/api/provisioning', methods=['POST'])
+@login_required
+@super_admin_required
+def provisioning_import():
+    """
+    Alta masiva desde un archivo CSV (columna `tipo`: sensor, silo, placa, barra)
+    o JSON (lista de filas con los mismos campos), subido como `archivo` o en el
+    cuerpo del request. Se valida el archivo completo y, si alguna fila tiene
+    errores, no se inserta nada y se devuelve el reporte por fila. Con dry_run=1
+    solo se valida.
+    """
+    default_establishment_id = request.values.get('establishment_id', type=int)
+    dry_run = request.values.get('dry_run', '').lower() in ('1', 'true', 'si')
+    try:
+        upload = request.files.get('archivo')
+        if upload is not None:
+            try:
+                content = upload.read().decode('utf-8')
+            except UnicodeDecodeError:
+                raise provisioning.ProvisioningFileError('El archivo debe estar en UTF-8')
+            rows = provisioning.parse_content(content, upload.filename or '')
+        elif request.is_json:
+            body = request.get_json(silent=True)
+            if body is None:
+                raise provisioning.ProvisioningFileError('JSON inválido')
+            if isinstance(body, dict) and default_establishment_id is None:
+                default_establishment_id = body.get('establishment_id')
+            rows = provisioning.read_json(body)
+        else:
+            rows = provisioning.parse_content(request.get_data(as_text=True))
+        plan = provisioning.ProvisioningPlan(rows, default_establishment_id,
+                                             max_rows=app.config['PROVISIONING_MAX_ROWS'])
+    except provisioning.ProvisioningFileError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+
+    if not plan.total_rows:
+        return jsonify({'status': 'error', 'error': 'El archivo no tiene filas'}), 400
+
+    check_provisioning_plan(plan)
+    if not plan.ok:
+        return jsonify({'status': 'error', 'filas': plan.total_rows, 'errores': plan.report()}), 400
+    if dry_run:
+        return jsonify({'status': 'ok', 'dry_run': True, 'filas': plan.total_rows, 'a_crear': plan.counts()})
+
+    try:
+        apply_provisioning_plan(plan)
+        db.session.commit()
+    except IntegrityError as e:
+        # Otro request dio de alta lo mismo entre la validación y el insert
+        db.session.rollback()
+        current_app.logger.warning(f"Alta masiva rechazada por la BD: {e}")
+        return jsonify({'status': 'error', 'error': 'Conflicto con datos cargados mientras tanto; reintente'}), 409
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error en el alta masiva: {e}")
+        return jsonify({'status': 'error', 'error': str(e)}), 500
+
+    # Los INSERT en bloque no pasan por la sesión: se invalidan los cachés a mano
+    if plan.boards:
+        fleet_status.invalidate()
+    if plan.silos:
+        principals.invalidate()
+    return jsonify({'status': 'ok', 'filas': plan.total_rows, 'creados': plan.counts()})
+
 # TODO: Considerar una ruta para "desasignar" una barra de un silo.
 
 # ---------------------------------------------------------------------------
@@ -4122,74 +5662,527 @@ def intelligent_silo_settings(silo_id):
 
 
 # ---------------------------------------------------------------------------
-# Endpoint para registrar lecturas de temperatura desde sensores (ESP32)
+# Lecturas de temperatura: formato compacto e historial de asignaciones
 # ---------------------------------------------------------------------------
 
-@app.route('/api/temperature_reading', methods=['POST'])
-def api_temperature_reading():
+# Contadores por sensor para el muestreo del payload crudo
+_raw_payload_counters = {}
+_raw_payload_lock = threading.Lock()
+
+def _find_bar_for_sensor(sensor_id):
+    """Barra en la que está montado el sensor (en cualquiera de sus 8 posiciones)"""
+    return BarraSensores.query.filter(
+        or_(*[getattr(BarraSensores, f'sensor{i}_id') == sensor_id for i in range(1, 9)])
+    ).first()
+
+def _bar_sensor_ids(barra):
+    """IDs de los sensores asignados a una barra"""
+    return [getattr(barra, f'sensor{i}_id') for i in range(1, 9) if getattr(barra, f'sensor{i}_id')]
+
+def _now_epoch():
+    return to_epoch(time_service.now_local())
+
+def sync_sensor_assignments(sensor_ids):
     """
-    Recibe datos de temperatura de un sensor y los almacena asociados a barra y silo.
-    Espera JSON: {
-        "numero_serie": "string",  # obligatorio
-        "temperatura": float,       # obligatorio
-        "timestamp": "YYYY-MM-DDTHH:MM:SS"  # opcional, default=now
-    }
+    Actualiza el historial de asignaciones de los sensores indicados según el
+    estado actual de las barras. Solo cierra el intervalo vigente y abre uno nuevo
+    si cambió la barra o el silo. No hace commit: se llama antes del commit de la
+    operación que modificó las barras, y la disposición de barras en memoria se
+    recarga después de ese commit.
     """
-    data = request.get_json(force=True, silent=True)
-    if not data:
-        return jsonify({'status': 'error', 'message': 'No se recibió JSON válido.'}), 400
+    _sync_assignment_history(sensor_ids)
+    mark_sensor_layout_changed()
+
+def _sync_assignment_history(sensor_ids):
+    now_ts = _now_epoch()
+    for sensor_id in set(sensor_ids):
+        barra = _find_bar_for_sensor(sensor_id)
+        barra_id = barra.id if barra else None
+        silo_id = barra.silo_asignado_id if barra else None
+
+        vigente = SensorAsignacionHistorial.query.filter_by(sensor_id=sensor_id, hasta=None).first()
+        if vigente and vigente.barra_id == barra_id and vigente.silo_id == silo_id:
+            continue
+        if vigente:
+            vigente.hasta = now_ts
+        db.session.add(SensorAsignacionHistorial(
+            sensor_id=sensor_id, barra_id=barra_id, silo_id=silo_id, desde=now_ts
+        ))
+
+def mark_sensor_layout_changed():
+    """Anota que la transacción en curso cambia barras: la disposición se recarga al confirmarla"""
+    db.session.info['sensor_layout_changed'] = True
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _sensor_layout_committed(session):
+    # En after_commit no se puede consultar: se recarga al terminar el request
+    # (fuera de un request, como en los jobs, lo hace sensor_layout_job)
+    if session.info.pop('sensor_layout_changed', False) and has_request_context():
+        g.sensor_layout_changed = True
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _discard_sensor_layout_change(session, previous_transaction):
+    session.info.pop('sensor_layout_changed', None)
+
+@app.after_request
+def _refresh_changed_sensor_layout(response):
+    if g.pop('sensor_layout_changed', False):
+        try:
+            refresh_sensor_stats_layout()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Error al recargar la disposición de barras: {str(e)}")
+    return response
+
+def refresh_sensor_stats_layout():
+    """Carga en las estadísticas en memoria qué sensor está en cada posición de cada barra"""
+    rows = db.session.query(BarraSensores, Silo.name, Silo.establishment_id)\
+        .outerjoin(Silo, Silo.id == BarraSensores.silo_asignado_id).all()
+    sensor_statistics.set_layout(
+        BarLayout(barra.id, barra.silo_asignado_id, silo_name, establishment_id,
+                  [getattr(barra, f'sensor{i}_id') for i in range(1, 9)])
+        for barra, silo_name, establishment_id in rows
+    )
 
-    numero_serie = data.get('numero_serie')
-    temperatura = data.get('temperatura')
-    timestamp_str = data.get('timestamp')
+def checkpoint_sensor_stats():
+    """
+    Guarda las estadísticas de los sensores que cambiaron desde el último checkpoint.
+    Cada proceso guarda las suyas, así que una fila solo se reemplaza si el estado
+    nuevo tiene una lectura más reciente que el guardado.
+    """
+    dirty = sensor_statistics.take_dirty()
+    if not dirty:
+        return 0
+    rows = [{
+        'sensor_id': sensor_id,
+        'media': state.mean,
+        'varianza': state.var,
+        'tasa': state.rate,
+        'ultimo_valor': state.last_value,
+        'ultimo_ts': state.last_ts,
+        'lecturas': state.count
+    } for sensor_id, state in dirty.items()]
+    checkpoint = SensorStatsCheckpoint.__table__
+
+    def newer(inserted):
+        is_newer = inserted.ultimo_ts > checkpoint.c.ultimo_ts
+        return {column: case((is_newer, getattr(inserted, column)), else_=checkpoint.c[column])
+                for column in ('media', 'varianza', 'tasa', 'ultimo_valor', 'lecturas', 'ultimo_ts')}
 
-    if not numero_serie or temperatura is None:
-        return jsonify({'status': 'error', 'message': 'Faltan campos obligatorios (numero_serie, temperatura).'}), 400
+    try:
+        for i in range(0, len(rows), 500):
+            _upsert(SensorStatsCheckpoint, rows[i:i + 500], ['sensor_id'], newer)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        sensor_statistics.mark_dirty(dirty)
+        raise
+    return len(rows)
 
-    sensor = SensorTemperatura.query.filter_by(numero_serie=numero_serie).first()
-    if not sensor:
-        return jsonify({'status': 'error', 'message': f'Sensor con numero_serie {numero_serie} no encontrado.'}), 404
+def restore_sensor_stats():
+    """
+    Carga el último checkpoint de las estadísticas (al iniciar y antes de consultar
+    anomalías): trae lo que guardaron los demás procesos sin pisar los sensores de
+    los que este proceso tiene lecturas más nuevas.
+    """
+    sensor_statistics.restore({
+        row.sensor_id: SensorState(row.media, row.varianza, row.tasa, row.ultimo_valor, row.ultimo_ts, row.lecturas)
+        for row in SensorStatsCheckpoint.query.all()
+    })
 
-    # Buscar la barra asociada a este sensor
-    barra = BarraSensores.query.filter(
-        (BarraSensores.sensor1_id == sensor.id) |
-        (BarraSensores.sensor2_id == sensor.id) |
-        (BarraSensores.sensor3_id == sensor.id) |
-        (BarraSensores.sensor4_id == sensor.id) |
-        (BarraSensores.sensor5_id == sensor.id) |
-        (BarraSensores.sensor6_id == sensor.id) |
-        (BarraSensores.sensor7_id == sensor.id) |
-        (BarraSensores.sensor8_id == sensor.id)
-    ).first()
+def _get_open_assignment(sensor_id):
+    """Asignación vigente del sensor; si todavía no tiene historial, lo inicia"""
+    vigente = SensorAsignacionHistorial.query.filter_by(sensor_id=sensor_id, hasta=None).first()
+    if not vigente:
+        # Solo se inicia el historial: las barras no cambian y la disposición sigue valiendo
+        _sync_assignment_history([sensor_id])
+        vigente = SensorAsignacionHistorial.query.filter_by(sensor_id=sensor_id, hasta=None).first()
+    return vigente
+
+def _sample_raw_payload(sensor_id, data):
+    """Devuelve el payload en JSON si corresponde guardarlo según RAW_PAYLOAD_SAMPLE_RATE"""
+    rate = app.config['RAW_PAYLOAD_SAMPLE_RATE']
+    if rate <= 0:
+        return None
+    with _raw_payload_lock:
+        count = _raw_payload_counters.get(sensor_id, 0)
+        _raw_payload_counters[sensor_id] = count + 1
+    if count % rate:
+        return None
+    return json.dumps(data, separators=(',', ':'))
 
-    barra_id = barra.id if barra else None
-    silo_id = barra.silo_asignado_id if barra and barra.silo_asignado_id else None
+def _latest_per_sensor(model, order_column, sensor_ids):
+    """
+    Última fila de `model` por sensor (una consulta). El máximo de cada sensor sale
+    del índice (sensor_id, fecha) sin recorrer su historial y solo se leen esas filas;
+    si hay dos con la misma fecha queda la de mayor ID.
+    """
+    latest_ts = select(model.sensor_id, func.max(order_column).label('ultimo')).group_by(model.sensor_id)
+    if sensor_ids is not None:
+        latest_ts = latest_ts.where(model.sensor_id.in_(sensor_ids))
+    latest_ts = latest_ts.subquery()
+    latest = {}
+    for row in db.session.execute(select(model).join(latest_ts, and_(
+            model.sensor_id == latest_ts.c.sensor_id, order_column == latest_ts.c.ultimo))).scalars():
+        if row.sensor_id not in latest or row.id > latest[row.sensor_id].id:
+            latest[row.sensor_id] = row
+    return latest.values()
+
+def get_latest_readings(sensor_ids=None):
+    """
+    Última lectura de cada sensor buscando en ambos formatos (legacy y compacto).
+    Devuelve {sensor_id: lectura}; ambos modelos exponen .temperatura y .timestamp.
+    Con sensor_ids=None busca la de todos los sensores con lecturas (sin lista IN).
+    """
+    if sensor_ids is not None:
+        sensor_ids = list({sid for sid in sensor_ids if sid})
+        if not sensor_ids:
+            return {}
 
-    # Parsear timestamp si viene, sino usar ahora
-    if timestamp_str:
-        try:
-            timestamp = datetime.fromisoformat(timestamp_str)
-            if timestamp.tzinfo is None:
-                timestamp = pytz.timezone('America/Argentina/Buenos_Aires').localize(timestamp)
-        except Exception:
-            return jsonify({'status': 'error', 'message': 'Formato de timestamp inválido.'}), 400
-    else:
-        timestamp = datetime.now(pytz.timezone('America/Argentina/Buenos_Aires'))
+    latest = {lectura.sensor_id: lectura
+              for lectura in _latest_per_sensor(LecturaTemperatura, LecturaTemperatura.timestamp, sensor_ids)}
+    for lectura in _latest_per_sensor(LecturaTemperaturaCompacta, LecturaTemperaturaCompacta.ts, sensor_ids):
+        actual = latest.get(lectura.sensor_id)
+        if actual is None or lectura.timestamp > actual.timestamp:
+            latest[lectura.sensor_id] = lectura
 
-    lectura = LecturaTemperatura(
-        sensor_id=sensor.id,
-        barra_id=barra_id,
-        silo_id=silo_id,
+    return latest
+
+def compact_readings_for_silo_condition(silo_id):
+    """
+    Condición de las lecturas compactas de un silo: las que guardan el silo
+    explícitamente y las que lo derivan del historial de asignaciones.
+    """
+    conditions = [and_(LecturaTemperaturaCompacta.mapeo_explicito == True,
+                       LecturaTemperaturaCompacta.silo_id == silo_id)]
+    for intervalo in SensorAsignacionHistorial.query.filter_by(silo_id=silo_id).all():
+        condition = and_(
+            LecturaTemperaturaCompacta.sensor_id == intervalo.sensor_id,
+            LecturaTemperaturaCompacta.mapeo_explicito == False,
+            LecturaTemperaturaCompacta.ts >= intervalo.desde
+        )
+        if intervalo.hasta is not None:
+            condition = and_(condition, LecturaTemperaturaCompacta.ts < intervalo.hasta)
+        conditions.append(condition)
+    return or_(*conditions)
+
+def migrate_readings_to_compact(chunk_size=None, max_chunks=None, keep_payload=False):
+    """
+    Pasa las filas de lectura_temperatura al formato compacto, por bloques de IDs.
+
+    Cada bloque se inserta en lectura_temperatura_compacta y se borra de la tabla
+    legacy en la misma transacción, así que el proceso se puede cortar y retomar.
+    La barra y el silo solo se conservan cuando no coinciden con el historial de
+    asignaciones. Las lecturas fuera del rango de SMALLINT quedan en la tabla legacy.
+
+    Returns:
+        dict: Filas migradas, con mapeo explícito y omitidas
+    """
+    chunk_size = chunk_size or app.config['ARCHIVE_CHUNK_SIZE']
+    timeline = AssignmentTimeline(SensorAsignacionHistorial.query.all())
+    summary = {'migradas': 0, 'mapeo_explicito': 0, 'omitidas': 0, 'bloques': 0}
+    last_id = 0
+
+    while max_chunks is None or summary['bloques'] < max_chunks:
+        rows = LecturaTemperatura.query.filter(LecturaTemperatura.id > last_id)\
+            .order_by(LecturaTemperatura.id).limit(chunk_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        compactas = []
+        migrated_ids = []
+        for lectura in rows:
+            try:
+                temp_centi = encode_temperature(lectura.temperatura)
+            except ValueError:
+                summary['omitidas'] += 1
+                continue
+            ts = to_epoch(lectura.timestamp)
+            explicito = timeline.lookup(lectura.sensor_id, ts) != (lectura.barra_id, lectura.silo_id)
+            compactas.append({
+                'sensor_id': lectura.sensor_id,
+                'ts': ts,
+                'temp_centi': temp_centi,
+                'mapeo_explicito': explicito,
+                'barra_id': lectura.barra_id if explicito else None,
+                'silo_id': lectura.silo_id if explicito else None,
+                'raw_payload': lectura.raw_payload if keep_payload else None
+            })
+            migrated_ids.append(lectura.id)
+            summary['mapeo_explicito'] += int(explicito)
+
+        if compactas:
+            db.session.execute(insert(LecturaTemperaturaCompacta), compactas)
+            LecturaTemperatura.query.filter(LecturaTemperatura.id.in_(migrated_ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+        summary['migradas'] += len(compactas)
+        summary['bloques'] += 1
+        app.logger.info(f"Migración compacta: hasta ID {last_id}, {summary['migradas']} lecturas migradas")
+
+    return summary
+
+# Bytes por fila de las columnas de tamaño fijo en InnoDB (sin cabecera de fila) y
+# de las entradas de índices secundarios (clave + PK)
+READING_ROW_LAYOUT = {
+    'lectura_temperatura': {
+        # id, sensor_id, barra_id, silo_id (INT) + temperatura (FLOAT) + timestamp (DATETIME)
+        'columnas': 4 * 4 + 4 + 5,
+        # índices de las FKs sensor_id, barra_id y silo_id
+        'indices': 3 * (4 + 4)
+    },
+    'lectura_temperatura_compacta': {
+        # id, sensor_id, ts (INT) + temp_centi (SMALLINT) + mapeo_explicito (TINYINT);
+        # barra_id/silo_id nulos no ocupan espacio
+        'columnas': 3 * 4 + 2 + 1,
+        # índice (sensor_id, ts)
+        'indices': 4 + 4 + 4
+    }
+}
+
+def measure_reading_storage():
+    """
+    Compara los bytes por lectura de ambos formatos.
+
+    Siempre calcula una estimación a partir del contenido real (columnas fijas,
+    barra/silo explícitos y largo promedio del payload). En MySQL agrega la medición
+    de information_schema (datos + índices de InnoDB, incluye cabeceras y páginas).
+    """
+    result = {}
+    for table, model in (('lectura_temperatura', LecturaTemperatura),
+                         ('lectura_temperatura_compacta', LecturaTemperaturaCompacta)):
+        rows = db.session.query(func.count(model.id)).scalar() or 0
+        payload_bytes = db.session.query(func.coalesce(func.sum(func.length(model.raw_payload)), 0)).scalar()
+        layout = READING_ROW_LAYOUT[table]
+        bytes_per_row = layout['columnas'] + layout['indices']
+        if model is LecturaTemperaturaCompacta:
+            explicit_rows = db.session.query(func.count(model.id)).filter(model.mapeo_explicito == True).scalar() or 0
+            bytes_per_row += (8 * explicit_rows / rows) if rows else 0
+
+        info = {
+            'filas': rows,
+            'bytes_payload_promedio': round(payload_bytes / rows, 1) if rows else 0,
+            'bytes_por_lectura_estimado': round(bytes_per_row + (payload_bytes / rows if rows else 0), 1)
+        }
+
+        if db.engine.dialect.name == 'mysql':
+            stats = db.session.execute(text(
+                "SELECT DATA_LENGTH, INDEX_LENGTH FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+            ), {'table': table}).first()
+            if stats:
+                info['bytes_datos'] = int(stats[0] or 0)
+                info['bytes_indices'] = int(stats[1] or 0)
+                if rows:
+                    info['bytes_por_lectura_medido'] = round((info['bytes_datos'] + info['bytes_indices']) / rows, 1)
+
+        result[table] = info
+    return result
+
+@app.route('/api/readings/migrate_compact', methods=['POST'])
+@login_required
+@super_admin_required
+def run_compact_migration():
+    """Migra (o continúa migrando) las lecturas legacy al formato compacto"""
+    data = request.get_json(silent=True) or {}
+    try:
+        max_chunks = int(data['max_chunks']) if data.get('max_chunks') else None
+        chunk_size = int(data['chunk_size']) if data.get('chunk_size') else None
+    except (ValueError, TypeError):
+        return jsonify({'error': 'max_chunks y chunk_size deben ser enteros'}), 400
+
+    try:
+        summary = migrate_readings_to_compact(
+            chunk_size=chunk_size, max_chunks=max_chunks, keep_payload=bool(data.get('keep_payload'))
+        )
+        return jsonify({'status': 'success', **summary})
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error en la migración de lecturas: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/readings/storage_stats')
+@login_required
+@super_admin_required
+def reading_storage_stats():
+    """Bytes por lectura de los formatos legacy y compacto"""
+    return jsonify({
+        'modo': app.config['READING_STORAGE_MODE'],
+        'tablas': measure_reading_storage()
+    })
+
+# ---------------------------------------------------------------------------
+# Endpoint para registrar lecturas de temperatura desde sensores (ESP32)
+# ---------------------------------------------------------------------------
+
+def _build_reading(sensor_id, timestamp, temperatura, raw_payload):
+    """Crea la fila de lectura en el formato configurado (READING_STORAGE_MODE)"""
+    if app.config['READING_STORAGE_MODE'] == 'compact':
+        # La barra y el silo se derivan del historial; solo se guardan si la lectura
+        # es anterior al inicio de la asignación vigente
+        temp_centi = encode_temperature(temperatura)
+        asignacion = _get_open_assignment(sensor_id)
+        ts = to_epoch(timestamp)
+        explicito = ts < asignacion.desde
+        return LecturaTemperaturaCompacta(
+            sensor_id=sensor_id,
+            ts=ts,
+            temp_centi=temp_centi,
+            mapeo_explicito=explicito,
+            barra_id=asignacion.barra_id if explicito else None,
+            silo_id=asignacion.silo_id if explicito else None,
+            raw_payload=raw_payload
+        )
+
+    # Buscar la barra asociada a este sensor
+    barra = _find_bar_for_sensor(sensor_id)
+    return LecturaTemperatura(
+        sensor_id=sensor_id,
+        barra_id=barra.id if barra else None,
+        silo_id=barra.silo_asignado_id if barra and barra.silo_asignado_id else None,
         temperatura=temperatura,
         timestamp=timestamp,
-        raw_payload=str(data)
+        raw_payload=raw_payload
     )
-    db.session.add(lectura)
+
+@app.route('/api/temperature_reading', methods=['POST'])
+def api_temperature_reading():
+    """
+    Recibe datos de temperatura de un sensor y los almacena asociados a barra y silo.
+    Espera JSON: {
+        "numero_serie": "string",  # obligatorio
+        "temperatura": float,       # obligatorio
+        "timestamp": "YYYY-MM-DDTHH:MM:SS"  # opcional, default=now
+    }
+    """
+    data = request.get_json(force=True, silent=True)
+    if not data:
+        return jsonify({'status': 'error', 'message': 'No se recibió JSON válido.'}), 400
+
+    numero_serie = data.get('numero_serie')
+    temperatura = data.get('temperatura')
+    timestamp_str = data.get('timestamp')
+
+    if not numero_serie or temperatura is None:
+        return jsonify({'status': 'error', 'message': 'Faltan campos obligatorios (numero_serie, temperatura).'}), 400
+
+    sensor = SensorTemperatura.query.filter_by(numero_serie=numero_serie).first()
+    if not sensor:
+        return jsonify({'status': 'error', 'message': f'Sensor con numero_serie {numero_serie} no encontrado.'}), 404
+
+    # Parsear timestamp si viene, sino usar ahora
+    if timestamp_str:
+        try:
+            timestamp = datetime.fromisoformat(timestamp_str)
+            if timestamp.tzinfo is None:
+                timestamp = time_service.localize(timestamp)
+        except Exception:
+            return jsonify({'status': 'error', 'message': 'Formato de timestamp inválido.'}), 400
+    else:
+        timestamp = time_service.now_local()
+
+    raw_payload = _sample_raw_payload(sensor.id, data)
+
+    if not temperature_compressor.enabled:
+        try:
+            lectura = _build_reading(sensor.id, timestamp, temperatura, raw_payload)
+        except (ValueError, TypeError):
+            return jsonify({'status': 'error', 'message': 'Temperatura inválida.'}), 400
+        db.session.add(lectura)
+        publish_live_values([('temperatura', sensor.id, float(temperatura))])
+        db.session.commit()
+        sensor_statistics.update(sensor.id, to_epoch(timestamp), float(temperatura))
+        return jsonify({'status': 'ok', 'message': 'Lectura registrada', 'lectura_id': lectura.id}), 201
+
+    # Compresión: solo se guardan los puntos necesarios para reconstruir la serie
+    try:
+        ts = to_epoch(timestamp)
+        puntos = temperature_compressor.add(sensor.id, ts, float(temperatura), raw_payload)
+        lecturas = [
+            _build_reading(sensor.id, from_epoch(t), valor, payload)
+            for t, valor, payload in puntos
+        ]
+    except (ValueError, TypeError):
+        return jsonify({'status': 'error', 'message': 'Temperatura inválida.'}), 400
+
+    sensor_statistics.update(sensor.id, ts, float(temperatura))
+    publish_live_values([('temperatura', sensor.id, float(temperatura))])
+    if not lecturas:
+        db.session.commit()
+        return jsonify({'status': 'ok', 'message': 'Lectura dentro de la tolerancia, no se guarda', 'lectura_id': None}), 201
+    db.session.add_all(lecturas)
     db.session.commit()
-    return jsonify({'status': 'ok', 'message': 'Lectura registrada', 'lectura_id': lectura.id}), 201
+    return jsonify({'status': 'ok', 'message': 'Lectura registrada', 'lectura_id': lecturas[-1].id}), 201
+
+def save_held_readings(max_age=None):
+    """
+    Guarda las muestras que la compresión tiene retenidas (las que esperan hace
+    más de `max_age` segundos, o todas), para que no se pierda el último punto de
+    un sensor que dejó de reportar ni al reiniciar el proceso.
+    """
+    flushed = temperature_compressor.flush(max_age)
+    if not flushed:
+        return 0
+    try:
+        db.session.add_all(
+            _build_reading(sensor_id, from_epoch(t), valor, payload)
+            for sensor_id, (t, valor, payload) in flushed
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(flushed)
+
+def _save_all_held_readings():
+    with app.app_context():
+        try:
+            save_held_readings()
+        except Exception as e:
+            print(f'Error al guardar las lecturas retenidas por la compresión: {str(e)}')
+
+compression_flush_job = PeriodicJob(
+    'temperature_compression_flush', app.config['TEMP_COMPRESSION_FLUSH_INTERVAL'],
+    lambda: save_held_readings(max_age=app.config['TEMP_COMPRESSION_MAX_INTERVAL'])
+)
+if temperature_compressor.enabled:
+    atexit.register(_save_all_held_readings)
+
+sensor_stats_job = PeriodicJob('sensor_stats_checkpoint', app.config['SENSOR_STATS_CHECKPOINT_INTERVAL'], checkpoint_sensor_stats)
+# Recarga periódica de la disposición de barras: cambios de otros procesos o hechos fuera de un request
+sensor_layout_job = PeriodicJob('sensor_layout', app.config['SENSOR_LAYOUT_REFRESH_INTERVAL'], refresh_sensor_stats_layout)
+
+@app.route('/api/silos_con_anomalias')
+@login_required
+def silos_con_anomalias():
+    """
+    Silos con puntos calientes, tendencia de temperatura en aumento o gradiente
+    vertical fuera de rango, según las estadísticas en memoria (sin consultar lecturas).
+
+    Las lecturas se reparten entre los workers, así que antes de responder se
+    incorpora el checkpoint compartido; lo de otros procesos llega con hasta
+    SENSOR_STATS_CHECKPOINT_INTERVAL segundos de atraso.
+    """
+    restore_sensor_stats()
+    establishment_ids = None
+    if current_user.role != 'super_admin':
+        establishment_ids = current_user.establishment_ids
+    data = sensor_statistics.anomalies(establishment_ids)
+    return jsonify({
+        'status': 'success',
+        'umbrales': {
+            'punto_caliente': sensor_statistics.hotspot_delta,
+            'tendencia_grados_por_dia': sensor_statistics.rising_rate_per_day,
+            'gradiente': sensor_statistics.gradient_delta
+        },
+        'data': data,
+        'total': len(data)
+    })
 
 @app.route('/silo/<int:silo_id>/temperatures')
 @login_required
+@read_replica
 def view_silo_temperatures(silo_id):
     from datetime import datetime, timedelta
     from sqlalchemy import func
@@ -4203,22 +6196,18 @@ def view_silo_temperatures(silo_id):
     if barra:
         sensores = barra.get_ordered_sensors_with_data()
         # 2. Obtener la última lectura de cada sensor asignado
+        latest_readings = get_latest_readings([sensor['sensor_id'] for sensor in sensores])
         for sensor in sensores:
             if sensor['sensor_id']:
-                lectura = (
-                    LecturaTemperatura.query
-                    .filter_by(sensor_id=sensor['sensor_id'])
-                    .order_by(LecturaTemperatura.timestamp.desc())
-                    .first()
-                )
                 ultimas_lecturas.append({
                     'sensor': sensor,
-                    'lectura': lectura
+                    'lectura': latest_readings.get(sensor['sensor_id'])
                 })
             else:
                 ultimas_lecturas.append({'sensor': sensor, 'lectura': None})
         # 3. Obtener y procesar lecturas para el mapa de calor (últimos 30 días)
-        hace_30dias = datetime.now() - timedelta(days=30)
+        hace_30dias = time_service.now_naive() - timedelta(days=30)
+        utc_offset = int(time_service.now_local().utcoffset().total_seconds())
         heatmap_data = []
         sensor_labels = []
 
@@ -4228,24 +6217,52 @@ def view_silo_temperatures(silo_id):
             sensor_labels.append(sensor_label)
 
             if sensor_id:
+                # Suma y cantidad por día, para combinar ambos formatos de lectura
+                daily = {}
                 lecturas = (
                     db.session.query(
                         func.date(LecturaTemperatura.timestamp).label('fecha'),
-                        func.avg(LecturaTemperatura.temperatura).label('avg_temp')
+                        func.sum(LecturaTemperatura.temperatura).label('sum_temp'),
+                        func.count(LecturaTemperatura.id).label('count')
                     )
                     .filter(
                         LecturaTemperatura.sensor_id == sensor_id,
                         LecturaTemperatura.timestamp >= hace_30dias
                     )
                     .group_by('fecha')
-                    .order_by('fecha')
                     .all()
                 )
                 for lectura in lecturas:
+                    fecha = lectura.fecha if isinstance(lectura.fecha, str) else lectura.fecha.strftime('%Y-%m-%d')
+                    daily[fecha] = [lectura.sum_temp, lectura.count]
+
+                # En el formato compacto el día local se calcula sobre el epoch
+                local_ts = LecturaTemperaturaCompacta.ts + utc_offset
+                lecturas_compactas = (
+                    db.session.query(
+                        (local_ts - local_ts % 86400).label('dia'),
+                        func.sum(LecturaTemperaturaCompacta.temp_centi).label('sum_centi'),
+                        func.count(LecturaTemperaturaCompacta.id).label('count')
+                    )
+                    .filter(
+                        LecturaTemperaturaCompacta.sensor_id == sensor_id,
+                        LecturaTemperaturaCompacta.ts >= to_epoch(hace_30dias)
+                    )
+                    .group_by('dia')
+                    .all()
+                )
+                for lectura in lecturas_compactas:
+                    fecha = (datetime(1970, 1, 1) + timedelta(seconds=int(lectura.dia))).strftime('%Y-%m-%d')
+                    acumulado = daily.setdefault(fecha, [0.0, 0])
+                    acumulado[0] += decode_temperature(int(lectura.sum_centi))
+                    acumulado[1] += lectura.count
+
+                for fecha in sorted(daily):
+                    sum_temp, count = daily[fecha]
                     heatmap_data.append({
-                        'x': lectura.fecha.strftime('%Y-%m-%d'),
+                        'x': fecha,
                         'y': sensor_label,
-                        'v': round(lectura.avg_temp, 2)
+                        'v': round(sum_temp / count, 2)
                     })
 
     return render_template(
@@ -4258,167 +6275,108 @@ def view_silo_temperatures(silo_id):
         sensor_labels=sensor_labels
     )
 
+def _reading_age_status(ultima_lectura, ahora):
+    """
+    Estado de un sensor según la antigüedad de su última lectura y el tiempo
+    transcurrido formateado: ('sin_datos', None) si no tiene lecturas.
+    """
+    if not ultima_lectura:
+        return 'sin_datos', None
+    diferencia = ahora - time_service.localize(ultima_lectura.timestamp)
+    
+    # Determinar estado basado en tiempo transcurrido
+    if diferencia <= SENSOR_ACTIVE_WINDOW:
+        estado_sensor = 'activo'
+    elif diferencia <= timedelta(hours=2):
+        estado_sensor = 'reciente'
+    elif diferencia <= timedelta(days=1):
+        estado_sensor = 'antiguo'
+    else:
+        estado_sensor = 'muy_antiguo'
+    
+    # Formatear tiempo transcurrido
+    if diferencia.days > 0:
+        tiempo_desde_lectura = f"{diferencia.days} días"
+    elif diferencia.seconds > 3600:
+        tiempo_desde_lectura = f"{diferencia.seconds // 3600} horas"
+    else:
+        tiempo_desde_lectura = f"{diferencia.seconds // 60} minutos"
+    return estado_sensor, tiempo_desde_lectura
+
 @app.route('/sensors_overview')
 @login_required
 @super_admin_required
+@read_replica
 def sensors_overview():
     """
     Vista general de todos los sensores organizados por establecimiento y silo
     con sus últimas lecturas de temperatura.
     """
     try:
-        # Obtener todos los establecimientos
-        establecimientos = Establishment.query.all()
-        
-        # Estructura para organizar los datos
+        ahora = get_argentina_time()
+        
+        # Topología: barras asignadas con su silo y establecimiento (los sensores de
+        # la barra vienen en la misma consulta por sus relaciones lazy='joined')
+        topologia = db.session.query(Establishment, Silo, BarraSensores)\
+            .join(Silo, Silo.establishment_id == Establishment.id)\
+            .join(BarraSensores, BarraSensores.silo_asignado_id == Silo.id)\
+            .options(lazyload(Silo.barra_sensores_asociada))\
+            .order_by(Establishment.id, Silo.id).all()
+        
+        # Sensores asignados a alguna barra, todos los sensores y la última lectura de cada uno
+        asignados = get_all_sensor_ids_assigned_in_any_bar(db.session)
+        sensores_todos = SensorTemperatura.query.order_by(SensorTemperatura.id).all()
+        ultimas_lecturas = get_latest_readings([sensor.id for sensor in sensores_todos])
+        
+        # Estructura para organizar los datos (solo establecimientos con silos con sensores)
         datos_organizados = []
-        
-        for establecimiento in establecimientos:
-            establecimiento_data = {
-                'establecimiento': establecimiento,
-                'silos': []
-            }
-            
-            # Obtener silos del establecimiento que tienen barra de sensores
-            silos_con_barra = []
-            for silo in establecimiento.silos:
-                if hasattr(silo, 'barra_sensores_asociada') and silo.barra_sensores_asociada:
-                    silos_con_barra.append(silo)
+        for establecimiento, silo, barra in topologia:
+            if not datos_organizados or datos_organizados[-1]['establecimiento'].id != establecimiento.id:
+                datos_organizados.append({'establecimiento': establecimiento, 'silos': []})
             
-            for silo in silos_con_barra:
-                barra = silo.barra_sensores_asociada
-                sensores_data = []
-                
-                # Obtener datos de cada sensor en la barra (posiciones 1-8)
-                for i in range(1, 9):
-                    sensor_obj = getattr(barra, f'sensor{i}')
-                    sensor_id = getattr(barra, f'sensor{i}_id')
-                    
-                    if sensor_obj and sensor_id:
-                        # Obtener la última lectura
-                        ultima_lectura = LecturaTemperatura.query.filter_by(
-                            sensor_id=sensor_id
-                        ).order_by(desc(LecturaTemperatura.timestamp)).first()
-                        
-                        # Calcular tiempo desde la última lectura
-                        tiempo_desde_lectura = None
-                        estado_sensor = 'sin_datos'
-                        
-                        if ultima_lectura:
-                            ahora = get_argentina_time()
-                            if ultima_lectura.timestamp.tzinfo is None:
-                                timestamp_lectura = ultima_lectura.timestamp.replace(
-                                    tzinfo=pytz.timezone('America/Argentina/Buenos_Aires')
-                                )
-                            else:
-                                timestamp_lectura = ultima_lectura.timestamp
-                            
-                            diferencia = ahora - timestamp_lectura
-                            
-                            # Determinar estado basado en tiempo transcurrido
-                            if diferencia <= timedelta(minutes=30):
-                                estado_sensor = 'activo'
-                            elif diferencia <= timedelta(hours=2):
-                                estado_sensor = 'reciente'
-                            elif diferencia <= timedelta(days=1):
-                                estado_sensor = 'antiguo'
-                            else:
-                                estado_sensor = 'muy_antiguo'
-                            
-                            # Formatear tiempo transcurrido
-                            if diferencia.days > 0:
-                                tiempo_desde_lectura = f"{diferencia.days} días"
-                            elif diferencia.seconds > 3600:
-                                horas = diferencia.seconds // 3600
-                                tiempo_desde_lectura = f"{horas} horas"
-                            else:
-                                minutos = diferencia.seconds // 60
-                                tiempo_desde_lectura = f"{minutos} minutos"
-                        
-                        sensores_data.append({
-                            'posicion': i,
-                            'sensor': sensor_obj,
-                            'ultima_lectura': ultima_lectura,
-                            'tiempo_desde_lectura': tiempo_desde_lectura,
-                            'estado': estado_sensor
-                        })
-                    else:
-                        # Posición vacía
-                        sensores_data.append({
-                            'posicion': i,
-                            'sensor': None,
-                            'ultima_lectura': None,
-                            'tiempo_desde_lectura': None,
-                            'estado': 'vacio'
-                        })
-                
-                if sensores_data:  # Solo agregar si hay sensores
-                    establecimiento_data['silos'].append({
-                        'silo': silo,
-                        'barra': barra,
-                        'sensores': sensores_data
+            # Datos de cada sensor en la barra (posiciones 1-8)
+            sensores_data = []
+            for i in range(1, 9):
+                sensor_obj = getattr(barra, f'sensor{i}')
+                if sensor_obj:
+                    ultima_lectura = ultimas_lecturas.get(sensor_obj.id)
+                    estado_sensor, tiempo_desde_lectura = _reading_age_status(ultima_lectura, ahora)
+                    sensores_data.append({
+                        'posicion': i,
+                        'sensor': sensor_obj,
+                        'ultima_lectura': ultima_lectura,
+                        'tiempo_desde_lectura': tiempo_desde_lectura,
+                        'estado': estado_sensor
+                    })
+                else:
+                    # Posición vacía
+                    sensores_data.append({
+                        'posicion': i,
+                        'sensor': None,
+                        'ultima_lectura': None,
+                        'tiempo_desde_lectura': None,
+                        'estado': 'vacio'
                     })
             
-            # Solo agregar establecimiento si tiene silos con sensores
-            if establecimiento_data['silos']:
-                datos_organizados.append(establecimiento_data)
+            datos_organizados[-1]['silos'].append({
+                'silo': silo,
+                'barra': barra,
+                'sensores': sensores_data
+            })
         
-        # También obtener sensores que no están asignados a ninguna barra
+        # Sensores que no están asignados a ninguna barra
         sensores_sin_asignar = []
-        sensores_todos = SensorTemperatura.query.all()
-        
         for sensor in sensores_todos:
-            # Verificar si el sensor está asignado a alguna barra
-            asignado = False
-            for i in range(1, 9):
-                if BarraSensores.query.filter(getattr(BarraSensores, f'sensor{i}_id') == sensor.id).first():
-                    asignado = True
-                    break
-            
-            if not asignado:
-                # Obtener última lectura del sensor no asignado
-                ultima_lectura = LecturaTemperatura.query.filter_by(
-                    sensor_id=sensor.id
-                ).order_by(desc(LecturaTemperatura.timestamp)).first()
-                
-                tiempo_desde_lectura = None
-                estado_sensor = 'sin_datos'
-                
-                if ultima_lectura:
-                    ahora = get_argentina_time()
-                    if ultima_lectura.timestamp.tzinfo is None:
-                        timestamp_lectura = ultima_lectura.timestamp.replace(
-                            tzinfo=pytz.timezone('America/Argentina/Buenos_Aires')
-                        )
-                    else:
-                        timestamp_lectura = ultima_lectura.timestamp
-                    
-                    diferencia = ahora - timestamp_lectura
-                    
-                    if diferencia <= timedelta(minutes=30):
-                        estado_sensor = 'activo'
-                    elif diferencia <= timedelta(hours=2):
-                        estado_sensor = 'reciente'
-                    elif diferencia <= timedelta(days=1):
-                        estado_sensor = 'antiguo'
-                    else:
-                        estado_sensor = 'muy_antiguo'
-                    
-                    if diferencia.days > 0:
-                        tiempo_desde_lectura = f"{diferencia.days} días"
-                    elif diferencia.seconds > 3600:
-                        horas = diferencia.seconds // 3600
-                        tiempo_desde_lectura = f"{horas} horas"
-                    else:
-                        minutos = diferencia.seconds // 60
-                        tiempo_desde_lectura = f"{minutos} minutos"
-                
-                sensores_sin_asignar.append({
-                    'sensor': sensor,
-                    'ultima_lectura': ultima_lectura,
-                    'tiempo_desde_lectura': tiempo_desde_lectura,
-                    'estado': estado_sensor
-                })
+            if sensor.id in asignados:
+                continue
+            ultima_lectura = ultimas_lecturas.get(sensor.id)
+            estado_sensor, tiempo_desde_lectura = _reading_age_status(ultima_lectura, ahora)
+            sensores_sin_asignar.append({
+                'sensor': sensor,
+                'ultima_lectura': ultima_lectura,
+                'tiempo_desde_lectura': tiempo_desde_lectura,
+                'estado': estado_sensor
+            })
         
         return render_template('temperature_management/sensors_overview.html',
                              datos_organizados=datos_organizados,
@@ -4440,28 +6398,20 @@ def get_sensors_with_data():
     junto con su última lectura.
     """
     try:
-        # Consulta para obtener sensores con datos y su última lectura
-        sensores_con_datos = db.session.query(
-            SensorTemperatura.id,
-            SensorTemperatura.numero_serie,
-            SensorTemperatura.descripcion,
-            func.max(LecturaTemperatura.timestamp).label('ultima_lectura_timestamp'),
-            LecturaTemperatura.temperatura.label('ultima_temperatura')
-        ).join(
-            LecturaTemperatura, SensorTemperatura.id == LecturaTemperatura.sensor_id
-        ).group_by(
-            SensorTemperatura.id,
-            SensorTemperatura.numero_serie,
-            SensorTemperatura.descripcion
-        ).all()
+        # Cantidad de lecturas por sensor, sumando ambos formatos de almacenamiento
+        total_lecturas = {}
+        for model in (LecturaTemperatura, LecturaTemperaturaCompacta):
+            for sensor_id, total in db.session.query(model.sensor_id, func.count(model.id)).group_by(model.sensor_id):
+                total_lecturas[sensor_id] = total_lecturas.get(sensor_id, 0) + total
+        
+        ultimas_lecturas = get_latest_readings(list(total_lecturas))
+        sensores_con_datos = SensorTemperatura.query.filter(
+            SensorTemperatura.id.in_(list(total_lecturas))
+        ).order_by(SensorTemperatura.id).all() if total_lecturas else []
         
-        # Para cada sensor, obtener la temperatura de la última lectura
         resultado = []
         for sensor_data in sensores_con_datos:
-            # Obtener la lectura más reciente para obtener la temperatura exacta
-            ultima_lectura = LecturaTemperatura.query.filter_by(
-                sensor_id=sensor_data.id
-            ).order_by(desc(LecturaTemperatura.timestamp)).first()
+            ultima_lectura = ultimas_lecturas.get(sensor_data.id)
             
             if ultima_lectura:
                 resultado.append({
@@ -4470,7 +6420,7 @@ def get_sensors_with_data():
                     'descripcion': sensor_data.descripcion or 'Sin descripción',
                     'ultima_temperatura': ultima_lectura.temperatura,
                     'ultima_lectura_timestamp': format_datetime(ultima_lectura.timestamp, '%Y-%m-%d %H:%M:%S'),
-                    'total_lecturas': LecturaTemperatura.query.filter_by(sensor_id=sensor_data.id).count()
+                    'total_lecturas': total_lecturas[sensor_data.id]
                 })
         
         return jsonify({
@@ -4489,6 +6439,7 @@ def get_sensors_with_data():
 @app.route('/heartbeat_history')
 @login_required
 @super_admin_required
+@read_replica
 def heartbeat_history():
     """Página para visualizar el historial de heartbeats de dispositivos ESP32"""
     try:
@@ -4516,7 +6467,7 @@ def heartbeat_history():
                 try:
                     # Parsear la fecha seleccionada y convertir a timezone de Argentina
                     selected_dt = datetime.strptime(selected_date, '%Y-%m-%d')
-                    argentina_tz = pytz.timezone('America/Argentina/Buenos_Aires')
+                    argentina_tz = time_service.LOCAL_TZ
                     selected_dt = argentina_tz.localize(selected_dt)
                     
                     start_date = selected_dt
@@ -4553,26 +6504,18 @@ def heartbeat_history():
                 time_slots.extend(slots)
                 current_time += timedelta(hours=1)
             
-            # Obtener historial de heartbeats para estos dispositivos
+            # Bitmaps diarios y último heartbeat de todos los dispositivos (una consulta cada uno)
+            device_macs = [device.mac_address for device in devices]
+            bitmaps = get_heartbeat_bitmaps(device_macs, start_date.date(), end_date.date())
+            current_heartbeats = {
+                hb.mac_address: hb
+                for hb in DeviceHeartbeat.query.filter(DeviceHeartbeat.mac_address.in_(device_macs)).all()
+            } if device_macs else {}
+            slot_keys = [(slot_time.date(), heartbeat_bitmap.slot_index(slot_time)) for slot_time in time_slots]
+            
             for device in devices:
-                # Obtener registros de historial en el rango de tiempo, ordenados por timestamp
-                history_records = DeviceHeartbeatHistory.query.filter(
-                    DeviceHeartbeatHistory.mac_address == device.mac_address,
-                    DeviceHeartbeatHistory.timestamp >= start_date,
-                    DeviceHeartbeatHistory.timestamp <= end_date
-                ).order_by(DeviceHeartbeatHistory.timestamp.asc()).all()
-                
-                # Crear diccionario de registros por timestamp para búsqueda rápida
-                records_dict = {}
-                for record in history_records:
-                    if record.timestamp.tzinfo is None:
-                        timestamp_tz = record.timestamp.replace(tzinfo=pytz.timezone('America/Argentina/Buenos_Aires'))
-                    else:
-                        timestamp_tz = record.timestamp
-                    records_dict[timestamp_tz] = record
-                
                 # Obtener estado actual del dispositivo
-                current_heartbeat = DeviceHeartbeat.query.filter_by(mac_address=device.mac_address).first()
+                current_heartbeat = current_heartbeats.get(device.mac_address)
                 current_status = 'offline'
                 if current_heartbeat:
                     current_status = check_device_status(current_heartbeat.last_heartbeat)
@@ -4582,22 +6525,9 @@ def heartbeat_history():
                 received_count = 0
                 missing_count = 0
                 
-                for slot_time in time_slots:
-                    # Buscar si hay un registro para este slot específico
-                    found_record = None
-                    for timestamp_tz, record in records_dict.items():
-                        # Verificar si el registro está en el mismo slot
-                        if (timestamp_tz.hour == slot_time.hour and 
-                            abs(timestamp_tz.minute - slot_time.minute) <= 10):  # Tolerancia de ±10 min del centro del slot
-                            found_record = record
-                            break
-                    
-                    if found_record:
+                for slot_time, (day, index) in zip(time_slots, slot_keys):
+                    if heartbeat_bitmap.has_slot(bitmaps.get((device.mac_address, day), 0), index):
                         # Slot con datos (punto verde)
-                        actual_time = found_record.timestamp
-                        if actual_time.tzinfo is None:
-                            actual_time = actual_time.replace(tzinfo=pytz.timezone('America/Argentina/Buenos_Aires'))
-                        
                         point_data = {
                             'timestamp': slot_time.isoformat(),
                             'timestamp_ms': int(slot_time.timestamp() * 1000),
@@ -4605,7 +6535,7 @@ def heartbeat_history():
                             'has_data': True,
                             'status': 'received',
                             'type': 'heartbeat',
-                            'actual_time': actual_time.strftime('%H:%M'),
+                            'actual_time': slot_time.strftime('%H:%M'),
                             'slot_name': get_slot_name(slot_time.minute)
                         }
                         received_count += 1
@@ -4651,7 +6581,7 @@ def heartbeat_history():
             for record in action_records:
                 # Asegurar timezone correcto
                 if record.timestamp.tzinfo is None:
-                    timestamp_tz = record.timestamp.replace(tzinfo=pytz.timezone('America/Argentina/Buenos_Aires'))
+                    timestamp_tz = time_service.localize(record.timestamp)
                 else:
                     timestamp_tz = record.timestamp
                 
@@ -4683,11 +6613,17 @@ def heartbeat_history():
 @app.route('/api/heartbeat_history_data')
 @login_required
 @super_admin_required
+@read_replica
 def get_heartbeat_history_data():
-    """API endpoint para obtener datos de historial de heartbeats en formato JSON"""
+    """
+    API endpoint para obtener datos de historial de heartbeats en formato JSON.
+    Con formato=bitmap devuelve, por dispositivo, un string hexadecimal de 72 bits
+    por día (bit i = slot i de 20 minutos) en lugar de la lista de registros.
+    """
     try:
         establishment_id = request.args.get('establishment_id', type=int)
         time_range = request.args.get('time_range', '24h')
+        formato = request.args.get('formato', 'lista')
         
         if not establishment_id:
             return jsonify({'error': 'establishment_id requerido'}), 400
@@ -4703,54 +6639,137 @@ def get_heartbeat_history_data():
         
         # Obtener dispositivos del establecimiento
         devices = Board.query.filter_by(establishment_id=establishment_id).all()
+        device_macs = [device.mac_address for device in devices]
+        
+        # Bitmaps y estado actual de todos los dispositivos en una consulta cada uno
+        days = heartbeat_bitmap.days_between(start_date.date(), now.date())
+        bitmaps = get_heartbeat_bitmaps(device_macs, days[0], days[-1])
+        current_heartbeats = {
+            hb.mac_address: hb
+            for hb in DeviceHeartbeat.query.filter(DeviceHeartbeat.mac_address.in_(device_macs)).all()
+        } if device_macs else {}
+        argentina_tz = time_service.LOCAL_TZ
         
         result = []
         for device in devices:
-            # Obtener historial
-            history_records = DeviceHeartbeatHistory.query.filter(
-                DeviceHeartbeatHistory.mac_address == device.mac_address,
-                DeviceHeartbeatHistory.timestamp >= start_date,
-                DeviceHeartbeatHistory.timestamp <= now
-            ).order_by(DeviceHeartbeatHistory.timestamp.asc()).all()
-            
-            # Obtener estado actual
-            current_heartbeat = DeviceHeartbeat.query.filter_by(mac_address=device.mac_address).first()
+            current_heartbeat = current_heartbeats.get(device.mac_address)
             current_status = 'offline'
             if current_heartbeat:
                 current_status = check_device_status(current_heartbeat.last_heartbeat)
             
             device_data = {
                 'mac_address': device.mac_address,
-                'current_status': current_status,
-                'history': []
+                'current_status': current_status
             }
             
-            for record in history_records:
-                if record.timestamp.tzinfo is None:
-                    timestamp_tz = record.timestamp.replace(tzinfo=pytz.timezone('America/Argentina/Buenos_Aires'))
-                else:
-                    timestamp_tz = record.timestamp
-                
-                device_data['history'].append({
-                    'timestamp': timestamp_tz.isoformat(),
-                    'timestamp_ms': int(timestamp_tz.timestamp() * 1000),
-                    'status': 'online'
-                })
+            if formato == 'bitmap':
+                device_data['bitmaps'] = [
+                    heartbeat_bitmap.to_hex(bitmaps.get((device.mac_address, day), 0)) for day in days
+                ]
+            else:
+                device_data['history'] = []
+                for day in days:
+                    for index in heartbeat_bitmap.iter_slots(bitmaps.get((device.mac_address, day), 0)):
+                        timestamp_tz = argentina_tz.localize(heartbeat_bitmap.slot_time(day, index))
+                        if timestamp_tz < start_date or timestamp_tz > now:
+                            continue
+                        device_data['history'].append({
+                            'timestamp': timestamp_tz.isoformat(),
+                            'timestamp_ms': int(timestamp_tz.timestamp() * 1000),
+                            'status': 'online'
+                        })
             
             result.append(device_data)
         
-        return jsonify({
+        response = {
             'status': 'success',
             'data': result,
             'time_range': time_range,
             'start_date': start_date.isoformat(),
             'end_date': now.isoformat()
-        })
+        }
+        if formato == 'bitmap':
+            response['formato'] = 'bitmap'
+            response['slot_minutes'] = list(heartbeat_bitmap.SLOT_MINUTES)
+            response['days'] = [
+                {'date': day.isoformat(), 'start_ms': int(argentina_tz.localize(datetime(day.year, day.month, day.day)).timestamp() * 1000)}
+                for day in days
+            ]
+        return jsonify(response)
         
     except Exception as e:
         app.logger.error(f"Error en get_heartbeat_history_data: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def _production_daily_rows(model, granja_id, start, end):
+    """Registros diarios (fecha, galpones, total) de una granja en el rango, ordenados por fecha"""
+    return db.session.query(
+        model.fecha, model.galpon_1, model.galpon_2, model.galpon_3, model.galpon_4, model.total
+    ).filter(
+        model.granja_id == granja_id,
+        model.fecha >= start,
+        model.fecha <= end
+    ).order_by(model.fecha).all()
+
+@app.route('/api/produccion/analytics', methods=['GET'])
+def get_production_analytics():
+    """
+    Producción de huevos y mortalidad de una granja agrupadas por día, semana o mes.
+
+    Parámetros: granja_id (obligatorio), bucket=day|week|month (por defecto week),
+    desde / hasta (YYYY-MM-DD, por defecto los últimos 90 días) y ventana
+    (períodos de la media móvil).
+    """
+    try:
+        granja_id = request.args.get('granja_id', type=int)
+        if granja_id is None:
+            return jsonify({'error': 'El parámetro granja_id es obligatorio'}), 400
+
+        bucket = request.args.get('bucket', 'week')
+        if bucket not in production_analytics.BUCKETS:
+            return jsonify({'error': f'bucket debe ser uno de {list(production_analytics.BUCKETS)}'}), 400
+
+        window = request.args.get('ventana', default=production_analytics.DEFAULT_WINDOW[bucket], type=int)
+        if window is None or window < 1 or window > 366:
+            return jsonify({'error': 'ventana debe ser un entero entre 1 y 366'}), 400
+
+        today = time_service.today()
+        try:
+            end = datetime.strptime(request.args['hasta'], '%Y-%m-%d').date() if request.args.get('hasta') else today
+            start = datetime.strptime(request.args['desde'], '%Y-%m-%d').date() if request.args.get('desde') else end - timedelta(days=89)
+        except ValueError:
+            return jsonify({'error': 'Formato de fecha inválido. Use YYYY-MM-DD'}), 400
+        if start > end:
+            return jsonify({'error': 'desde no puede ser posterior a hasta'}), 400
+        if (end - start).days > 366 * 3:
+            return jsonify({'error': 'El rango máximo es de 3 años'}), 400
+
+        cache_key = (start, end, bucket, window)
+        result = production_cache.get(granja_id, cache_key)
+        if result is None:
+            version = production_cache.version(granja_id)
+            series = production_analytics.build_series(
+                _production_daily_rows(EggData, granja_id, start, end),
+                _production_daily_rows(MortalityData, granja_id, start, end),
+                start, end, bucket, window
+            )
+            result = {
+                'status': 'success',
+                'granja_id': granja_id,
+                'bucket': bucket,
+                'ventana': window,
+                'desde': start.isoformat(),
+                'hasta': end.isoformat(),
+                'data': series
+            }
+            production_cache.set(granja_id, cache_key, result, version=version)
+
+        return jsonify(result), 200
+
+    except Exception as e:
+        app.logger.error(f"Error en get_production_analytics: {str(e)}")
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
 @app.route('/api/huevos/latest', methods=['GET'])
 def get_latest_egg_data():
     """Endpoint para obtener los últimos registros de producción de huevos."""
@@ -4773,7 +6792,7 @@ def get_latest_egg_data():
         def serialize(record):
             timestamp = record.timestamp
             if timestamp.tzinfo is None:
-                timestamp = timestamp.replace(tzinfo=pytz.timezone('America/Argentina/Buenos_Aires'))
+                timestamp = time_service.localize(timestamp)
 
             return {
                 'id': record.id,
@@ -4784,7 +6803,7 @@ def get_latest_egg_data():
                 'galpon_3': record.galpon_3,
                 'galpon_4': record.galpon_4,
                 'total': record.total,
-                'created_at': record.created_at.replace(tzinfo=pytz.timezone('America/Argentina/Buenos_Aires')).isoformat() if record.created_at.tzinfo is None else record.created_at.isoformat()
+                'created_at': time_service.localize(record.created_at).isoformat() if record.created_at.tzinfo is None else record.created_at.isoformat()
             }
 
         data = [serialize(record) for record in records]
@@ -4796,90 +6815,177 @@ def get_latest_egg_data():
         return jsonify({'error': 'Error interno del servidor'}), 500
 
 
-@app.route('/api/mortalidad', methods=['POST'])
-def receive_mortality_data():
-    """Endpoint para recibir datos de mortalidad de gallinas."""
+PRODUCTION_GALPONES = ('galpon_1', 'galpon_2', 'galpon_3', 'galpon_4')
+PRODUCTION_BULK_MAX_RECORDS = 5000
+
+def _parse_production_timestamp(data, required):
+    """
+    Timestamp de un registro de huevos/mortalidad, con zona horaria de Argentina.
+    Acepta 'timestamp' (ISO 8601) o 'fecha' (YYYY-MM-DD, se toma el mediodía local).
+    Lanza ValueError con el mensaje para el cliente.
+    """
+    argentina_tz = time_service.LOCAL_TZ
+    if data.get('timestamp'):
+        try:
+            timestamp = datetime.fromisoformat(str(data['timestamp']).replace('Z', '+00:00'))
+        except (ValueError, TypeError):
+            raise ValueError('Formato de timestamp inválido. Use formato ISO 8601')
+        if timestamp.tzinfo is None:
+            return argentina_tz.localize(timestamp)
+        return timestamp.astimezone(argentina_tz)
+    if data.get('fecha'):
+        try:
+            fecha = datetime.strptime(str(data['fecha']), '%Y-%m-%d')
+        except ValueError:
+            raise ValueError('Formato de fecha inválido. Use YYYY-MM-DD')
+        return argentina_tz.localize(fecha.replace(hour=12))
+    if required:
+        raise ValueError("Campos faltantes: ['timestamp']")
+    return time_service.now_local()
+
+def _parse_production_values(data, require_total, label):
+    """
+    Valida galpon_1..galpon_4 y total de un registro de huevos/mortalidad.
+    Si no se envía total (y no es obligatorio) se calcula. Lanza ValueError.
+    """
+    required_fields = list(PRODUCTION_GALPONES) + (['total'] if require_total else [])
+    missing_fields = [field for field in required_fields if field not in data]
+    if missing_fields:
+        raise ValueError(f'Campos faltantes: {missing_fields}')
     try:
-        if not request.is_json:
-            return jsonify({'error': 'Content-Type debe ser application/json'}), 400
+        values = {field: int(data[field]) for field in PRODUCTION_GALPONES}
+    except (ValueError, TypeError):
+        raise ValueError(f'Los campos de {label} deben ser enteros válidos')
+    if any(value < 0 for value in values.values()):
+        raise ValueError(f'Los valores de {label} no pueden ser negativos')
+
+    calculated_total = sum(values.values())
+    total = data.get('total')
+    if total is None:
+        total = calculated_total
+    else:
+        try:
+            total = int(total)
+        except (ValueError, TypeError):
+            raise ValueError('El campo total debe ser un entero válido')
+        if total != calculated_total:
+            raise ValueError(f'El total ({total}) no coincide con la suma de galpones ({calculated_total})')
+    values['total'] = total
+    return values
 
-        data = request.get_json()
-        if not data:
-            return jsonify({'error': 'No se recibieron datos JSON válidos'}), 400
+def _receive_production_record(model, require_timestamp, label):
+    """Valida un registro de huevos/mortalidad y lo guarda como el dato del día (upsert)"""
+    if not request.is_json:
+        return jsonify({'error': 'Content-Type debe ser application/json'}), 400
+
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'No se recibieron datos JSON válidos'}), 400
 
-        required_fields = ['granja_id', 'galpon_1', 'galpon_2', 'galpon_3', 'galpon_4']
-        missing_fields = [field for field in required_fields if field not in data]
+    if 'granja_id' not in data:
+        return jsonify({'error': "Campos faltantes: ['granja_id']"}), 400
+    try:
+        granja_id = int(data['granja_id'])
+    except (ValueError, TypeError):
+        return jsonify({'error': 'El campo granja_id debe ser un entero válido'}), 400
 
-        if missing_fields:
-            return jsonify({'error': f'Campos faltantes: {missing_fields}'}), 400
+    try:
+        values = _parse_production_values(data, require_total=require_timestamp, label=label)
+        timestamp = _parse_production_timestamp(data, required=require_timestamp)
+    except ValueError as e:
+        app.logger.warning(f"Datos de {label} inválidos: {str(e)}")
+        return jsonify({'error': str(e)}), 400
 
-        try:
-            granja_id = int(data['granja_id'])
-            galpon_1 = int(data['galpon_1'])
-            galpon_2 = int(data['galpon_2'])
-            galpon_3 = int(data['galpon_3'])
-            galpon_4 = int(data['galpon_4'])
-        except (ValueError, TypeError) as e:
-            app.logger.warning(f"Error en tipos de datos de mortalidad: {str(e)}")
-            return jsonify({'error': 'Los campos de mortalidad deben ser enteros válidos'}), 400
-
-        if any(value < 0 for value in [galpon_1, galpon_2, galpon_3, galpon_4]):
-            return jsonify({'error': 'Los valores de mortalidad no pueden ser negativos'}), 400
-
-        total = data.get('total')
-        if total is None:
-            total = galpon_1 + galpon_2 + galpon_3 + galpon_4
-        else:
-            try:
-                total = int(total)
-            except (ValueError, TypeError) as e:
-                app.logger.warning(f"Error en campo total de mortalidad: {str(e)}")
-                return jsonify({'error': 'El campo total debe ser un entero válido'}), 400
+    upsert_production_records(model, granja_id, [(timestamp, values)])
+    db.session.commit()
 
-            calculated_total = galpon_1 + galpon_2 + galpon_3 + galpon_4
-            if total != calculated_total:
-                return jsonify({'error': f'El total ({total}) no coincide con la suma de galpones ({calculated_total})'}), 400
+    record = model.query.filter_by(granja_id=granja_id, fecha=timestamp.date()).first()
+    app.logger.info(f"Datos de {label} guardados: granja_id={granja_id}, total={values['total']}, fecha={timestamp.date()}")
 
-        timestamp = data.get('timestamp')
-        argentina_tz = pytz.timezone('America/Argentina/Buenos_Aires')
+    return jsonify({
+        'status': 'success',
+        'message': f'Datos de {label} guardados para la fecha especificada',
+        'id': record.id if record else None,
+        'granja_id': granja_id,
+        'fecha': timestamp.date().isoformat(),
+        'total': values['total'],
+        'timestamp': timestamp.isoformat()
+    }), 200
+
+def _receive_production_bulk(model, label):
+    """
+    Carga masiva de registros diarios de huevos/mortalidad.
 
-        if timestamp:
-            try:
-                parsed_timestamp = datetime.fromisoformat(str(timestamp).replace('Z', '+00:00'))
-                if parsed_timestamp.tzinfo is None:
-                    parsed_timestamp = parsed_timestamp.replace(tzinfo=argentina_tz)
-                else:
-                    parsed_timestamp = parsed_timestamp.astimezone(argentina_tz)
-            except (ValueError, TypeError) as e:
-                app.logger.warning(f"Error al parsear timestamp de mortalidad: {str(e)}")
-                return jsonify({'error': 'Formato de timestamp inválido. Use formato ISO 8601'}), 400
-        else:
-            parsed_timestamp = datetime.now(argentina_tz)
-
-        record = MortalityData(
-            granja_id=granja_id,
-            timestamp=parsed_timestamp,
-            galpon_1=galpon_1,
-            galpon_2=galpon_2,
-            galpon_3=galpon_3,
-            galpon_4=galpon_4,
-            total=total
-        )
+    Acepta {"granja_id": 1, "registros": [{...}, ...]} o una lista de registros
+    que incluyen su propio granja_id. Si algún registro es inválido no se guarda
+    ninguno y se devuelve el detalle de errores por posición.
+    """
+    if not request.is_json:
+        return jsonify({'error': 'Content-Type debe ser application/json'}), 400
 
-        db.session.add(record)
-        db.session.commit()
+    data = request.get_json()
+    if isinstance(data, dict):
+        default_granja_id = data.get('granja_id')
+        registros = data.get('registros')
+    else:
+        default_granja_id = None
+        registros = data
+    if not isinstance(registros, list) or not registros:
+        return jsonify({'error': 'Se esperaba una lista de registros no vacía'}), 400
+    if len(registros) > PRODUCTION_BULK_MAX_RECORDS:
+        return jsonify({'error': f'Máximo {PRODUCTION_BULK_MAX_RECORDS} registros por solicitud'}), 400
+
+    # Por granja y fecha gana el último registro de la lista (igual que con envíos sucesivos)
+    by_granja = {}
+    errors = []
+    for index, registro in enumerate(registros):
+        try:
+            if not isinstance(registro, dict):
+                raise ValueError('El registro debe ser un objeto JSON')
+            granja_id = registro.get('granja_id', default_granja_id)
+            if granja_id is None:
+                raise ValueError("Campos faltantes: ['granja_id']")
+            try:
+                granja_id = int(granja_id)
+            except (ValueError, TypeError):
+                raise ValueError('El campo granja_id debe ser un entero válido')
+            values = _parse_production_values(registro, require_total=False, label=label)
+            timestamp = _parse_production_timestamp(registro, required=True)
+        except ValueError as e:
+            errors.append({'indice': index, 'error': str(e)})
+            continue
+        by_granja.setdefault(granja_id, {})[timestamp.date()] = (timestamp, values)
+
+    if errors:
+        return jsonify({'error': 'Registros inválidos', 'errores': errors}), 400
+
+    chunk_size = 500
+    saved = 0
+    for granja_id, by_date in by_granja.items():
+        records = list(by_date.values())
+        for i in range(0, len(records), chunk_size):
+            upsert_production_records(model, granja_id, records[i:i + chunk_size])
+        saved += len(records)
+    db.session.commit()
 
-        app.logger.info(f"Datos de mortalidad guardados: granja_id={granja_id}, total={total}, timestamp={parsed_timestamp}")
+    app.logger.info(f"Carga masiva de {label}: {saved} días en {len(by_granja)} granjas")
+    return jsonify({
+        'status': 'success',
+        'registros_recibidos': len(registros),
+        'dias_guardados': saved,
+        'granjas': sorted(by_granja)
+    }), 200
 
-        return jsonify({
-            'status': 'success',
-            'message': 'Datos de mortalidad recibidos y guardados correctamente',
-            'id': record.id,
-            'granja_id': granja_id,
-            'total': total,
-            'timestamp': parsed_timestamp.isoformat()
-        }), 200
 
+@app.route('/api/mortalidad', methods=['POST'])
+def receive_mortality_data():
+    """
+    Endpoint para recibir datos de mortalidad de gallinas.
+    Se guarda un registro por granja y día (hora local); un nuevo envío del
+    mismo día reemplaza al anterior. timestamp y total son opcionales.
+    """
+    try:
+        return _receive_production_record(MortalityData, require_timestamp=False, label='mortalidad')
     except Exception as e:
         db.session.rollback()
         app.logger.error(f"Error en receive_mortality_data: {str(e)}")
@@ -4890,6 +6996,8 @@ def receive_mortality_data():
 def receive_egg_data():
     """
     Endpoint para recibir datos de producción de huevos de granjas externas.
+    Se guarda un registro por granja y día (hora local); un nuevo envío del
+    mismo día reemplaza al anterior.
     
     Estructura JSON esperada:
     {
@@ -4903,122 +7011,1377 @@ def receive_egg_data():
     }
     """
     try:
-        # Verificar que el contenido sea JSON
-        if not request.is_json:
-            app.logger.warning("Solicitud recibida sin Content-Type: application/json")
-            return jsonify({'error': 'Content-Type debe ser application/json'}), 400
-        
-        data = request.get_json()
-        
-        # Validar que se recibieron datos
-        if not data:
-            app.logger.warning("No se recibieron datos JSON válidos")
-            return jsonify({'error': 'No se recibieron datos JSON válidos'}), 400
-        
-        # Validar campos requeridos
-        required_fields = ['granja_id', 'timestamp', 'galpon_1', 'galpon_2', 'galpon_3', 'galpon_4', 'total']
-        missing_fields = [field for field in required_fields if field not in data]
-        
-        if missing_fields:
-            app.logger.warning(f"Campos faltantes: {missing_fields}")
-            return jsonify({'error': f'Campos faltantes: {missing_fields}'}), 400
-        
-        # Validar tipos de datos
-        try:
-            granja_id = int(data['granja_id'])
-            galpon_1 = int(data['galpon_1'])
-            galpon_2 = int(data['galpon_2'])
-            galpon_3 = int(data['galpon_3'])
-            galpon_4 = int(data['galpon_4'])
-            total = int(data['total'])
-        except (ValueError, TypeError) as e:
-            app.logger.warning(f"Error en tipos de datos numéricos: {str(e)}")
-            return jsonify({'error': 'Los campos numéricos deben ser enteros válidos'}), 400
-        
-        # Validar y parsear timestamp
-        try:
-            # Intentar parsear el timestamp ISO
-            timestamp_str = data['timestamp']
-            if '.' in timestamp_str:
-                # Con microsegundos
-                timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-            else:
-                # Sin microsegundos
-                timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-            
-            # Convertir a zona horaria de Argentina si es necesario
-            if timestamp.tzinfo is None:
-                timestamp = timestamp.replace(tzinfo=pytz.timezone('America/Argentina/Buenos_Aires'))
+        return _receive_production_record(EggData, require_timestamp=True, label='huevos')
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error en receive_egg_data: {str(e)}")
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+
+@app.route('/api/mortalidad/bulk', methods=['POST'])
+def receive_mortality_data_bulk():
+    """Carga masiva de mortalidad (histórico de varios días o granjas)"""
+    try:
+        return _receive_production_bulk(MortalityData, label='mortalidad')
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error en receive_mortality_data_bulk: {str(e)}")
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+
+@app.route('/api/huevos/bulk', methods=['POST'])
+def receive_egg_data_bulk():
+    """
+    Carga masiva de producción de huevos:
+    {"granja_id": 1, "registros": [{"fecha": "2025-09-01", "galpon_1": 1250, ...}, ...]}
+    """
+    try:
+        return _receive_production_bulk(EggData, label='huevos')
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error en receive_egg_data_bulk: {str(e)}")
+        return jsonify({'error': 'Error interno del servidor'}), 500
+
+# ---------------------------------------------------------------------------
+# Archivo frío de telemetría (lecturas de temperatura y tiempos de funcionamiento)
+# ---------------------------------------------------------------------------
+
+def _serialize_lectura_for_archive(lectura, establishment_id):
+    return {
+        'id': lectura.id,
+        'sensor_id': lectura.sensor_id,
+        'barra_id': lectura.barra_id,
+        'silo_id': lectura.silo_id,
+        'establishment_id': establishment_id,
+        'temperatura': lectura.temperatura,
+        'timestamp': lectura.timestamp.isoformat(),
+        'raw_payload': lectura.raw_payload
+    }
+
+def _serialize_runtime_for_archive(runtime, establishment_id):
+    return {
+        'id': runtime.id,
+        'silo_id': runtime.silo_id,
+        'establishment_id': establishment_id,
+        'runtime_hours': runtime.runtime_hours,
+        'timestamp': runtime.timestamp.isoformat()
+    }
+
+# Tablas que se pueden archivar: nombre -> (modelo, función de serialización)
+ARCHIVABLE_TABLES = {
+    'lectura_temperatura': (LecturaTemperatura, _serialize_lectura_for_archive),
+    'aerator_runtime': (AeratorRuntime, _serialize_runtime_for_archive)
+}
+
+def _delete_archived_chunk(model, min_id, max_id, cutoff):
+    """Borra de la BD las filas de un bloque ya escrito en el archivo"""
+    deleted = model.query.filter(
+        model.id >= min_id,
+        model.id <= max_id,
+        model.timestamp < cutoff
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    telemetry_archive.complete_chunk()
+    return deleted
+
+def archive_old_telemetry(older_than_days=None, chunk_size=None, max_chunks=None):
+    """
+    Mueve al archivo frío las filas más antiguas que `older_than_days`.
+
+    Trabaja por bloques de `chunk_size` filas ordenadas por ID. Cada bloque se
+    escribe en archivos por mes y establecimiento, se registra en el manifiesto
+    como pendiente y recién después se borra de la BD. Si el proceso se corta,
+    la siguiente ejecución termina de borrar el bloque pendiente antes de seguir.
+
+    Returns:
+        dict: Resumen con la fecha de corte y las filas archivadas por tabla
+    """
+    older_than_days = older_than_days or app.config['ARCHIVE_AFTER_DAYS']
+    chunk_size = chunk_size or app.config['ARCHIVE_CHUNK_SIZE']
+    now = time_service.now_naive()
+    cutoff = now - timedelta(days=older_than_days)
+    summary = {'cutoff': cutoff.isoformat(), 'resumed_rows': 0, 'tables': {}}
+
+    # Terminar un bloque que haya quedado a medio archivar
+    pending = telemetry_archive.get_pending()
+    if pending:
+        model = ARCHIVABLE_TABLES[pending['table']][0]
+        summary['resumed_rows'] = _delete_archived_chunk(
+            model, pending['min_id'], pending['max_id'], datetime.fromisoformat(pending['cutoff'])
+        )
+        app.logger.info(f"Archivo: retomado bloque pendiente de {pending['table']} ({summary['resumed_rows']} filas borradas)")
+
+    silo_establishments = dict(db.session.query(Silo.id, Silo.establishment_id).all())
+    chunks_done = 0
+
+    for table, (model, serialize) in ARCHIVABLE_TABLES.items():
+        archived_rows = 0
+        while max_chunks is None or chunks_done < max_chunks:
+            rows = model.query.filter(model.timestamp < cutoff).order_by(model.id).limit(chunk_size).all()
+            if not rows:
+                break
+
+            # Agrupar por mes y establecimiento
+            groups = {}
+            for row in rows:
+                establishment_id = silo_establishments.get(row.silo_id)
+                key = (row.timestamp.strftime('%Y-%m'), establishment_id)
+                groups.setdefault(key, []).append(serialize(row, establishment_id))
+
+            parts = [
+                telemetry_archive.write_part(table, month, establishment_id, group_rows)
+                for (month, establishment_id), group_rows in groups.items()
+            ]
+            min_id, max_id = rows[0].id, rows[-1].id
+            telemetry_archive.begin_chunk(table, parts, min_id, max_id, cutoff)
+            _delete_archived_chunk(model, min_id, max_id, cutoff)
+
+            archived_rows += len(rows)
+            chunks_done += 1
+            app.logger.info(f"Archivo: {table} IDs {min_id}-{max_id} archivados en {len(parts)} partes")
+
+        summary['tables'][table] = archived_rows
+
+    return summary
+
+def _historical_temperature_row(row):
+    return {
+        'id': row['id'],
+        'sensor_id': row['sensor_id'],
+        'barra_id': row['barra_id'],
+        'silo_id': row['silo_id'],
+        'temperatura': row['temperatura'],
+        'timestamp': row['timestamp']
+    }
+
+def get_historical_temperatures(start, end, sensor_id=None, silo_id=None):
+    """
+    Devuelve las lecturas de temperatura en [start, end] uniendo el archivo frío
+    con las filas vivas de la BD (legacy y compactas), ordenadas por timestamp.
+    """
+    establishment_id = None
+    if silo_id is not None:
+        silo = db.session.get(Silo, silo_id)
+        establishment_id = silo.establishment_id if silo else None
+
+    def matches(row):
+        if sensor_id is not None and row['sensor_id'] != sensor_id:
+            return False
+        if silo_id is not None and row['silo_id'] != silo_id:
+            return False
+        return True
+
+    archived = (_historical_temperature_row(r) for r in telemetry_archive.iter_rows_ordered(
+        'lectura_temperatura', start, end, establishment_id=establishment_id, predicate=matches))
+
+    query = LecturaTemperatura.query.filter(
+        LecturaTemperatura.timestamp >= start,
+        LecturaTemperatura.timestamp <= end
+    )
+    if sensor_id is not None:
+        query = query.filter(LecturaTemperatura.sensor_id == sensor_id)
+    if silo_id is not None:
+        query = query.filter(LecturaTemperatura.silo_id == silo_id)
+    live = (
+        {
+            'id': l.id,
+            'sensor_id': l.sensor_id,
+            'barra_id': l.barra_id,
+            'silo_id': l.silo_id,
+            'temperatura': l.temperatura,
+            'timestamp': l.timestamp
+        }
+        for l in query.order_by(LecturaTemperatura.timestamp).yield_per(1000)
+    )
+    return heapq.merge(archived, live, _compact_temperature_rows(start, end, sensor_id, silo_id),
+                       key=lambda r: r['timestamp'])
+
+def _compact_temperature_rows(start, end, sensor_id=None, silo_id=None):
+    """Lecturas compactas en [start, end] con barra y silo resueltos desde el historial"""
+    history = SensorAsignacionHistorial.query
+    if sensor_id is not None:
+        history = history.filter(SensorAsignacionHistorial.sensor_id == sensor_id)
+    elif silo_id is not None:
+        silo_sensors = db.session.query(SensorAsignacionHistorial.sensor_id).filter(
+            SensorAsignacionHistorial.silo_id == silo_id)
+        history = history.filter(SensorAsignacionHistorial.sensor_id.in_(silo_sensors))
+    timeline = AssignmentTimeline(history.all())
+
+    query = LecturaTemperaturaCompacta.query.filter(
+        LecturaTemperaturaCompacta.ts >= to_epoch(start),
+        LecturaTemperaturaCompacta.ts <= to_epoch(end)
+    )
+    if sensor_id is not None:
+        query = query.filter(LecturaTemperaturaCompacta.sensor_id == sensor_id)
+    if silo_id is not None:
+        silo_sensor_ids = {s for s, _, _ in timeline.silo_ranges(silo_id)}
+        query = query.filter(or_(
+            and_(LecturaTemperaturaCompacta.mapeo_explicito == True, LecturaTemperaturaCompacta.silo_id == silo_id),
+            and_(LecturaTemperaturaCompacta.mapeo_explicito == False,
+                 LecturaTemperaturaCompacta.sensor_id.in_(list(silo_sensor_ids)))
+        ))
+
+    for l in query.order_by(LecturaTemperaturaCompacta.ts).yield_per(1000):
+        if l.mapeo_explicito:
+            barra_id, silo_of_row = l.barra_id, l.silo_id
+        else:
+            barra_id, silo_of_row = timeline.lookup(l.sensor_id, l.ts) or (None, None)
+        if silo_id is not None and silo_of_row != silo_id:
+            continue
+        yield {
+            'id': l.id,
+            'sensor_id': l.sensor_id,
+            'barra_id': barra_id,
+            'silo_id': silo_of_row,
+            'temperatura': l.temperatura,
+            'timestamp': l.timestamp
+        }
+
+def get_historical_runtimes(start, end, silo_id):
+    """Igual que get_historical_temperatures pero para AeratorRuntime de un silo"""
+    silo = db.session.get(Silo, silo_id)
+    establishment_id = silo.establishment_id if silo else None
+
+    archived = (
+        {'id': r['id'], 'silo_id': r['silo_id'], 'runtime_hours': r['runtime_hours'], 'timestamp': r['timestamp']}
+        for r in telemetry_archive.iter_rows_ordered(
+            'aerator_runtime', start, end, establishment_id=establishment_id,
+            predicate=lambda row: row['silo_id'] == silo_id)
+    )
+    live = (
+        {'id': r.id, 'silo_id': r.silo_id, 'runtime_hours': r.runtime_hours, 'timestamp': r.timestamp}
+        for r in AeratorRuntime.query.filter(
+            AeratorRuntime.silo_id == silo_id,
+            AeratorRuntime.timestamp >= start,
+            AeratorRuntime.timestamp <= end
+        ).order_by(AeratorRuntime.timestamp).yield_per(1000)
+    )
+    return heapq.merge(archived, live, key=lambda r: r['timestamp'])
+
+def _parse_history_range():
+    """Lee los parámetros 'desde' y 'hasta' (ISO 8601). Por defecto, últimos 30 días."""
+    now = time_service.now_naive()
+    desde = request.args.get('desde')
+    hasta = request.args.get('hasta')
+    start = datetime.fromisoformat(desde) if desde else now - timedelta(days=30)
+    end = datetime.fromisoformat(hasta) if hasta else now
+    return start.replace(tzinfo=None), end.replace(tzinfo=None)
+
+def _historical_ndjson_response(rows, filename):
+    """Transmite filas históricas (ya ordenadas por timestamp) en NDJSON, sin armar la respuesta en memoria"""
+    def generate():
+        buffer = io.StringIO()
+        pending = 0
+        for row in rows:
+            buffer.write(json.dumps({**row, 'timestamp': row['timestamp'].isoformat()}) + '\n')
+            pending += 1
+            if pending >= 500:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+        yield buffer.getvalue()
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson', headers={
+        'Content-Disposition': f'attachment; filename={filename}.ndjson'
+    })
+
+@app.route('/api/archive/run', methods=['POST'])
+@login_required
+@super_admin_required
+def run_telemetry_archive():
+    """Ejecuta (o retoma) el archivado de telemetría antigua"""
+    data = request.get_json(silent=True) or {}
+    try:
+        older_than_days = int(data['older_than_days']) if data.get('older_than_days') else None
+        max_chunks = int(data['max_chunks']) if data.get('max_chunks') else None
+    except (ValueError, TypeError):
+        return jsonify({'error': 'older_than_days y max_chunks deben ser enteros'}), 400
+
+    try:
+        summary = archive_old_telemetry(older_than_days=older_than_days, max_chunks=max_chunks)
+        return jsonify({'status': 'success', **summary})
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Error al archivar telemetría: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/historical/temperatures')
+@login_required
+def historical_temperatures():
+    """Lecturas históricas (archivo + BD) de un sensor o de un silo, en NDJSON ordenado por timestamp"""
+    sensor_id = request.args.get('sensor_id', type=int)
+    silo_id = request.args.get('silo_id', type=int)
+    if sensor_id is None and silo_id is None:
+        return jsonify({'error': 'Se requiere sensor_id o silo_id'}), 400
+
+    if current_user.role != 'super_admin':
+        silo = db.session.get(Silo, silo_id) if silo_id is not None else None
+        if not silo or not current_user.can_access_establishment(silo.establishment_id):
+            return jsonify({'error': 'Acceso no autorizado'}), 403
+
+    try:
+        start, end = _parse_history_range()
+    except ValueError:
+        return jsonify({'error': 'Formato de fecha inválido. Use formato ISO 8601'}), 400
+
+    rows = get_historical_temperatures(start, end, sensor_id=sensor_id, silo_id=silo_id)
+    return _historical_ndjson_response(rows, 'temperaturas')
+
+@app.route('/api/historical/runtimes/<int:silo_id>')
+@login_required
+def historical_runtimes(silo_id):
+    """Tiempos de funcionamiento históricos (archivo + BD) de un silo, en NDJSON ordenado por timestamp"""
+    silo = Silo.query.get_or_404(silo_id)
+    if not current_user.can_access_establishment(silo.establishment_id):
+        return jsonify({'error': 'Acceso no autorizado'}), 403
+
+    try:
+        start, end = _parse_history_range()
+    except ValueError:
+        return jsonify({'error': 'Formato de fecha inválido. Use formato ISO 8601'}), 400
+
+    return _historical_ndjson_response(get_historical_runtimes(start, end, silo_id), f'runtimes_silo_{silo_id}')
+
+# ---------------------------------------------------------------------------
+# Exportación de telemetría en streaming (NDJSON / CSV)
+# ---------------------------------------------------------------------------
+
+EXPORT_BATCH_SIZE = 1000
+
+def _export_compact_row(row, timeline):
+    if row['mapeo_explicito']:
+        barra_id, silo_id = row['barra_id'], row['silo_id']
+    else:
+        barra_id, silo_id = timeline.lookup(row['sensor_id'], row['ts']) or (None, None)
+    return {
+        'id': row['id'],
+        'sensor_id': row['sensor_id'],
+        'barra_id': barra_id,
+        'silo_id': silo_id,
+        'temperatura': decode_temperature(row['temp_centi']),
+        'timestamp': from_epoch(row['ts']),
+        'ts': row['ts']
+    }
+
+def _export_heartbeat_row(row, timeline):
+    bitmap = heartbeat_bitmap.combine(row['slots_am'], row['slots_pm'])
+    return {
+        'mac_address': row['mac_address'],
+        'day': row['day'],
+        'bitmap': heartbeat_bitmap.to_hex(bitmap),
+        'slots_recibidos': heartbeat_bitmap.count_slots(bitmap)
+    }
+
+def _export_tables():
+    """
+    Tablas exportables. Para cada una: columnas leídas, clave de orden (keyset),
+    columna y tipo del filtro de tiempo ('datetime', 'epoch' o 'date') y las
+    columnas que admiten cada filtro (silo, sensor, mac, granja). 'silo_resolved'
+    indica que el silo se obtiene del historial de asignaciones al serializar.
+    """
+    production_columns = ('id', 'granja_id', 'fecha', 'timestamp', 'galpon_1', 'galpon_2', 'galpon_3', 'galpon_4', 'total')
+    return {
+        'lecturas': {
+            'model': LecturaTemperatura,
+            'columns': ('id', 'sensor_id', 'barra_id', 'silo_id', 'temperatura', 'timestamp'),
+            'key': ('id',), 'time': ('timestamp', 'datetime'), 'silo': 'silo_id', 'sensor': 'sensor_id'
+        },
+        'lecturas_compactas': {
+            'model': LecturaTemperaturaCompacta,
+            'columns': ('id', 'sensor_id', 'ts', 'temp_centi', 'mapeo_explicito', 'barra_id', 'silo_id'),
+            'fields': ('id', 'sensor_id', 'barra_id', 'silo_id', 'temperatura', 'timestamp', 'ts'),
+            'key': ('id',), 'time': ('ts', 'epoch'), 'sensor': 'sensor_id', 'silo_resolved': True,
+            'transform': _export_compact_row
+        },
+        'tiempos_aireacion': {
+            'model': AeratorRuntime,
+            'columns': ('id', 'silo_id', 'runtime_hours', 'timestamp'),
+            'key': ('id',), 'time': ('timestamp', 'datetime'), 'silo': 'silo_id'
+        },
+        'heartbeats': {
+            'model': DeviceHeartbeatBitmap,
+            'columns': ('mac_address', 'day', 'slots_am', 'slots_pm'),
+            'fields': ('mac_address', 'day', 'bitmap', 'slots_recibidos'),
+            'key': ('mac_address', 'day'), 'time': ('day', 'date'), 'mac': 'mac_address',
+            'transform': _export_heartbeat_row
+        },
+        'acciones': {
+            'model': DeviceActionLog,
+            'columns': ('id', 'mac_address', 'timestamp', 'action', 'position', 'result', 'message'),
+            'key': ('id',), 'time': ('timestamp', 'datetime'), 'mac': 'mac_address'
+        },
+        'reinicios': {
+            'model': Esp32Reboot,
+            'columns': ('id', 'mac_address', 'reboot_time', 'reason'),
+            'key': ('id',), 'time': ('reboot_time', 'datetime'), 'mac': 'mac_address'
+        },
+        'huevos': {
+            'model': EggData, 'columns': production_columns,
+            'key': ('id',), 'time': ('timestamp', 'datetime'), 'granja': 'granja_id'
+        },
+        'mortalidad': {
+            'model': MortalityData, 'columns': production_columns,
+            'key': ('id',), 'time': ('timestamp', 'datetime'), 'granja': 'granja_id'
+        }
+    }
+
+def _export_time_bound(kind, value):
+    if kind == 'epoch':
+        return to_epoch(value)
+    if kind == 'date':
+        return value.date()
+    return value
+
+def _parse_export_key(spec, value):
+    """Convierte el cursor 'after' (valores de la clave separados por coma) a los tipos de las columnas"""
+    parts = value.split(',')
+    if len(parts) != len(spec['key']):
+        raise ValueError(f"after debe tener {len(spec['key'])} valor(es): {', '.join(spec['key'])}")
+    result = []
+    for column_name, part in zip(spec['key'], parts):
+        python_type = getattr(spec['model'], column_name).type.python_type
+        if python_type is date:
+            result.append(date.fromisoformat(part))
+        elif python_type is int:
+            result.append(int(part))
+        else:
+            result.append(part)
+    return result
+
+def _export_statement(spec, filters, after, limit):
+    """
+    Arma la consulta de exportación y devuelve (statement, timeline, silo_ids).
+    `timeline` y `silo_ids` solo se usan para resolver el silo de las lecturas compactas.
+    """
+    model = spec['model']
+    stmt = select(*[getattr(model, column) for column in spec['columns']])
+
+    time_column, time_kind = spec['time']
+    if filters.get('desde') is not None:
+        stmt = stmt.where(getattr(model, time_column) >= _export_time_bound(time_kind, filters['desde']))
+    if filters.get('hasta') is not None:
+        stmt = stmt.where(getattr(model, time_column) <= _export_time_bound(time_kind, filters['hasta']))
+    for name in ('sensor', 'mac', 'granja'):
+        if filters.get(name) is not None:
+            stmt = stmt.where(getattr(model, spec[name]) == filters[name])
+
+    silo_ids = None
+    if filters.get('silo') is not None:
+        silo_ids = [filters['silo']]
+    elif filters.get('establishment') is not None and ('silo' in spec or spec.get('silo_resolved')):
+        silo_ids = [s.id for s in Silo.query.filter_by(establishment_id=filters['establishment'])
+                    .with_entities(Silo.id)]
+    if filters.get('establishment') is not None and 'mac' in spec:
+        stmt = stmt.where(getattr(model, spec['mac']).in_(
+            select(Board.mac_address).where(Board.establishment_id == filters['establishment'])))
+
+    timeline = None
+    if silo_ids is not None:
+        if 'silo' in spec:
+            stmt = stmt.where(getattr(model, spec['silo']).in_(silo_ids))
+        else:
+            # Lecturas compactas: sensores que alguna vez estuvieron en esos silos
+            # (se vuelve a filtrar por el silo resuelto al serializar)
+            sensor_ids = select(SensorAsignacionHistorial.sensor_id).where(
+                SensorAsignacionHistorial.silo_id.in_(silo_ids))
+            stmt = stmt.where(or_(
+                and_(model.mapeo_explicito == True, model.silo_id.in_(silo_ids)),
+                and_(model.mapeo_explicito == False, model.sensor_id.in_(sensor_ids))
+            ))
+    if spec.get('silo_resolved'):
+        timeline = AssignmentTimeline(SensorAsignacionHistorial.query.all())
+
+    key_columns = [getattr(model, column) for column in spec['key']]
+    if after is not None:
+        if len(key_columns) == 1:
+            stmt = stmt.where(key_columns[0] > after[0])
+        else:
+            stmt = stmt.where(tuple_(*key_columns) > tuple_(*after))
+    stmt = stmt.order_by(*key_columns)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt, timeline, set(silo_ids) if silo_ids is not None else None
+
+def iter_export_rows(spec, filters, after=None, limit=None):
+    """
+    Recorre las filas a exportar con un cursor del lado del servidor (yield_per),
+    sin cargar el resultado completo en memoria.
+    """
+    stmt, timeline, silo_ids = _export_statement(spec, filters, after, limit)
+    transform = spec.get('transform')
+    result = db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for row in result:
+        item = row._asdict()
+        if transform:
+            item = transform(item, timeline)
+            if silo_ids is not None and 'silo_id' in item and item['silo_id'] not in silo_ids:
+                continue
+        yield item
+
+def _export_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+@app.route('/api/export/<table>')
+@login_required
+def export_table(table):
+    """
+    Exporta una tabla de telemetría en streaming, en NDJSON (por defecto) o CSV.
+
+    Filtros: establishment_id, silo_id, sensor_id, mac, granja_id, desde / hasta
+    (ISO 8601). Las filas salen ordenadas por su clave (ver cabecera X-Export-Key);
+    para retomar una exportación cortada se pasa after=<clave de la última fila>.
+    Solo incluye las filas de la BD; lo archivado se consulta en /api/historical/*.
+    """
+    tables = _export_tables()
+    spec = tables.get(table)
+    if spec is None:
+        return jsonify({'error': f'Tabla desconocida. Opciones: {sorted(tables)}'}), 404
+
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({'error': "format debe ser 'ndjson' o 'csv'"}), 400
+
+    try:
+        filters = {
+            'establishment': request.args.get('establishment_id', type=int),
+            'silo': request.args.get('silo_id', type=int),
+            'sensor': request.args.get('sensor_id', type=int),
+            'mac': standardize_mac(request.args['mac']) if request.args.get('mac') else None,
+            'granja': request.args.get('granja_id', type=int),
+            'desde': datetime.fromisoformat(request.args['desde']).replace(tzinfo=None) if request.args.get('desde') else None,
+            'hasta': datetime.fromisoformat(request.args['hasta']).replace(tzinfo=None) if request.args.get('hasta') else None
+        }
+        after = _parse_export_key(spec, request.args['after']) if request.args.get('after') else None
+    except ValueError as e:
+        return jsonify({'error': f'Parámetro inválido: {str(e)}'}), 400
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit <= 0:
+        return jsonify({'error': 'limit debe ser un entero positivo'}), 400
+
+    supported = {name for name in ('silo', 'sensor', 'mac', 'granja') if name in spec}
+    if spec.get('silo_resolved'):
+        supported.add('silo')
+    if 'silo' in supported or 'mac' in supported:
+        supported.add('establishment')
+    unsupported = [name for name in ('establishment', 'silo', 'sensor', 'mac', 'granja')
+                   if filters[name] is not None and name not in supported]
+    if unsupported:
+        return jsonify({'error': f'Filtros no disponibles para {table}: {unsupported}'}), 400
+
+    # Permisos: los usuarios que no son super_admin solo exportan datos de sus establecimientos
+    if current_user.role != 'super_admin':
+        establishment_id = filters['establishment']
+        if establishment_id is None and filters['silo'] is not None:
+            silo = db.session.get(Silo, filters['silo'])
+            establishment_id = silo.establishment_id if silo else None
+        if establishment_id is None and filters['mac'] is not None:
+            board = Board.query.filter_by(mac_address=filters['mac']).first()
+            establishment_id = board.establishment_id if board else None
+        if 'granja' in spec or establishment_id is None or not current_user.can_access_establishment(establishment_id):
+            return jsonify({'error': 'Acceso no autorizado'}), 403
+        if filters['establishment'] is None:
+            filters['establishment'] = establishment_id
+
+    fields = spec.get('fields', spec['columns'])
+
+    def generate():
+        buffer = io.StringIO()
+        writer = None
+        if fmt == 'csv':
+            writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+            writer.writeheader()
+        pending = 0
+        for item in iter_export_rows(spec, filters, after=after, limit=limit):
+            item = {key: _export_value(value) for key, value in item.items()}
+            if writer:
+                writer.writerow(item)
             else:
-                timestamp = timestamp.astimezone(pytz.timezone('America/Argentina/Buenos_Aires'))
-                
-        except (ValueError, TypeError) as e:
-            app.logger.warning(f"Error al parsear timestamp: {str(e)}")
-            return jsonify({'error': 'Formato de timestamp inválido. Use formato ISO 8601'}), 400
-        
-        # Validar que el total coincida con la suma de galpones
-        calculated_total = galpon_1 + galpon_2 + galpon_3 + galpon_4
-        if total != calculated_total:
-            app.logger.warning(f"Total inconsistente: recibido {total}, calculado {calculated_total}")
-            return jsonify({'error': f'El total ({total}) no coincide con la suma de galpones ({calculated_total})'}), 400
-        
-        argentina_tz = pytz.timezone('America/Argentina/Buenos_Aires')
-        local_timestamp = timestamp.astimezone(argentina_tz)
-        record_date = local_timestamp.date()
+                buffer.write(json.dumps(item) + '\n')
+            pending += 1
+            if pending >= 500:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+        yield buffer.getvalue()
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    extension = 'csv' if fmt == 'csv' else 'ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={table}.{extension}',
+        'X-Export-Key': ','.join(spec['key'])
+    })
 
-        existing_record = EggData.query.filter(
-            EggData.granja_id == granja_id,
-            func.date(EggData.timestamp) == record_date
-        ).first()
+@app.route('/api/sensor/<int:sensor_id>/series')
+@login_required
+def sensor_temperature_series(sensor_id):
+    """
+    Serie de temperatura de un sensor reconstruida a intervalos regulares a partir
+    de los puntos guardados (escalonada para deadband, lineal para swinging door).
+    Parámetros: desde, hasta (ISO 8601), paso (segundos, default 300) y metodo.
+    """
+    SensorTemperatura.query.get_or_404(sensor_id)
+    if current_user.role != 'super_admin':
+        barra = _find_bar_for_sensor(sensor_id)
+        silo = barra.silo_asignado if barra else None
+        if not silo or not current_user.can_access_establishment(silo.establishment_id):
+            return jsonify({'error': 'Acceso no autorizado'}), 403
 
-        if existing_record:
-            existing_record.timestamp = timestamp
-            existing_record.galpon_1 = galpon_1
-            existing_record.galpon_2 = galpon_2
-            existing_record.galpon_3 = galpon_3
-            existing_record.galpon_4 = galpon_4
-            existing_record.total = total
-            db.session.commit()
+    try:
+        start, end = _parse_history_range()
+    except ValueError:
+        return jsonify({'error': 'Formato de fecha inválido. Use formato ISO 8601'}), 400
+    paso = request.args.get('paso', 300, type=int)
+    metodo = request.args.get('metodo', RECONSTRUCTION.get(app.config['TEMP_COMPRESSION'], 'linear'))
+    if paso <= 0 or metodo not in ('step', 'linear'):
+        return jsonify({'error': "paso debe ser positivo y metodo 'step' o 'linear'"}), 400
+    if (end - start).total_seconds() / paso > 10000:
+        return jsonify({'error': 'Demasiados puntos; aumente el paso o reduzca el rango'}), 400
+
+    # Se incluye un margen antes del inicio para poder interpolar el primer instante
+    max_gap = 2 * app.config['TEMP_COMPRESSION_MAX_INTERVAL']
+    puntos = [
+        (to_epoch(row['timestamp']), row['temperatura'])
+        for row in get_historical_temperatures(start - timedelta(seconds=max_gap), end, sensor_id=sensor_id)
+    ]
+    serie = resample(puntos, to_epoch(start), to_epoch(end), paso, method=metodo, max_gap=max_gap)
 
-            app.logger.info(f"Datos de huevos actualizados: granja_id={granja_id}, total={total}, fecha={record_date}")
+    return jsonify({
+        'status': 'success',
+        'sensor_id': sensor_id,
+        'metodo': metodo,
+        'paso': paso,
+        'puntos_guardados': len(puntos),
+        'data': [
+            {'timestamp': from_epoch(t).isoformat(), 'temperatura': round(v, 2) if v is not None else None}
+            for t, v in serie
+        ]
+    })
 
-            return jsonify({
-                'status': 'success',
-                'message': 'Datos de huevos actualizados para la fecha especificada',
-                'id': existing_record.id,
-                'granja_id': granja_id,
-                'total': total,
-                'timestamp': timestamp.isoformat()
-            }), 200
+# Rango a partir del cual las series de aireación se leen del resumen diario
+SERIES_ROLLUP_DAYS = 30
+
+def _series_points(points, max_points):
+    """Serie [(epoch, valor)] reducida con LTTB, en el formato {x: ms, y: valor} de Chart.js"""
+    return [{'x': int(t * 1000), 'y': round(v, 2)} for t, v in downsample(points, max_points)]
+
+def _seconds_since(column, start):
+    """Segundos enteros entre `start` y una columna DATETIME, según el motor"""
+    if db.session.get_bind().dialect.name == 'mysql':
+        return func.timestampdiff(text('SECOND'), start, column)
+    return cast(func.round((func.julianday(column) - func.julianday(start)) * 86400), db.Integer)
+
+def _temperature_buckets(start, end, width, sensor_id=None, silo_id=None):
+    """
+    Agrupa las lecturas de temperatura de [start, end] en intervalos de `width`
+    segundos por sensor. Las tablas vivas se agregan en la BD (GROUP BY sensor e
+    intervalo) y solo el archivo frío se recorre fila a fila.
+
+    Returns:
+        dict: {(sensor_id, intervalo): [mínimo, máximo, suma, cantidad]}
+    """
+    buckets = {}
+
+    def add(sid, bucket, low, high, total, count):
+        current = buckets.get((sid, bucket))
+        if current is None:
+            buckets[(sid, bucket)] = [low, high, total, count]
         else:
-            egg_record = EggData(
-                granja_id=granja_id,
-                timestamp=timestamp,
-                galpon_1=galpon_1,
-                galpon_2=galpon_2,
-                galpon_3=galpon_3,
-                galpon_4=galpon_4,
-                total=total
-            )
+            current[0] = min(current[0], low)
+            current[1] = max(current[1], high)
+            current[2] += total
+            current[3] += count
+
+    start_epoch = to_epoch(start)
+    establishment_id = None
+    if silo_id is not None:
+        silo = db.session.get(Silo, silo_id)
+        establishment_id = silo.establishment_id if silo else None
+
+    def matches(row):
+        if sensor_id is not None and row['sensor_id'] != sensor_id:
+            return False
+        if silo_id is not None and row['silo_id'] != silo_id:
+            return False
+        return True
+
+    for row in telemetry_archive.iter_rows('lectura_temperatura', start, end,
+                                           establishment_id=establishment_id, predicate=matches):
+        t = row['temperatura']
+        add(row['sensor_id'], (to_epoch(row['timestamp']) - start_epoch) // width, t, t, t, 1)
+
+    # Tabla legacy: intervalo calculado en SQL a partir de los segundos desde el inicio
+    bucket = (_seconds_since(LecturaTemperatura.timestamp, start) // width).label('bucket')
+    query = db.session.query(
+        LecturaTemperatura.sensor_id, bucket,
+        func.min(LecturaTemperatura.temperatura), func.max(LecturaTemperatura.temperatura),
+        func.sum(LecturaTemperatura.temperatura), func.count(LecturaTemperatura.temperatura)
+    ).filter(
+        LecturaTemperatura.timestamp >= start,
+        LecturaTemperatura.timestamp <= end
+    )
+    if sensor_id is not None:
+        query = query.filter(LecturaTemperatura.sensor_id == sensor_id)
+    if silo_id is not None:
+        query = query.filter(LecturaTemperatura.silo_id == silo_id)
+    for row in query.group_by(LecturaTemperatura.sensor_id, 'bucket'):
+        if row[5]:
+            add(*row)
+
+    # Tabla compacta: el silo de las filas sin mapeo explícito sale de los
+    # intervalos del historial de asignaciones, traducidos a condiciones sobre ts
+    compact = LecturaTemperaturaCompacta
+    bucket = ((compact.ts - start_epoch) // width).label('bucket')
+    query = db.session.query(
+        compact.sensor_id, bucket,
+        func.min(compact.temp_centi), func.max(compact.temp_centi),
+        func.sum(compact.temp_centi), func.count(compact.temp_centi)
+    ).filter(
+        compact.ts >= start_epoch,
+        compact.ts <= to_epoch(end)
+    )
+    if sensor_id is not None:
+        query = query.filter(compact.sensor_id == sensor_id)
+    if silo_id is not None:
+        history = SensorAsignacionHistorial.query.filter(SensorAsignacionHistorial.silo_id == silo_id)
+        if sensor_id is not None:
+            history = history.filter(SensorAsignacionHistorial.sensor_id == sensor_id)
+        timeline = AssignmentTimeline(history.all())
+        assigned = [
+            and_(compact.sensor_id == sid, compact.ts >= desde, *([compact.ts < hasta] if hasta is not None else []))
+            for sid, desde, hasta in timeline.silo_ranges(silo_id)
+        ]
+        query = query.filter(or_(
+            and_(compact.mapeo_explicito == True, compact.silo_id == silo_id),
+            and_(compact.mapeo_explicito == False, or_(*assigned)) if assigned else false()
+        ))
+    for sid, index, low, high, total, count in query.group_by(compact.sensor_id, 'bucket'):
+        if count:
+            add(sid, index, decode_temperature(low), decode_temperature(high), decode_temperature(total), count)
+
+    return buckets
+
+@app.route('/api/series/<tipo>')
+@login_required
+@read_replica
+def downsampled_series(tipo):
+    """
+    Series para gráficos de rango largo con a lo sumo max_puntos puntos por serie
+    (Largest-Triangle-Three-Buckets), así el tamaño de la respuesta no depende del rango.
+
+    tipo 'temperatura': sensor_id o silo_id (una serie por sensor de la barra); para
+    rangos de más de SERIES_ROLLUP_DAYS días la BD agrupa las lecturas en max_puntos
+    intervalos y cada punto trae el promedio (y) con su mínimo y máximo.
+    tipo 'aireacion': silo_id; para rangos de más de SERIES_ROLLUP_DAYS días se usa
+    el resumen diario (AeratorRuntimeDaily) en lugar de cada ciclo.
+    Parámetros comunes: desde, hasta (ISO 8601) y max_puntos (default 500).
+    """
+    if tipo not in ('temperatura', 'aireacion'):
+        return jsonify({'error': "tipo debe ser 'temperatura' o 'aireacion'"}), 404
+
+    sensor_id = request.args.get('sensor_id', type=int)
+    silo_id = request.args.get('silo_id', type=int)
+    max_points = request.args.get('max_puntos', 500, type=int)
+    if max_points is None or not 10 <= max_points <= 5000:
+        return jsonify({'error': 'max_puntos debe estar entre 10 y 5000'}), 400
+    if silo_id is None and (tipo == 'aireacion' or sensor_id is None):
+        return jsonify({'error': 'Se requiere silo_id' + (' o sensor_id' if tipo == 'temperatura' else '')}), 400
+
+    if silo_id is not None:
+        silo = Silo.query.get_or_404(silo_id)
+        establishment_id = silo.establishment_id
+    else:
+        SensorTemperatura.query.get_or_404(sensor_id)
+        barra = _find_bar_for_sensor(sensor_id)
+        establishment_id = barra.silo_asignado.establishment_id if barra and barra.silo_asignado else None
+    if current_user.role != 'super_admin' and (
+            establishment_id is None or not current_user.can_access_establishment(establishment_id)):
+        return jsonify({'error': 'Acceso no autorizado'}), 403
+
+    try:
+        start, end = _parse_history_range()
+    except ValueError:
+        return jsonify({'error': 'Formato de fecha inválido. Use formato ISO 8601'}), 400
+
+    series = []
+    if tipo == 'temperatura':
+        positions = {}
+        barra = getattr(silo, 'barra_sensores_asociada', None) if silo_id is not None else None
+        if barra:
+            positions = {s['sensor_id']: s['position'] for s in barra.get_ordered_sensors_with_data() if s['sensor_id']}
+        by_sensor = {}
+        if (end - start).days > SERIES_ROLLUP_DAYS:
+            # Rango largo: mínimo, máximo y promedio por intervalo calculados en la BD
+            width = max(1, -(-int((end - start).total_seconds()) // max_points))
+            start_epoch = to_epoch(start)
+            buckets = _temperature_buckets(start, end, width, sensor_id=sensor_id, silo_id=silo_id)
+            for (sid, index), (low, high, total, count) in sorted(buckets.items()):
+                original, data = by_sensor.setdefault(sid, (0, []))
+                data.append({
+                    'x': (start_epoch + index * width) * 1000,
+                    'y': round(total / count, 2),
+                    'min': round(low, 2),
+                    'max': round(high, 2)
+                })
+                by_sensor[sid] = (original + count, data)
+            fuente = 'agregado'
+        else:
+            points_by_sensor = {}
+            for row in get_historical_temperatures(start, end, sensor_id=sensor_id, silo_id=silo_id):
+                points_by_sensor.setdefault(row['sensor_id'], []).append((to_epoch(row['timestamp']), row['temperatura']))
+            for sid, points in points_by_sensor.items():
+                by_sensor[sid] = (len(points), _series_points(points, max_points))
+            fuente = 'lecturas'
+        for sid, (original, data) in sorted(by_sensor.items(), key=lambda item: (positions.get(item[0], 99), item[0])):
+            series.append({
+                'sensor_id': sid,
+                'posicion': positions.get(sid),
+                'puntos_originales': original,
+                'data': data
+            })
+    else:
+        if (end - start).days > SERIES_ROLLUP_DAYS:
+            points = [
+                (to_epoch(datetime.combine(row.day, datetime.min.time())), row.runtime_hours)
+                for row in AeratorRuntimeDaily.query.filter(
+                    AeratorRuntimeDaily.silo_id == silo_id,
+                    AeratorRuntimeDaily.day >= start.date(),
+                    AeratorRuntimeDaily.day <= end.date()
+                ).order_by(AeratorRuntimeDaily.day)
+            ]
+            fuente = 'resumen_diario'
+        else:
+            points = [(to_epoch(row['timestamp']), row['runtime_hours'])
+                      for row in get_historical_runtimes(start, end, silo_id)]
+            fuente = 'ciclos'
+        series.append({'silo_id': silo_id, 'puntos_originales': len(points), 'data': _series_points(points, max_points)})
+
+    return jsonify({
+        'status': 'success',
+        'tipo': tipo,
+        'fuente': fuente,
+        'desde': start.isoformat(),
+        'hasta': end.isoformat(),
+        'max_puntos': max_points,
+        'series': series
+    })
+
+# ---------------------------------------------------------------------------
+# Disponibilidad de la flota (resumen diario incremental)
+# ---------------------------------------------------------------------------
 
-            db.session.add(egg_record)
+def update_availability_summary():
+    """
+    Avanza el resumen diario de disponibilidad de los dispositivos.
+
+    Recalcula desde el último día resumido (que pudo haber quedado parcial) hasta
+    hoy, así que en cada corrida normalmente solo se toca el día actual. La primera
+    vez cubre los días que todavía tienen bitmaps de heartbeat (7 días).
+
+    Returns:
+        dict: Rango recalculado y cantidad de filas actualizadas
+    """
+    now = time_service.now_naive()
+    today = now.date()
+    oldest_day = today - timedelta(days=6)
+    last_day = db.session.query(func.max(DeviceAvailabilityDaily.day)).scalar()
+    start_day = max(last_day, oldest_day) if last_day else oldest_day
+    days = heartbeat_bitmap.days_between(start_day, today)
+
+    # Solo dispositivos que alguna vez enviaron heartbeat
+    boards = dict(
+        db.session.query(Board.mac_address, Board.registration_date)
+        .join(DeviceHeartbeat, DeviceHeartbeat.mac_address == Board.mac_address)
+        .all()
+    )
+    bitmaps = get_heartbeat_bitmaps(list(boards), start_day, today)
+
+    reboots = {}
+    for mac_address, reboot_time, reason in db.session.query(
+            Esp32Reboot.mac_address, Esp32Reboot.reboot_time, Esp32Reboot.reason
+    ).filter(Esp32Reboot.reboot_time >= datetime.combine(start_day, datetime.min.time())):
+        reasons = reboots.setdefault((mac_address, reboot_time.date()), {})
+        reason = reason or 'No especificado'
+        reasons[reason] = reasons.get(reason, 0) + 1
+
+    full_day = (1 << heartbeat_bitmap.SLOTS_PER_DAY) - 1
+    current_slot = heartbeat_bitmap.slot_index(now)
+    updated = 0
+    for mac_address, registration_date in boards.items():
+        for day in days:
+            if registration_date and day < registration_date.date():
+                continue
+            # Slots esperados: el día completo, hasta el slot actual si es hoy,
+            # y desde el registro si el dispositivo se dio de alta ese día
+            expected_mask = full_day if day < today else (1 << (current_slot + 1)) - 1
+            if registration_date and day == registration_date.date():
+                expected_mask &= ~((1 << heartbeat_bitmap.slot_index(registration_date)) - 1)
+
+            reasons = reboots.get((mac_address, day), {})
+            values = {
+                'mac_address': mac_address,
+                'day': day,
+                'received_slots': heartbeat_bitmap.count_slots(bitmaps.get((mac_address, day), 0) & expected_mask),
+                'expected_slots': heartbeat_bitmap.count_slots(expected_mask),
+                'reboot_count': sum(reasons.values()),
+                'reboot_reasons': json.dumps(reasons) if reasons else None,
+                'updated_at': now
+            }
+            _upsert(DeviceAvailabilityDaily, values, ['mac_address', 'day'],
+                    lambda inserted: {column: getattr(inserted, column) for column in
+                                      ('received_slots', 'expected_slots', 'reboot_count', 'reboot_reasons', 'updated_at')})
+            updated += 1
+
+    db.session.commit()
+    return {'desde': start_day.isoformat(), 'hasta': today.isoformat(), 'filas': updated}
+
+availability_job = PeriodicJob('availability_summary', app.config['AVAILABILITY_JOB_INTERVAL'], update_availability_summary)
+
+@app.route('/api/fleet/worst_devices')
+@login_required
+@super_admin_required
+def fleet_worst_devices():
+    """
+    Ranking de los dispositivos con peor disponibilidad en los últimos `days` días
+    (por defecto 7), servido desde el resumen diario. Desempata por cantidad de reinicios.
+    """
+    days = min(max(request.args.get('days', 7, type=int), 1), 365)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+    since = time_service.today() - timedelta(days=days - 1)
+
+    received = func.sum(DeviceAvailabilityDaily.received_slots)
+    expected = func.sum(DeviceAvailabilityDaily.expected_slots)
+    reboots = func.sum(DeviceAvailabilityDaily.reboot_count)
+    availability = received * 1.0 / expected
+
+    rows = db.session.query(
+        DeviceAvailabilityDaily.mac_address,
+        Board.id.label('board_id'),
+        Establishment.id.label('establishment_id'),
+        Establishment.name.label('establishment_name'),
+        received.label('received'),
+        expected.label('expected'),
+        reboots.label('reboots'),
+        availability.label('availability')
+    ).join(
+        Board, Board.mac_address == DeviceAvailabilityDaily.mac_address
+    ).join(
+        Establishment, Establishment.id == Board.establishment_id
+    ).filter(
+        DeviceAvailabilityDaily.day >= since
+    ).group_by(
+        DeviceAvailabilityDaily.mac_address, Board.id, Establishment.id, Establishment.name
+    ).having(
+        expected > 0
+    ).order_by(
+        availability.asc(), reboots.desc()
+    ).limit(limit).all()
+
+    # Razones de reinicio de los dispositivos del ranking
+    reasons_by_mac = {}
+    if rows:
+        for mac_address, reasons in db.session.query(
+                DeviceAvailabilityDaily.mac_address, DeviceAvailabilityDaily.reboot_reasons
+        ).filter(
+            DeviceAvailabilityDaily.mac_address.in_([row.mac_address for row in rows]),
+            DeviceAvailabilityDaily.day >= since,
+            DeviceAvailabilityDaily.reboot_reasons.isnot(None)
+        ):
+            totals = reasons_by_mac.setdefault(mac_address, {})
+            for reason, count in json.loads(reasons).items():
+                totals[reason] = totals.get(reason, 0) + count
+
+    return jsonify({
+        'status': 'success',
+        'days': days,
+        'since': since.isoformat(),
+        'summary_job': availability_job.status(),
+        'data': [{
+            'mac_address': row.mac_address,
+            'board_id': row.board_id,
+            'establishment_id': row.establishment_id,
+            'establishment_name': row.establishment_name,
+            'availability_pct': round(float(row.availability) * 100, 1),
+            'received_slots': int(row.received),
+            'missing_slots': int(row.expected - row.received),
+            'reboots': int(row.reboots),
+            'reboot_reasons': sorted(reasons_by_mac.get(row.mac_address, {}).items(), key=lambda r: -r[1])
+        } for row in rows]
+    })
+
+# ---------------------------------------------------------------------------
+# Réplica de lectura
+# ---------------------------------------------------------------------------
+
+def write_replication_heartbeat():
+    """Actualiza en el primario la marca que la réplica usa para medir su retraso"""
+    ts = int(time_service.now_utc().timestamp())
+    _upsert(ReplicationHeartbeat, {'id': 1, 'ts': ts}, ['id'], lambda inserted: {'ts': inserted.ts})
+    db.session.commit()
+    return ts
+
+def read_replication_heartbeat(engine):
+    """Última marca de replicación visible en la réplica (None si todavía no llegó)"""
+    with engine.connect() as connection:
+        return connection.execute(
+            select(ReplicationHeartbeat.ts).where(ReplicationHeartbeat.id == 1)
+        ).scalar()
+
+replica_monitor = ReplicaMonitor(
+    read_replication_heartbeat,
+    max_lag=app.config['REPLICA_MAX_LAG'],
+    clock=lambda: time_service.now_utc().timestamp()
+)
+RoutingSession.monitor = replica_monitor
+replication_heartbeat_job = PeriodicJob('replication_heartbeat', app.config['REPLICA_HEARTBEAT_INTERVAL'], write_replication_heartbeat)
+
+@app.route('/api/db/replica_status')
+@login_required
+@super_admin_required
+def replica_status():
+    """Estado de la réplica de lectura: configuración, retraso y tarea de heartbeat"""
+    replica = db.engines.get(REPLICA_BIND)
+    if replica is None:
+        return jsonify({'configured': False})
+    replica_monitor.is_fresh(replica)
+    return jsonify({
+        'configured': True,
+        **replica_monitor.status(),
+        'heartbeat_job': replication_heartbeat_job.status()
+    })
+
+@event.listens_for(RoutingSession, 'before_commit')
+def _write_pending_silo_audit(session):
+    """Inserta los cambios de silos registrados en el request dentro de la transacción que se confirma"""
+    entries = silo_audit.take_pending()
+    if entries:
+        session.execute(insert(SiloChangeLog), entries)
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _queue_committed_silo_audit(session):
+    """Pasa al escritor en segundo plano los registros asíncronos de la transacción confirmada"""
+    entries = silo_audit.take_pending(queued=True)
+    if entries:
+        silo_audit_queue.put(entries)
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _discard_pending_silo_audit(session, previous_transaction):
+    """Si se deshace la transacción, sus registros de auditoría tampoco se escriben"""
+    silo_audit.take_pending()
+    silo_audit.take_pending(queued=True)
+
+def write_queued_silo_audit():
+    """Inserta en lotes los registros de auditoría encolados; devuelve cuántos escribió"""
+    written = 0
+    while True:
+        batch = silo_audit_queue.take(app.config['SILO_AUDIT_WRITER_BATCH'])
+        if not batch:
+            return written
+        try:
+            db.session.execute(insert(SiloChangeLog), batch)
             db.session.commit()
+        except Exception:
+            db.session.rollback()
+            silo_audit_queue.requeue(batch)
+            raise
+        silo_audit_queue.mark_written(len(batch))
+        written += len(batch)
 
-            app.logger.info(f"Datos de huevos guardados exitosamente: granja_id={granja_id}, total={total}, timestamp={timestamp}")
+silo_audit_queue = silo_audit.AuditQueue()
+silo_audit_job = PeriodicJob('silo_audit_writer', app.config['SILO_AUDIT_WRITER_INTERVAL'], write_queued_silo_audit)
 
-            return jsonify({
-                'status': 'success',
-                'message': 'Datos de huevos recibidos y guardados correctamente',
-                'id': egg_record.id,
-                'granja_id': granja_id,
-                'total': total,
-                'timestamp': timestamp.isoformat()
-            }), 200
-        
+@app.route('/api/silo_audit/status')
+@login_required
+@super_admin_required
+def silo_audit_status():
+    """Estado de la cola de auditoría asíncrona y de su escritor"""
+    return jsonify({
+        'async_default': app.config['SILO_AUDIT_ASYNC'],
+        **silo_audit_queue.status(),
+        'writer_job': silo_audit_job.status()
+    })
+
+# --- Eliminación diferida de silos y establecimientos ---
+
+# Los eliminados quedan ocultos en todas las consultas ORM hasta que se purgan
+SOFT_DELETE_CRITERIA = tuple(
+    with_loader_criteria(model, model.deleted_at.is_(None), include_aliases=True)
+    for model in (Establishment, Silo, Board)
+)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _collect_principal_changes(session, flush_context):
+    """
+    Anota qué principals dejan de valer con lo que se está guardando: el de un
+    usuario modificado o eliminado (rol, membresías) y todos si se crea, mueve o
+    elimina un silo o se elimina un establecimiento. Se descartan en el commit.
+    """
+    changes = session.info.setdefault('principal_changes', set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            changes.add(obj.id)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Silo):
+            state = inspect(obj)
+            if obj in session.new or obj in session.deleted \
+                    or state.attrs.establishment_id.history.has_changes() or state.attrs.deleted_at.history.has_changes():
+                changes.add(None)
+        elif isinstance(obj, Establishment) and obj in session.dirty \
+                and inspect(obj).attrs.deleted_at.history.has_changes():
+            changes.add(None)
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _invalidate_principals(session):
+    changes = session.info.pop('principal_changes', None)
+    if not changes:
+        return
+    if None in changes:
+        principals.invalidate()
+    else:
+        for user_id in changes:
+            principals.invalidate(user_id)
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _discard_principal_changes(session, previous_transaction):
+    session.info.pop('principal_changes', None)
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _hide_deleted_entities(execute_state):
+    """Filtra establecimientos, silos y placas eliminados (salvo con include_deleted=True)"""
+    if execute_state.is_select and not execute_state.is_column_load \
+            and not execute_state.execution_options.get('include_deleted', False):
+        execute_state.statement = execute_state.statement.options(*SOFT_DELETE_CRITERIA)
+
+def migrate_soft_delete_columns():
+    for model in (Establishment, Silo, Board):
+        _ensure_column(model, 'deleted_at', 'DATETIME NULL')
+
+def _mark_silo_deleted(silo, now):
+    """
+    Marca un silo como eliminado (sin commit). Libera su posición de aireador, que
+    la restricción única seguiría ocupando hasta la purga, y desasigna su barra.
+    """
+    silo.deleted_at = now
+    silo.aerator_position = -silo.id
+    barra = BarraSensores.query.filter_by(silo_asignado_id=silo.id).first()
+    if barra:
+        barra.silo_asignado_id = None
+        sync_sensor_assignments(_bar_sensor_ids(barra))
+
+def _purge_batch(table, condition, batch_size):
+    """Borra hasta `batch_size` filas que cumplen la condición; devuelve cuántas borró"""
+    table = getattr(table, '__table__', table)
+    pk = list(table.primary_key.columns)
+    keys = db.session.execute(
+        select(*pk).where(condition).limit(batch_size).execution_options(include_deleted=True)
+    ).all()
+    if not keys:
+        return 0
+    if len(pk) == 1:
+        where = pk[0].in_([key[0] for key in keys])
+    else:
+        where = tuple_(*pk).in_([tuple(key) for key in keys])
+    db.session.execute(delete(table).where(where).execution_options(include_deleted=True))
+    return len(keys)
+
+def _purge_delete(table, condition):
+    """Paso que borra por lotes las filas de `table` que cumplen `condition`"""
+    return lambda batch_size: _purge_batch(table, condition, batch_size)
+
+def _purge_update(table, condition, values):
+    """Paso que desvincula filas (un UPDATE; las filas siguen existiendo)"""
+    def step(batch_size):
+        return db.session.execute(
+            update(table).where(condition).values(**values).execution_options(include_deleted=True)
+        ).rowcount
+    return step
+
+def _silo_purge_steps(silo_id):
+    """Pasos (nombre, función) para borrar un silo y sus datos, en orden"""
+    prefix = f'silo {silo_id}: '
+    return [(prefix + name, step) for name, step in (
+        ('aerator_runtime', _purge_delete(AeratorRuntime, AeratorRuntime.silo_id == silo_id)),
+        ('aerator_runtime_daily', _purge_delete(AeratorRuntimeDaily, AeratorRuntimeDaily.silo_id == silo_id)),
+        ('aerator_runtime_total', _purge_delete(AeratorRuntimeTotal, AeratorRuntimeTotal.silo_id == silo_id)),
+        ('protection_alert', _purge_delete(ProtectionAlert, ProtectionAlert.silo_id == silo_id)),
+        ('lectura_temperatura', _purge_delete(LecturaTemperatura, LecturaTemperatura.silo_id == silo_id)),
+        # La condición depende del historial de asignaciones, que se desvincula después
+        ('lectura_temperatura_compacta', lambda batch_size: _purge_batch(
+            LecturaTemperaturaCompacta, compact_readings_for_silo_condition(silo_id), batch_size)),
+        ('sensor_asignacion_historial', _purge_update(
+            SensorAsignacionHistorial, SensorAsignacionHistorial.silo_id == silo_id, {'silo_id': None})),
+        ('barra_sensores', _purge_update(
+            BarraSensores, BarraSensores.silo_asignado_id == silo_id, {'silo_asignado_id': None})),
+        ('silo_change_log', _purge_delete(SiloChangeLog, SiloChangeLog.silo_id == silo_id)),
+        ('aeration_config', _purge_delete(AerationConfig, AerationConfig.silo_id == silo_id)),
+        ('silo', _purge_delete(Silo, Silo.id == silo_id)),
+    )]
+
+def _establishment_purge_steps(establishment_id):
+    """Pasos para borrar un establecimiento: sus silos, sus placas y luego el establecimiento"""
+    steps = []
+    silo_ids = db.session.execute(
+        select(Silo.id).where(Silo.establishment_id == establishment_id).execution_options(include_deleted=True)
+    ).scalars().all()
+    for silo_id in silo_ids:
+        steps.extend(_silo_purge_steps(silo_id))
+    steps.append(('schedule_decision', _purge_delete(
+        ScheduleDecision, ScheduleDecision.establishment_id == establishment_id)))
+    macs = db.session.execute(
+        select(Board.mac_address).where(Board.establishment_id == establishment_id).execution_options(include_deleted=True)
+    ).scalars().all()
+    for mac in macs:
+        for model in (DeviceHeartbeatHistory, DeviceHeartbeatBitmap, DeviceAvailabilityDaily, DeviceStatusTransition,
+                      DeviceHeartbeat, Esp32Reboot, DeviceActionLog, Board):
+            steps.append((f'{mac}: {model.__tablename__}', _purge_delete(model, model.mac_address == mac)))
+    steps.extend([
+        ('barra_sensores', _purge_update(
+            BarraSensores, BarraSensores.establecimiento_id == establishment_id, {'establecimiento_id': None})),
+        ('user_establishments', _purge_delete(
+            user_establishments, user_establishments.c.establishment_id == establishment_id)),
+        ('establishment', _purge_delete(Establishment, Establishment.id == establishment_id)),
+    ])
+    return steps
+
+# Identificador de este proceso en los leases de las tareas de borrado
+PROCESS_ID = f'{socket.gethostname()}:{os.getpid()}'
+
+def _purge_retry_due(task, now):
+    """Si una tarea con error ya esperó lo suficiente para reintentarse"""
+    delay = app.config['PURGE_RETRY_DELAY'] * 2 ** max(task.attempts - 1, 0)
+    return task.updated_at is None or task.updated_at + timedelta(seconds=delay) <= now
+
+def _claim_purge_task(task, now):
+    """
+    Toma la tarea para este proceso con un UPDATE condicional: solo si sigue en el
+    estado en que se leyó y, si está 'running', con el lease vencido. Devuelve
+    False si otro worker la tomó antes.
+    """
+    if task.status == 'running':
+        available = or_(PurgeTask.heartbeat_at.is_(None),
+                        PurgeTask.heartbeat_at < now - timedelta(seconds=app.config['PURGE_LEASE']))
+    elif task.status == 'error':
+        available = PurgeTask.attempts == task.attempts
+    else:
+        available = true()
+    claimed = db.session.execute(
+        update(PurgeTask)
+        .where(PurgeTask.id == task.id, PurgeTask.status == task.status, available)
+        .values(status='running', claimed_by=PROCESS_ID, heartbeat_at=now, last_error=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+    db.session.commit()
+    return claimed
+
+def _update_claimed_purge_task(task_id, **values):
+    """Actualiza una tarea solo si este proceso conserva el lease (sin commit); devuelve si lo conserva"""
+    return db.session.execute(
+        update(PurgeTask)
+        .where(PurgeTask.id == task_id, PurgeTask.claimed_by == PROCESS_ID, PurgeTask.status == 'running')
+        .values(heartbeat_at=time_service.now_naive(), updated_at=time_service.now_naive(), **values)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+
+def run_purge_task(task):
+    """
+    Ejecuta una tarea de borrado ya tomada por este proceso, por lotes de
+    PURGE_BATCH_SIZE filas. Cada lote se confirma junto con el progreso y la
+    renovación del lease; si el lease se perdió, el lote se deshace y se abandona
+    la tarea (la sigue el worker que la tomó).
+    """
+    batch_size = app.config['PURGE_BATCH_SIZE']
+    task_id, entity, entity_id = task.id, task.entity, task.entity_id
+    try:
+        if entity == 'silo':
+            steps = _silo_purge_steps(entity_id)
+        else:
+            steps = _establishment_purge_steps(entity_id)
+        for name, step in steps:
+            while True:
+                deleted = step(batch_size)
+                if not _update_claimed_purge_task(task_id, step=name, deleted_rows=PurgeTask.deleted_rows + deleted):
+                    db.session.rollback()
+                    app.logger.warning(f"Purga de {entity} {entity_id}: lease perdido, se abandona")
+                    return
+                db.session.commit()
+                if deleted < batch_size:
+                    break
+        _update_claimed_purge_task(task_id, status='done', step=None, claimed_by=None,
+                                   finished_at=time_service.now_naive())
+        db.session.commit()
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f"Error en receive_egg_data: {str(e)}")
-        return jsonify({'error': 'Error interno del servidor'}), 500
+        _update_claimed_purge_task(task_id, status='error', last_error=str(e), claimed_by=None,
+                                   attempts=PurgeTask.attempts + 1)
+        db.session.commit()
+        app.logger.error(f"Error al purgar {entity} {entity_id}: {str(e)}")
+
+def run_purge_tasks():
+    """
+    Procesa las tareas pendientes, interrumpidas (lease vencido) o con error;
+    devuelve cuántas terminó este proceso. Las que fallaron PURGE_MAX_ATTEMPTS
+    veces quedan en 'error' hasta revisarlas.
+    """
+    tasks = PurgeTask.query.filter(or_(
+        PurgeTask.status.in_(('pending', 'running')),
+        and_(PurgeTask.status == 'error', PurgeTask.attempts < app.config['PURGE_MAX_ATTEMPTS'])
+    )).order_by(PurgeTask.id).all()
+    now = time_service.now_naive()
+    done = 0
+    for task in tasks:
+        if task.status == 'error' and not _purge_retry_due(task, now):
+            continue
+        if not _claim_purge_task(task, now):
+            continue
+        run_purge_task(task)
+        db.session.refresh(task)
+        done += task.status == 'done'
+    return done
+
+purge_job = PeriodicJob('purge', app.config['PURGE_JOB_INTERVAL'], run_purge_tasks)
+
+def _serialize_purge_task(task):
+    return {
+        'id': task.id,
+        'entity': task.entity,
+        'entity_id': task.entity_id,
+        'entity_name': task.entity_name,
+        'status': task.status,
+        'step': task.step,
+        'deleted_rows': task.deleted_rows,
+        'attempts': task.attempts,
+        'claimed_by': task.claimed_by,
+        'heartbeat_at': task.heartbeat_at.isoformat() if task.heartbeat_at else None,
+        'created_at': task.created_at.isoformat() if task.created_at else None,
+        'updated_at': task.updated_at.isoformat() if task.updated_at else None,
+        'finished_at': task.finished_at.isoformat() if task.finished_at else None,
+        'last_error': task.last_error
+    }
+
+@app.route('/api/purge_tasks')
+@login_required
+@super_admin_required
+def purge_tasks():
+    """Progreso de los borrados en segundo plano (las últimas 100 tareas)"""
+    query = PurgeTask.query
+    if request.args.get('status'):
+        query = query.filter_by(status=request.args['status'])
+    tasks = query.order_by(PurgeTask.id.desc()).limit(100).all()
+    return jsonify({
+        'tasks': [_serialize_purge_task(task) for task in tasks],
+        'job': purge_job.status()
+    })
+
+@app.route('/api/purge_tasks/<int:task_id>')
+@login_required
+def purge_task_status(task_id):
+    task = PurgeTask.query.get_or_404(task_id)
+    if current_user.role != 'super_admin' and task.requested_by_id != current_user.id:
+        return jsonify({'error': 'Acceso no autorizado'}), 403
+    return jsonify(_serialize_purge_task(task))
 
 if __name__ == '__main__':
     init_db()
@@ -0,0 +1,69 @@
+from datetime import datetime
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import time_service
+
+
+class PeriodicJob:
+    """
+    Ejecuta una función cada `interval` segundos en un hilo daemon, dentro del
+    contexto de la aplicación Flask (igual que WeatherCache, pero genérico).
+
+    Guarda el resultado o el error de la última ejecución para poder consultarlo.
+    """
+
+    def __init__(self, name: str, interval: int, func: Callable[[], Any]):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.app = None
+        self.lock = threading.Lock()
+        self.last_run: Optional[datetime] = None
+        self.last_result: Any = None
+        self.last_error: Optional[str] = None
+        self._stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._loop, name=f"job-{name}", daemon=True)
+
+    def start(self, app):
+        """Inicia el hilo; la primera ejecución es inmediata"""
+        self.app = app
+        self.thread.start()
+
+    def stop(self):
+        """Detiene el ciclo de ejecución"""
+        self._stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def run_now(self) -> Any:
+        """Ejecuta la tarea en el hilo actual (también la usa el ciclo del hilo)"""
+        with self.app.app_context():
+            try:
+                result = self.func()
+                error = None
+            except Exception as e:
+                result = None
+                error = str(e)
+                print(f"Error en tarea periódica {self.name}: {error}")
+        with self.lock:
+            self.last_run = time_service.now_naive()
+            self.last_result = result
+            self.last_error = error
+        return result
+
+    def status(self) -> Dict:
+        with self.lock:
+            return {
+                'name': self.name,
+                'interval': self.interval,
+                'running': self.thread.is_alive(),
+                'last_run': self.last_run.isoformat() if self.last_run else None,
+                'last_result': self.last_result,
+                'last_error': self.last_error
+            }
+
+    def _loop(self):
+        while not self._stop_event.is_set():
+            self.run_now()
+            self._stop_event.wait(self.interval)
@@ -0,0 +1,118 @@
+"""
+Benchmark de /sensors_overview: carga una base SQLite temporal con N sensores
+(por defecto 1000) repartidos en barras, silos y establecimientos, con lecturas
+en ambos formatos, y mide el tiempo de la vista y la cantidad de consultas SQL.
+
+Uso:
+    python benchmark_sensors_overview.py [cantidad_sensores] [repeticiones] [lecturas_por_sensor]
+
+Por defecto cada sensor tiene una semana de historial (una lectura cada 10
+minutos). Ni la cantidad de consultas ni el tiempo deben crecer con el historial.
+"""
+import os
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ['DATABASE_URI'] = 'sqlite:///' + os.path.join(_tmp, 'benchmark.sqlite')
+
+from datetime import timedelta  # noqa: E402
+
+from sqlalchemy import event  # noqa: E402
+
+import app as appmod  # noqa: E402
+from compact_readings import encode_temperature, to_epoch  # noqa: E402
+
+app, db = appmod.app, appmod.db
+
+SENSORES_POR_BARRA = 8
+BARRAS_POR_ESTABLECIMIENTO = 10
+LECTURAS_POR_SENSOR = 7 * 24 * 6
+
+
+def seed(total_sensores, lecturas_por_sensor=LECTURAS_POR_SENSOR):
+    ahora = appmod.get_argentina_time().replace(tzinfo=None)
+    sensores = [appmod.SensorTemperatura(numero_serie=f'BENCH-{i:06d}', descripcion=f'Sensor {i}')
+                for i in range(total_sensores)]
+    db.session.add_all(sensores)
+    db.session.flush()
+
+    # Un 10% de los sensores queda sin asignar a ninguna barra
+    asignables = sensores[:total_sensores - total_sensores // 10]
+    establecimiento = None
+    for numero_barra, inicio in enumerate(range(0, len(asignables), SENSORES_POR_BARRA)):
+        if numero_barra % BARRAS_POR_ESTABLECIMIENTO == 0:
+            establecimiento = appmod.Establishment(name=f'Establecimiento {numero_barra}', latitude=-34.6,
+                                                   longitude=-58.4, owner='benchmark')
+            db.session.add(establecimiento)
+            db.session.flush()
+        silo = appmod.Silo(name=f'Silo {numero_barra}', establishment_id=establecimiento.id,
+                           min_temperature=0, max_temperature=30, min_humidity=0, max_humidity=100,
+                           aerator_position=numero_barra % BARRAS_POR_ESTABLECIMIENTO + 1)
+        db.session.add(silo)
+        db.session.flush()
+        barra = appmod.BarraSensores(nombre=f'Barra {numero_barra}', establecimiento_id=establecimiento.id,
+                                     silo_asignado_id=silo.id)
+        for posicion, sensor in enumerate(asignables[inicio:inicio + SENSORES_POR_BARRA], start=1):
+            setattr(barra, f'sensor{posicion}_id', sensor.id)
+        db.session.add(barra)
+
+    # Lecturas alternando formatos y antigüedades para cubrir todos los estados
+    legacy, compactas = [], []
+    for i, sensor in enumerate(sensores):
+        base = ahora - timedelta(minutes=(i % 4) * 400)
+        for n in range(lecturas_por_sensor):
+            timestamp = base - timedelta(minutes=10 * n)
+            if (i + n) % 2:
+                legacy.append({'sensor_id': sensor.id, 'temperatura': 20 + n % 10, 'timestamp': timestamp})
+            else:
+                compactas.append({'sensor_id': sensor.id, 'ts': to_epoch(timestamp),
+                                  'temp_centi': encode_temperature(20 + n % 10), 'mapeo_explicito': False})
+    db.session.execute(appmod.LecturaTemperatura.__table__.insert(), legacy)
+    db.session.execute(appmod.LecturaTemperaturaCompacta.__table__.insert(), compactas)
+
+    admin = appmod.User(username='benchmark', role='super_admin')
+    admin.set_password('benchmark')
+    db.session.add(admin)
+    db.session.commit()
+
+
+def main():
+    total_sensores = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    lecturas_por_sensor = int(sys.argv[3]) if len(sys.argv) > 3 else LECTURAS_POR_SENSOR
+
+    with app.app_context():
+        db.create_all()
+        seed(total_sensores, lecturas_por_sensor)
+        engine = db.engine
+
+    consultas = []
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        consultas.append(statement)
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'benchmark', 'password': 'benchmark'})
+
+    tiempos = []
+    for _ in range(repeticiones):
+        consultas.clear()
+        inicio = time.perf_counter()
+        respuesta = client.get('/sensors_overview')
+        tiempos.append(time.perf_counter() - inicio)
+        if respuesta.status_code != 200:
+            print(f'Respuesta inesperada: {respuesta.status_code}')
+            return 1
+
+    tiempos.sort()
+    print(f'Sensores: {total_sensores}  lecturas por sensor: {lecturas_por_sensor}  repeticiones: {repeticiones}')
+    print(f'Consultas SQL por request: {len(consultas)}')
+    print(f'Tiempo: mínimo {tiempos[0] * 1000:.1f} ms, mediana {tiempos[len(tiempos) // 2] * 1000:.1f} ms')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+from bisect import bisect_right
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+# Zona horaria en la que se guardan (naive) los timestamps del resto de las tablas
+from time_service import LOCAL_TZ
+
+
+# Rango de una columna SMALLINT con signo, en centésimas de grado
+MIN_CENTI = -32768
+MAX_CENTI = 32767
+
+
+def encode_temperature(temperatura: float) -> int:
+    """Convierte una temperatura en °C a centésimas de grado (entero de punto fijo)"""
+    centi = int(round(float(temperatura) * 100))
+    if centi < MIN_CENTI or centi > MAX_CENTI:
+        raise ValueError(f"Temperatura fuera de rango para el formato compacto: {temperatura}")
+    return centi
+
+
+def decode_temperature(centi: int) -> float:
+    """Convierte centésimas de grado a °C"""
+    return centi / 100.0
+
+
+def to_epoch(timestamp: datetime) -> int:
+    """
+    Convierte un datetime a segundos epoch (UTC).
+    Los datetime naive se interpretan como hora local de Argentina, igual que en la BD.
+    """
+    if timestamp.tzinfo is None:
+        timestamp = LOCAL_TZ.localize(timestamp)
+    return int(timestamp.timestamp())
+
+
+def from_epoch(ts: int) -> datetime:
+    """Convierte segundos epoch a datetime naive en hora local de Argentina"""
+    return datetime.fromtimestamp(ts, LOCAL_TZ).replace(tzinfo=None)
+
+
+class AssignmentTimeline:
+    """
+    Historial en memoria de las asignaciones sensor -> (barra, silo).
+
+    Cada intervalo es (desde, hasta, barra_id, silo_id) en segundos epoch, con
+    `hasta` igual a None para la asignación vigente. Permite saber a qué barra y
+    silo pertenecía un sensor en un instante dado sin guardarlo en cada lectura.
+    """
+
+    def __init__(self, intervals: Iterable = ()):
+        self._by_sensor: Dict[int, list] = {}
+        for interval in intervals:
+            self.add(interval.sensor_id, interval.desde, interval.hasta, interval.barra_id, interval.silo_id)
+
+    def add(self, sensor_id: int, desde: int, hasta: Optional[int], barra_id: Optional[int], silo_id: Optional[int]):
+        intervals = self._by_sensor.setdefault(sensor_id, [])
+        intervals.append((desde, hasta, barra_id, silo_id))
+        intervals.sort(key=lambda i: i[0])
+
+    def lookup(self, sensor_id: int, ts: int) -> Optional[Tuple[Optional[int], Optional[int]]]:
+        """
+        Devuelve (barra_id, silo_id) vigentes para el sensor en `ts`,
+        o None si no hay historial que cubra ese instante.
+        """
+        intervals = self._by_sensor.get(sensor_id)
+        if not intervals:
+            return None
+        idx = bisect_right([i[0] for i in intervals], ts) - 1
+        if idx < 0:
+            return None
+        desde, hasta, barra_id, silo_id = intervals[idx]
+        if hasta is not None and ts >= hasta:
+            return None
+        return barra_id, silo_id
+
+    def silo_ranges(self, silo_id: int):
+        """Recorre los (sensor_id, desde, hasta) en los que un sensor estuvo asignado al silo"""
+        for sensor_id, intervals in self._by_sensor.items():
+            for desde, hasta, _, interval_silo_id in intervals:
+                if interval_silo_id == silo_id:
+                    yield sensor_id, desde, hasta
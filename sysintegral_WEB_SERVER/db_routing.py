@@ -0,0 +1,105 @@
+from functools import wraps
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+
+
+# Nombre del bind (SQLALCHEMY_BINDS) de la réplica de lectura
+REPLICA_BIND = 'replica'
+
+
+class ReplicaMonitor:
+    """
+    Decide si la réplica está suficientemente al día para atender lecturas.
+
+    El primario escribe periódicamente un heartbeat (segundos epoch) que llega a la
+    réplica por replicación; el retraso es la diferencia entre la hora actual y el
+    heartbeat leído en la réplica. El resultado se reutiliza durante
+    `check_interval` segundos para no consultar la réplica en cada request.
+
+    La consulta a la réplica se hace fuera del lock y la hace un solo request por
+    vez: mientras tanto los demás usan el último resultado (o el primario si
+    todavía no hay), así una réplica lenta o colgada no frena a todos. Si esa
+    consulta tarda más de `check_interval` la réplica se da por atrasada.
+    """
+
+    def __init__(self, read_heartbeat: Callable, max_lag: float, check_interval: float = 5,
+                 clock: Callable[[], float] = time.time):
+        self.read_heartbeat = read_heartbeat  # (engine) -> epoch del último heartbeat o None
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.clock = clock  # segundos epoch actuales
+        self.lock = threading.Lock()
+        self._checked_at = 0.0
+        self._checking = False
+        self._check_started = 0.0
+        self._lag: Optional[float] = None
+        self._error: Optional[str] = None
+
+    def is_fresh(self, engine) -> bool:
+        with self.lock:
+            check = not self._checking and time.monotonic() - self._checked_at >= self.check_interval
+            if check:
+                self._checking = True
+                self._check_started = time.monotonic()
+        if check:
+            try:
+                heartbeat = self.read_heartbeat(engine)
+                lag = self.clock() - heartbeat if heartbeat is not None else None
+                error = None
+            except Exception as e:
+                lag = None
+                error = str(e)
+            with self.lock:
+                self._lag, self._error = lag, error
+                self._checked_at = time.monotonic()
+                self._checking = False
+        with self.lock:
+            if self._checking and time.monotonic() - self._check_started > self.check_interval:
+                return False
+            return self._lag is not None and self._lag <= self.max_lag
+
+    def status(self) -> Dict:
+        with self.lock:
+            return {
+                'lag_seconds': round(self._lag, 1) if self._lag is not None else None,
+                'max_lag_seconds': self.max_lag,
+                'fresh': self._lag is not None and self._lag <= self.max_lag,
+                'error': self._error
+            }
+
+
+class RoutingSession(Session):
+    """
+    Sesión que envía las consultas de las vistas marcadas con @read_replica a la
+    réplica (si está configurada y al día). Los flush y todo lo demás van al primario.
+    """
+
+    monitor: Optional[ReplicaMonitor] = None
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and replica_requested():
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None and self.monitor is not None and self.monitor.is_fresh(replica):
+                g.db_served_by_replica = True
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_requested() -> bool:
+    return has_app_context() and g.get('db_read_replica', False)
+
+
+def read_replica(f):
+    """Marca una vista de solo lectura: sus consultas pueden ir a la réplica"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.db_read_replica = True
+        try:
+            return f(*args, **kwargs)
+        finally:
+            g.db_read_replica = False
+    return decorated_function
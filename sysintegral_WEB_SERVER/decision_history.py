@@ -0,0 +1,71 @@
+from typing import Dict, Iterable, List, Tuple
+
+
+# Motivos de apagado forzado, como bits de un entero
+FORCED_OFF_REASONS = {
+    'max_current_exceeded': 1,
+    'global_aerator_control_disabled': 2
+}
+
+# Posiciones de aireador por establecimiento (1-8), un bit cada una
+MAX_POSITIONS = 8
+
+# Los motivos se guardan por posición, un nibble cada una (posición 1 en los bits bajos)
+REASON_BITS = 4
+REASON_MASK = (1 << REASON_BITS) - 1
+
+
+def position_bit(position: int) -> int:
+    if not 1 <= position <= MAX_POSITIONS:
+        raise ValueError(f"Posición de aireador fuera de rango: {position}")
+    return 1 << (position - 1)
+
+
+def encode_hour(states: Iterable[Dict]) -> Tuple[int, int, int, int]:
+    """
+    Codifica los estados de una hora (formato de get_24h_states) como
+    (silo_mask, on_mask, forced_mask, position_reasons): posiciones con silo,
+    posiciones encendidas, posiciones apagadas a la fuerza y, en un nibble por
+    posición, los motivos de ese apagado.
+    """
+    silo_mask = on_mask = forced_mask = position_reasons = 0
+    for state in states:
+        bit = position_bit(state['position'])
+        silo_mask |= bit
+        if state['is_on']:
+            on_mask |= bit
+        reason = state.get('forced_off_reason')
+        if reason:
+            forced_mask |= bit
+            position_reasons |= FORCED_OFF_REASONS.get(reason, 0) << (REASON_BITS * (state['position'] - 1))
+    return silo_mask, on_mask, forced_mask, position_reasons
+
+
+def decode_reasons(reasons: int) -> List[str]:
+    return [name for name, bit in FORCED_OFF_REASONS.items() if reasons & bit]
+
+
+def position_reasons_of(position_reasons: int, position: int) -> int:
+    """Motivos (bits de FORCED_OFF_REASONS) guardados para una posición"""
+    return (position_reasons >> (REASON_BITS * (position - 1))) & REASON_MASK
+
+
+def decode_hour(silo_mask: int, on_mask: int, forced_mask: int, position_reasons: int,
+                legacy_reasons: int = 0) -> List[Dict]:
+    """
+    Estados por posición a partir de las máscaras guardadas.
+
+    Las filas del formato anterior solo tienen `legacy_reasons`, los motivos de
+    toda la hora; se usan para las posiciones forzadas sin motivo propio.
+    """
+    states = []
+    for position in range(1, MAX_POSITIONS + 1):
+        bit = 1 << (position - 1)
+        if not silo_mask & bit:
+            continue
+        state = {'position': position, 'is_on': bool(on_mask & bit)}
+        if forced_mask & bit:
+            reasons = position_reasons_of(position_reasons, position) or legacy_reasons
+            state['forced_off_reasons'] = decode_reasons(reasons)
+        states.append(state)
+    return states
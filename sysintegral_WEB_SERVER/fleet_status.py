@@ -0,0 +1,35 @@
+import threading
+import time
+from typing import Dict, Optional
+
+
+class FleetStatusCache:
+    """
+    Última foto del estado de la flota (estado de la placa de cada establecimiento,
+    firmware y alertas activas) que usa la barra de navegación de base.html.
+
+    Una tarea en segundo plano la recalcula cada pocos segundos y los renders solo
+    la leen. Si la foto tiene más de `max_age` segundos (la tarea no corre) o se
+    invalidó por un cambio, devuelve None y quien la pide la recalcula.
+    """
+
+    def __init__(self, max_age: float):
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self._snapshot: Optional[Dict] = None
+        self._built_at = 0.0
+
+    def get(self) -> Optional[Dict]:
+        with self.lock:
+            if self._snapshot is None or time.monotonic() - self._built_at > self.max_age:
+                return None
+            return self._snapshot
+
+    def set(self, snapshot: Dict):
+        with self.lock:
+            self._snapshot = snapshot
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        with self.lock:
+            self._snapshot = None
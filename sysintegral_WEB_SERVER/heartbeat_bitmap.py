@@ -0,0 +1,77 @@
+from datetime import date, datetime, timedelta
+from typing import Iterator, List, Tuple
+
+
+# Tres slots de 20 minutos por hora: 0-20, 21-40 y 41-59 (mismos límites que get_slot_name)
+SLOTS_PER_HOUR = 3
+SLOTS_PER_DAY = 24 * SLOTS_PER_HOUR
+# Minuto con el que se representa cada slot en los gráficos
+SLOT_MINUTES = (10, 30, 50)
+
+# Los 72 bits del día se guardan en dos columnas BIGINT de 36 bits cada una
+HALF_DAY_SLOTS = SLOTS_PER_DAY // 2
+HALF_DAY_MASK = (1 << HALF_DAY_SLOTS) - 1
+
+
+def slot_index(dt: datetime) -> int:
+    """Índice del slot (0-71) dentro del día para un datetime local"""
+    if dt.minute <= 20:
+        slot = 0
+    elif dt.minute <= 40:
+        slot = 1
+    else:
+        slot = 2
+    return dt.hour * SLOTS_PER_HOUR + slot
+
+
+def slot_column(index: int) -> Tuple[str, int]:
+    """Columna ('slots_am' o 'slots_pm') y máscara de bit para un índice de slot"""
+    if index < HALF_DAY_SLOTS:
+        return 'slots_am', 1 << index
+    return 'slots_pm', 1 << (index - HALF_DAY_SLOTS)
+
+
+def combine(slots_am: int, slots_pm: int) -> int:
+    """Une las dos mitades en el bitmap de 72 bits del día"""
+    return ((slots_pm or 0) << HALF_DAY_SLOTS) | (slots_am or 0)
+
+
+def split(bitmap: int) -> Tuple[int, int]:
+    """Separa un bitmap de 72 bits en (slots_am, slots_pm)"""
+    return bitmap & HALF_DAY_MASK, bitmap >> HALF_DAY_SLOTS
+
+
+def has_slot(bitmap: int, index: int) -> bool:
+    return bool(bitmap >> index & 1)
+
+
+def count_slots(bitmap: int) -> int:
+    return bitmap.bit_count()
+
+
+def iter_slots(bitmap: int) -> Iterator[int]:
+    """Recorre los índices de los slots presentes, en orden"""
+    while bitmap:
+        low = bitmap & -bitmap
+        yield low.bit_length() - 1
+        bitmap ^= low
+
+
+def slot_time(day: date, index: int) -> datetime:
+    """Datetime (naive, hora local) que representa al slot en los gráficos"""
+    hour, slot = divmod(index, SLOTS_PER_HOUR)
+    return datetime(day.year, day.month, day.day, hour, SLOT_MINUTES[slot])
+
+
+def days_between(start: date, end: date) -> List[date]:
+    """Días del rango [start, end], ambos incluidos"""
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def to_hex(bitmap: int) -> str:
+    """Codificación compacta del día: 18 dígitos hexadecimales (bit 0 = slot 00:00-00:20)"""
+    return format(bitmap, '018x')
+
+
+def from_hex(value: str) -> int:
+    return int(value, 16)
@@ -0,0 +1,46 @@
+import json
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+class LiveCursor:
+    """
+    Posición de un stream de /api/live en la tabla compartida de valores en vivo
+    (live_value), donde cada valor guarda como versión los milisegundos epoch en
+    que cambió.
+
+    La tabla la escriben varios procesos, así que un cambio puede confirmarse
+    después de otro con versión mayor. Por eso cada consulta relee una ventana de
+    `overlap_ms` hacia atrás y se descartan los valores que ya se enviaron con la
+    misma versión. Al reconectarse con Last-Event-ID se puede recibir de nuevo lo
+    último de esa ventana, que es idempotente para el cliente.
+    """
+
+    def __init__(self, version: int = 0, overlap_ms: int = 5000):
+        self.version = version
+        self.overlap_ms = overlap_ms
+        self._sent: Dict[Hashable, int] = {}
+
+    def since(self) -> int:
+        """Versión desde la que hay que consultar la tabla"""
+        return max(self.version - self.overlap_ms, 0)
+
+    def advance(self, rows: Iterable[Tuple[int, Hashable, object]]) -> List[Tuple[int, Hashable, object]]:
+        """Filtra las filas (versión, clave, valor) que todavía no se enviaron y avanza la posición"""
+        changes = []
+        for version, key, value in sorted(rows, key=lambda row: row[0]):
+            if self._sent.get(key) == version:
+                continue
+            self._sent[key] = version
+            self.version = max(self.version, version)
+            changes.append((version, key, value))
+        return changes
+
+
+def format_event(event: str, data, event_id: Optional[int] = None) -> str:
+    """Un mensaje de Server-Sent Events"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
@@ -0,0 +1,157 @@
+from datetime import date, timedelta
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+GALPONES = ('galpon_1', 'galpon_2', 'galpon_3', 'galpon_4')
+FIELDS = GALPONES + ('total',)
+BUCKETS = ('day', 'week', 'month')
+# Ventana por defecto de la media móvil, en cantidad de períodos
+DEFAULT_WINDOW = {'day': 7, 'week': 4, 'month': 3}
+
+# Fila diaria tal como sale de la BD: (fecha, galpon_1, galpon_2, galpon_3, galpon_4, total)
+DailyRow = Tuple
+
+
+def bucket_start(day: date, bucket: str) -> date:
+    """Primer día del período (día, semana ISO que empieza el lunes, o mes) que contiene a `day`"""
+    if bucket == 'day':
+        return day
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    raise ValueError(f"Período desconocido: {bucket}")
+
+
+def next_bucket(start: date, bucket: str) -> date:
+    if bucket == 'day':
+        return start + timedelta(days=1)
+    if bucket == 'week':
+        return start + timedelta(days=7)
+    if start.month == 12:
+        return date(start.year + 1, 1, 1)
+    return date(start.year, start.month + 1, 1)
+
+
+def _sum_rows(rows: Iterable[DailyRow]) -> Dict[int, Dict]:
+    """Suma las filas diarias por período: {índice de período: {'dias': n, campo: suma}}"""
+    result = {}
+    for row in rows:
+        sums = result.setdefault(row[0], {'dias': 0, **{field: 0 for field in FIELDS}})
+        sums['dias'] += 1
+        for field, value in zip(FIELDS, row[1:]):
+            sums[field] += value or 0
+    return result
+
+
+def _moving_average(values: Sequence[Optional[float]], window: int) -> List[Optional[float]]:
+    """Media de los valores presentes en los últimos `window` períodos (None si no hay ninguno)"""
+    result = []
+    for i in range(len(values)):
+        present = [v for v in values[max(0, i - window + 1):i + 1] if v is not None]
+        result.append(round(sum(present) / len(present), 2) if present else None)
+    return result
+
+
+def build_series(egg_rows: Iterable[DailyRow], mortality_rows: Iterable[DailyRow],
+                 start: date, end: date, bucket: str, window: int) -> List[Dict]:
+    """
+    Agrupa los registros diarios de huevos y mortalidad de una granja en períodos
+    del rango [start, end] (todos los períodos, aunque no tengan datos).
+
+    Para cada período y galpón devuelve totales, media móvil de `window` períodos
+    y la relación mortalidad / huevos.
+    """
+    periods = []
+    current = bucket_start(start, bucket)
+    while current <= end:
+        periods.append(current)
+        current = next_bucket(current, bucket)
+    index = {period: i for i, period in enumerate(periods)}
+
+    def by_period(rows):
+        return _sum_rows((index[bucket_start(row[0], bucket)],) + tuple(row[1:]) for row in rows)
+
+    eggs = by_period(egg_rows)
+    deaths = by_period(mortality_rows)
+
+    series = {}
+    for name, sums in (('huevos', eggs), ('mortalidad', deaths)):
+        for field in FIELDS:
+            values = [sums[i][field] if i in sums else None for i in range(len(periods))]
+            series[(name, field)] = (values, _moving_average(values, window))
+
+    result = []
+    for i, period in enumerate(periods):
+        item = {
+            'periodo': period.isoformat(),
+            'desde': max(period, start).isoformat(),
+            'hasta': min(next_bucket(period, bucket) - timedelta(days=1), end).isoformat(),
+            'dias_huevos': eggs[i]['dias'] if i in eggs else 0,
+            'dias_mortalidad': deaths[i]['dias'] if i in deaths else 0
+        }
+        for field in FIELDS:
+            egg_value = series[('huevos', field)][0][i]
+            death_value = series[('mortalidad', field)][0][i]
+            item[field] = {
+                'huevos': egg_value,
+                'huevos_media_movil': series[('huevos', field)][1][i],
+                'mortalidad': death_value,
+                'mortalidad_media_movil': series[('mortalidad', field)][1][i],
+                'mortalidad_por_huevo': round(death_value / egg_value, 6) if egg_value and death_value is not None else None
+            }
+        result.append(item)
+    return result
+
+
+class AnalyticsCache:
+    """
+    Caché en memoria de resultados por (granja, rango, período, ventana).
+
+    Cada granja tiene un número de versión que se incrementa al recibir datos
+    nuevos; las entradas de versiones anteriores dejan de usarse. El `ttl`
+    acota cuánto puede tardar en verse un dato recibido por otro proceso.
+    """
+
+    def __init__(self, ttl: int = 300, max_entries: int = 500):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self._versions: Dict[int, int] = {}
+        self._entries: Dict[Tuple, Tuple[float, int, object]] = {}
+
+    def get(self, granja_id: int, key: Tuple):
+        with self.lock:
+            entry = self._entries.get((granja_id,) + key)
+            if entry is None:
+                return None
+            stored_at, version, value = entry
+            if version != self._versions.get(granja_id, 0) or time.monotonic() - stored_at > self.ttl:
+                del self._entries[(granja_id,) + key]
+                return None
+            return value
+
+    def version(self, granja_id: int) -> int:
+        """Versión actual de una granja; se toma antes de consultar la BD y se pasa a `set`"""
+        with self.lock:
+            return self._versions.get(granja_id, 0)
+
+    def set(self, granja_id: int, key: Tuple, value, version: Optional[int] = None):
+        """
+        Guarda un resultado calculado con los datos de `version`: si la granja se
+        invalidó mientras se calculaba, la entrada nace vencida.
+        """
+        with self.lock:
+            if version is None:
+                version = self._versions.get(granja_id, 0)
+            if len(self._entries) >= self.max_entries:
+                # Se descarta la entrada más antigua
+                oldest = min(self._entries, key=lambda k: self._entries[k][0])
+                del self._entries[oldest]
+            self._entries[(granja_id,) + key] = (time.monotonic(), version, value)
+
+    def invalidate(self, granja_id: int):
+        with self.lock:
+            self._versions[granja_id] = self._versions.get(granja_id, 0) + 1
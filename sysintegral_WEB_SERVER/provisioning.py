@@ -0,0 +1,383 @@
+import csv
+import io
+import json
+import re
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# Tipos de fila de un archivo de alta masiva, en el orden en que se insertan
+ROW_TYPES = ('sensor', 'silo', 'placa', 'barra')
+POSITIONS = range(1, 9)
+BAR_SLOTS = tuple(f'sensor{i}' for i in POSITIONS)
+MAC_PATTERN = re.compile(r'^[0-9A-F]{2}(:[0-9A-F]{2}){5}$')
+TRUE_VALUES = ('1', 'si', 'sí', 'true', 'x')
+FALSE_VALUES = ('0', 'no', 'false', '')
+
+# Silo ya existente en un establecimiento del archivo
+ExistingSilo = namedtuple('ExistingSilo', 'id establishment_id name aerator_position has_bar')
+
+
+class ProvisioningFileError(ValueError):
+    """El archivo no se puede leer como una lista de filas"""
+
+
+def _clean(value):
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+
+def read_csv(content: str) -> List[Tuple[int, Dict]]:
+    """
+    Filas de un CSV con encabezado y una columna `tipo`; cada fila se numera con
+    su línea en el archivo (el encabezado es la 1) para el reporte de errores.
+    """
+    reader = csv.DictReader(io.StringIO(content))
+    if not reader.fieldnames or 'tipo' not in [f.strip() for f in reader.fieldnames]:
+        raise ProvisioningFileError('El CSV debe tener encabezado con una columna "tipo"')
+    rows = []
+    for raw in reader:
+        row = {key.strip(): _clean(value) for key, value in raw.items() if key is not None}
+        if any(value is not None for value in row.values()):
+            rows.append((reader.line_num, row))
+    return rows
+
+
+def read_json(data) -> List[Tuple[int, Dict]]:
+    """Filas de una lista JSON de objetos (o de {"filas": [...]}), numeradas desde 1"""
+    if isinstance(data, dict):
+        data = data.get('filas')
+    if not isinstance(data, list):
+        raise ProvisioningFileError('El JSON debe ser una lista de filas o un objeto con "filas"')
+    rows = []
+    for numero, raw in enumerate(data, start=1):
+        if not isinstance(raw, dict):
+            raise ProvisioningFileError(f'La fila {numero} no es un objeto')
+        rows.append((numero, {str(key): _clean(value) for key, value in raw.items()}))
+    return rows
+
+
+def parse_content(content: str, filename: str = '') -> List[Tuple[int, Dict]]:
+    """Lee un archivo de alta masiva; JSON si la extensión lo indica o si empieza como JSON"""
+    content = content.lstrip('﻿')
+    if filename.lower().endswith('.json') or (not filename.lower().endswith('.csv')
+                                              and content.lstrip()[:1] in ('[', '{')):
+        try:
+            return read_json(json.loads(content))
+        except json.JSONDecodeError as e:
+            raise ProvisioningFileError(f'JSON inválido: {e}') from e
+    return read_csv(content)
+
+
+class ProvisioningPlan:
+    """
+    Un archivo de alta masiva validado: silos, placas, sensores y barras listos
+    para insertar, más los errores de cada fila.
+
+    Se valida en dos pasos. Al construirlo se revisa cada fila por separado
+    (campos obligatorios, tipos, rangos, formato de MAC); después `check` cruza
+    las filas entre sí y con lo que ya existe en la BD (posición única por
+    establecimiento, MAC y número de serie únicos, nombre de barra único, un
+    sensor en una sola barra y una barra por silo). Los conjuntos `macs`,
+    `serials` y `bar_names` dicen qué hay que buscar en la BD para ese segundo paso.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[int, Dict]], default_establishment_id: Optional[int] = None,
+                 max_rows: Optional[int] = None):
+        self.default_establishment_id = default_establishment_id
+        self.errors: Dict[int, Dict] = {}
+        self.sensors: List[Dict] = []
+        self.silos: List[Dict] = []
+        self.boards: List[Dict] = []
+        self.bars: List[Dict] = []
+        self.total_rows = 0
+        for fila, row in rows:
+            self.total_rows += 1
+            if max_rows is not None and self.total_rows > max_rows:
+                raise ProvisioningFileError(f'El archivo supera el máximo de {max_rows} filas')
+            self._parse_row(fila, row)
+
+    # --- Reporte ---
+
+    def error(self, fila: int, tipo, message: str):
+        entry = self.errors.setdefault(fila, {'fila': fila, 'tipo': tipo, 'errores': []})
+        entry['errores'].append(message)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def report(self) -> List[Dict]:
+        """Errores por fila, en el orden del archivo"""
+        return [self.errors[fila] for fila in sorted(self.errors)]
+
+    def counts(self) -> Dict[str, int]:
+        return {'silos': len(self.silos), 'placas': len(self.boards),
+                'sensores': len(self.sensors), 'barras': len(self.bars)}
+
+    # --- Claves a buscar en la BD ---
+
+    @property
+    def establishment_ids(self) -> set:
+        return {item['establishment_id'] for item in self.silos + self.boards + self.bars
+                if item.get('establishment_id') is not None}
+
+    @property
+    def macs(self) -> set:
+        return {board['mac_address'] for board in self.boards}
+
+    @property
+    def serials(self) -> set:
+        """Números de serie de los sensores a crear y de los que usan las barras"""
+        serials = {sensor['numero_serie'] for sensor in self.sensors}
+        for bar in self.bars:
+            serials.update(serial for serial in bar['sensores'] if serial)
+        return serials
+
+    @property
+    def bar_names(self) -> set:
+        return {bar['nombre'] for bar in self.bars}
+
+    # --- Validación de cada fila ---
+
+    def _parse_row(self, fila: int, row: Dict):
+        tipo = row.get('tipo')
+        tipo = tipo.lower() if isinstance(tipo, str) else tipo
+        if tipo not in ROW_TYPES:
+            self.error(fila, tipo, f'Tipo de fila desconocido: {tipo!r} (válidos: {", ".join(ROW_TYPES)})')
+            return
+        errors = []
+        item = getattr(self, f'_parse_{tipo}')(row, errors)
+        if errors:
+            for message in errors:
+                self.error(fila, tipo, message)
+            return
+        item['fila'] = fila
+        item['tipo'] = tipo
+        {'sensor': self.sensors, 'silo': self.silos, 'placa': self.boards, 'barra': self.bars}[tipo].append(item)
+
+    def _establishment(self, row, errors, required=True):
+        value = _default(row.get('establishment_id'), self.default_establishment_id)
+        if value is None:
+            if required:
+                errors.append('Falta establishment_id')
+            return None
+        return _int(value, 'establishment_id', errors)
+
+    def _parse_sensor(self, row, errors):
+        numero_serie = _text(row, 'numero_serie', 255, errors, required=True)
+        descripcion = _text(row, 'descripcion', 100, errors)
+        return {'numero_serie': numero_serie, 'descripcion': descripcion}
+
+    def _parse_silo(self, row, errors):
+        item = {
+            'name': _text(row, 'name', 100, errors, required=True),
+            'establishment_id': self._establishment(row, errors),
+            'aerator_position': _int(row.get('aerator_position'), 'aerator_position', errors),
+            'min_temperature': _float(row.get('min_temperature'), 'min_temperature', errors),
+            'max_temperature': _float(row.get('max_temperature'), 'max_temperature', errors),
+            'min_humidity': _float(row.get('min_humidity'), 'min_humidity', errors),
+            'max_humidity': _float(row.get('max_humidity'), 'max_humidity', errors),
+            'peak_hours_shutdown': _bool(row.get('peak_hours_shutdown'), 'peak_hours_shutdown', errors),
+            'air_start_hour': _int(_default(row.get('air_start_hour'), 22), 'air_start_hour', errors),
+            'air_end_hour': _int(_default(row.get('air_end_hour'), 6), 'air_end_hour', errors),
+        }
+        if item['aerator_position'] is not None and item['aerator_position'] not in POSITIONS:
+            errors.append('aerator_position debe estar entre 1 y 8')
+        for field in ('air_start_hour', 'air_end_hour'):
+            if item[field] is not None and not 0 <= item[field] <= 23:
+                errors.append(f'{field} debe estar entre 0 y 23')
+        if None not in (item['min_temperature'], item['max_temperature']) \
+                and item['min_temperature'] >= item['max_temperature']:
+            errors.append('La temperatura mínima debe ser menor que la máxima')
+        if None not in (item['min_humidity'], item['max_humidity']) \
+                and item['min_humidity'] >= item['max_humidity']:
+            errors.append('La humedad mínima debe ser menor que la máxima')
+        return item
+
+    def _parse_placa(self, row, errors):
+        mac = row.get('mac_address')
+        mac = str(mac).upper() if mac is not None else None
+        if mac is None:
+            errors.append('Falta mac_address')
+        elif not MAC_PATTERN.match(mac):
+            errors.append(f'Formato de dirección MAC inválido: {mac} (XX:XX:XX:XX:XX:XX)')
+        return {'mac_address': mac, 'establishment_id': self._establishment(row, errors)}
+
+    def _parse_barra(self, row, errors):
+        sensores = [_text(row, slot, 255, errors) for slot in BAR_SLOTS]
+        item = {
+            'nombre': _text(row, 'nombre', 100, errors, required=True),
+            'silo': _text(row, 'silo', 100, errors),
+            'sensores': sensores,
+        }
+        # Sin silo el establecimiento es opcional, como en el alta individual
+        item['establishment_id'] = self._establishment(row, errors, required=item['silo'] is not None)
+        assigned = [serial for serial in sensores if serial]
+        if not assigned:
+            errors.append('Debe asignar al menos un sensor a la barra')
+        elif len(assigned) != len(set(assigned)):
+            errors.append('No puede asignar el mismo sensor a varias posiciones de la barra')
+        return item
+
+    # --- Validación contra el resto del archivo y la BD ---
+
+    def check(self, establishment_ids: Iterable[int], existing_silos: Iterable[ExistingSilo],
+              existing_macs: Iterable[str], existing_serials: Dict[str, int], existing_bar_names: Iterable[str],
+              assigned_sensor_ids: Iterable[int]):
+        """
+        Cruza las filas válidas entre sí y con la BD. `existing_silos` son los
+        silos de los establecimientos del archivo, `existing_serials` el id de cada
+        número de serie de `serials` que ya existe y `assigned_sensor_ids` los
+        sensores que ya están en alguna barra. Ante un duplicado dentro del archivo
+        vale la primera fila y el error va en las siguientes.
+        """
+        establishment_ids = set(establishment_ids)
+        existing_silos = list(existing_silos)
+        existing_macs = set(existing_macs)
+        existing_bar_names = set(existing_bar_names)
+        assigned_sensor_ids = set(assigned_sensor_ids)
+
+        for item in self.silos + self.boards + self.bars:
+            if item['establishment_id'] is not None and item['establishment_id'] not in establishment_ids:
+                self.error(item['fila'], item['tipo'], f'No existe el establecimiento {item["establishment_id"]}')
+
+        used_positions = {(silo.establishment_id, silo.aerator_position) for silo in existing_silos}
+        positions = {}
+        for silo in self.silos:
+            key = (silo['establishment_id'], silo['aerator_position'])
+            if key in used_positions:
+                self.error(silo['fila'], 'silo', f'La posición {key[1]} ya está ocupada en el establecimiento {key[0]}')
+            elif key in positions:
+                self.error(silo['fila'], 'silo', f'La posición {key[1]} ya se usa en la fila {positions[key]}')
+            else:
+                positions[key] = silo['fila']
+
+        self._check_unique(self.boards, 'mac_address', existing_macs, 'placa', 'La dirección MAC {} ya está registrada')
+        self._check_unique(self.sensors, 'numero_serie', existing_serials, 'sensor',
+                           'Ya existe un sensor con el número de serie {}')
+        self._check_unique(self.bars, 'nombre', existing_bar_names, 'barra', 'Ya existe una barra llamada {}')
+
+        new_serials = {sensor['numero_serie'] for sensor in self.sensors}
+        sensor_bars, silo_bars = {}, {}
+        for bar in self.bars:
+            for serial in filter(None, bar['sensores']):
+                if serial not in new_serials and serial not in existing_serials:
+                    self.error(bar['fila'], 'barra', f'No existe el sensor {serial}')
+                elif existing_serials.get(serial) in assigned_sensor_ids:
+                    self.error(bar['fila'], 'barra', f'El sensor {serial} ya está asignado a otra barra')
+                elif serial in sensor_bars:
+                    self.error(bar['fila'], 'barra', f'El sensor {serial} ya está en la barra de la fila {sensor_bars[serial]}')
+                else:
+                    sensor_bars[serial] = bar['fila']
+
+            bar['silo_id'] = bar['silo_position'] = None
+            if bar['silo'] is None:
+                continue
+            target = self._resolve_silo(bar, existing_silos)
+            if target is None:
+                continue
+            if target in silo_bars:
+                self.error(bar['fila'], 'barra', f'El silo {bar["silo"]} ya recibe la barra de la fila {silo_bars[target]}')
+            else:
+                silo_bars[target] = bar['fila']
+
+    def _check_unique(self, items, field, existing, tipo, message):
+        seen = {}
+        for item in items:
+            value = item[field]
+            if value in existing:
+                self.error(item['fila'], tipo, message.format(value))
+            elif value in seen:
+                self.error(item['fila'], tipo, f'{field} {value} repetido (fila {seen[value]})')
+            else:
+                seen[value] = item['fila']
+
+    def _resolve_silo(self, bar, existing_silos):
+        """
+        Silo (por nombre, dentro del establecimiento de la barra) al que va la
+        barra: anota silo_id si ya existe o silo_position si se crea en este mismo
+        archivo. Devuelve una clave del silo, o None si hubo error.
+        """
+        establishment_id = bar['establishment_id']
+        new = [silo for silo in self.silos
+               if silo['establishment_id'] == establishment_id and silo['name'] == bar['silo']]
+        existing = [silo for silo in existing_silos
+                    if silo.establishment_id == establishment_id and silo.name == bar['silo']]
+        if not new and not existing:
+            self.error(bar['fila'], 'barra', f'No existe el silo {bar["silo"]} en el establecimiento {establishment_id}')
+            return None
+        if len(new) + len(existing) > 1:
+            self.error(bar['fila'], 'barra', f'Hay más de un silo llamado {bar["silo"]} en el establecimiento {establishment_id}')
+            return None
+        if existing:
+            if existing[0].has_bar:
+                self.error(bar['fila'], 'barra', f'El silo {bar["silo"]} ya tiene una barra asignada')
+                return None
+            bar['silo_id'] = existing[0].id
+            return ('id', existing[0].id)
+        bar['silo_position'] = new[0]['aerator_position']
+        return ('posicion', establishment_id, new[0]['aerator_position'])
+
+
+def _default(value, default):
+    """Las columnas vacías de un CSV llegan como None: toman el valor por defecto"""
+    return default if value is None else value
+
+
+def _text(row, field, max_length, errors, required=False):
+    value = row.get(field)
+    if value is None:
+        if required:
+            errors.append(f'Falta {field}')
+        return None
+    value = str(value)
+    if len(value) > max_length:
+        errors.append(f'{field} supera los {max_length} caracteres')
+    return value
+
+
+def _int(value, field, errors):
+    if value is None:
+        errors.append(f'Falta {field}')
+        return None
+    if isinstance(value, bool):
+        errors.append(f'{field} debe ser un número entero')
+        return None
+    try:
+        if isinstance(value, float):
+            if not value.is_integer():
+                raise ValueError
+            return int(value)
+        return int(str(value))
+    except ValueError:
+        errors.append(f'{field} debe ser un número entero')
+        return None
+
+
+def _float(value, field, errors):
+    if value is None:
+        errors.append(f'Falta {field}')
+        return None
+    if isinstance(value, bool):
+        errors.append(f'{field} debe ser un número')
+        return None
+    try:
+        return float(str(value).replace(',', '.'))
+    except ValueError:
+        errors.append(f'{field} debe ser un número')
+        return None
+
+
+def _bool(value, field, errors):
+    if value is None or isinstance(value, bool):
+        return bool(value)
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    errors.append(f'{field} debe ser si/no')
+    return False
@@ -0,0 +1,202 @@
+import math
+import threading
+from typing import Dict, Iterable, List, Optional
+
+
+class SensorState:
+    """
+    Estadísticas de un sensor actualizadas lectura a lectura (O(1)):
+    media y varianza con ponderación exponencial según el tiempo transcurrido
+    (vida media `halflife` segundos) y velocidad de cambio de la media en °C/hora.
+    """
+
+    __slots__ = ('mean', 'var', 'rate', 'last_value', 'last_ts', 'count')
+
+    def __init__(self, mean=None, var=0.0, rate=0.0, last_value=None, last_ts=None, count=0):
+        self.mean = mean
+        self.var = var
+        self.rate = rate
+        self.last_value = last_value
+        self.last_ts = last_ts
+        self.count = count
+
+    def update(self, ts: int, value: float, halflife: float) -> bool:
+        """Incorpora una lectura; devuelve False si llegó fuera de orden y se ignoró"""
+        if self.last_ts is not None and ts <= self.last_ts:
+            return False
+        if self.mean is None:
+            self.mean = value
+        else:
+            dt = ts - self.last_ts
+            alpha = 1 - 0.5 ** (dt / halflife)
+            diff = value - self.mean
+            increment = alpha * diff
+            self.mean += increment
+            self.var = (1 - alpha) * (self.var + diff * increment)
+            slope = increment / (dt / 3600.0)
+            self.rate += alpha * (slope - self.rate)
+        self.last_value = value
+        self.last_ts = ts
+        self.count += 1
+        return True
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(max(self.var, 0.0))
+
+
+class BarLayout:
+    """Posiciones (1-8) de los sensores de una barra y el silo al que está asignada"""
+
+    __slots__ = ('barra_id', 'silo_id', 'silo_name', 'establishment_id', 'positions')
+
+    def __init__(self, barra_id, silo_id, silo_name, establishment_id, sensor_ids: List[Optional[int]]):
+        self.barra_id = barra_id
+        self.silo_id = silo_id
+        self.silo_name = silo_name
+        self.establishment_id = establishment_id
+        self.positions = {pos: sensor_id for pos, sensor_id in enumerate(sensor_ids, start=1) if sensor_id}
+
+
+class SensorStatsRegistry:
+    """
+    Estado en memoria de las estadísticas de todos los sensores y de las alertas
+    por barra (punto caliente, tendencia en aumento y gradiente vertical).
+
+    Cada lectura actualiza su sensor y reevalúa solo su barra (hasta 8 sensores),
+    así que la consulta de silos con anomalías no recorre ninguna tabla. Con varios
+    procesos cada uno mantiene su propio estado a partir de las lecturas que recibe
+    y los estados se combinan a través del checkpoint (ver `restore`).
+    """
+
+    def __init__(self, halflife: float = 6 * 3600, hotspot_delta: float = 3.0,
+                 rising_rate_per_day: float = 1.0, gradient_delta: float = 5.0, max_age: int = 86400):
+        self.halflife = halflife
+        self.hotspot_delta = hotspot_delta
+        self.rising_rate_per_day = rising_rate_per_day
+        self.gradient_delta = gradient_delta
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.sensors: Dict[int, SensorState] = {}
+        self.bars: Dict[int, BarLayout] = {}
+        self._bar_of_sensor: Dict[int, int] = {}
+        self.alerts: Dict[int, List[Dict]] = {}  # barra_id -> alertas vigentes
+        self._dirty = set()
+
+    def set_layout(self, bars: Iterable[BarLayout]):
+        """Reemplaza la disposición de barras/sensores y reevalúa todas las alertas"""
+        with self.lock:
+            self.bars = {bar.barra_id: bar for bar in bars}
+            self._bar_of_sensor = {
+                sensor_id: bar.barra_id for bar in self.bars.values() for sensor_id in bar.positions.values()
+            }
+            self.alerts = {}
+            for barra_id in self.bars:
+                self._evaluate_bar(barra_id)
+
+    def update(self, sensor_id: int, ts: int, value: float):
+        with self.lock:
+            state = self.sensors.get(sensor_id)
+            if state is None:
+                state = self.sensors[sensor_id] = SensorState()
+            if not state.update(ts, value, self.halflife):
+                return
+            self._dirty.add(sensor_id)
+            barra_id = self._bar_of_sensor.get(sensor_id)
+            if barra_id is not None:
+                self._evaluate_bar(barra_id, now=ts)
+
+    def _evaluate_bar(self, barra_id: int, now: Optional[int] = None):
+        bar = self.bars[barra_id]
+        active = {}
+        for position, sensor_id in bar.positions.items():
+            state = self.sensors.get(sensor_id)
+            if state is None or state.mean is None:
+                continue
+            active[position] = (sensor_id, state)
+        if now is None and active:
+            now = max(state.last_ts for _, state in active.values())
+        active = {pos: item for pos, item in active.items() if now - item[1].last_ts <= self.max_age}
+
+        alerts = []
+        total = sum(state.mean for _, state in active.values())
+        for position, (sensor_id, state) in sorted(active.items()):
+            if len(active) > 1:
+                others = (total - state.mean) / (len(active) - 1)
+                if state.mean - others > self.hotspot_delta:
+                    alerts.append({'tipo': 'punto_caliente', 'posicion': position, 'sensor_id': sensor_id,
+                                   'temperatura': round(state.mean, 2), 'diferencia': round(state.mean - others, 2)})
+            rate_per_day = state.rate * 24
+            if rate_per_day > self.rising_rate_per_day:
+                alerts.append({'tipo': 'tendencia', 'posicion': position, 'sensor_id': sensor_id,
+                               'temperatura': round(state.mean, 2), 'grados_por_dia': round(rate_per_day, 2)})
+
+        positions = sorted(active)
+        for lower, upper in zip(positions, positions[1:]):
+            difference = active[upper][1].mean - active[lower][1].mean
+            if abs(difference) > self.gradient_delta * (upper - lower):
+                alerts.append({'tipo': 'gradiente', 'posiciones': [lower, upper],
+                               'diferencia': round(difference, 2)})
+
+        if alerts:
+            self.alerts[barra_id] = alerts
+        else:
+            self.alerts.pop(barra_id, None)
+
+    def anomalies(self, establishment_ids: Optional[set] = None) -> List[Dict]:
+        """Silos con alertas vigentes (opcionalmente solo de ciertos establecimientos)"""
+        with self.lock:
+            result = []
+            for barra_id, alerts in self.alerts.items():
+                bar = self.bars[barra_id]
+                if bar.silo_id is None:
+                    continue
+                if establishment_ids is not None and bar.establishment_id not in establishment_ids:
+                    continue
+                result.append({
+                    'silo_id': bar.silo_id,
+                    'silo_nombre': bar.silo_name,
+                    'establecimiento_id': bar.establishment_id,
+                    'barra_id': barra_id,
+                    'alertas': list(alerts)
+                })
+            return sorted(result, key=lambda item: item['silo_id'])
+
+    def sensor_summary(self, sensor_id: int) -> Optional[Dict]:
+        with self.lock:
+            state = self.sensors.get(sensor_id)
+            if state is None or state.mean is None:
+                return None
+            return {
+                'media': round(state.mean, 3),
+                'desvio': round(state.std, 3),
+                'grados_por_dia': round(state.rate * 24, 3),
+                'ultima_temperatura': state.last_value,
+                'ultima_lectura_ts': state.last_ts,
+                'lecturas': state.count
+            }
+
+    def take_dirty(self) -> Dict[int, SensorState]:
+        """Copia de los sensores modificados desde el último checkpoint"""
+        with self.lock:
+            dirty = {
+                sensor_id: SensorState(s.mean, s.var, s.rate, s.last_value, s.last_ts, s.count)
+                for sensor_id, s in ((sid, self.sensors[sid]) for sid in self._dirty)
+            }
+            self._dirty.clear()
+            return dirty
+
+    def mark_dirty(self, sensor_ids: Iterable[int]):
+        """Vuelve a marcar sensores cuyo checkpoint falló"""
+        with self.lock:
+            self._dirty.update(sensor_ids)
+
+    def restore(self, states: Dict[int, SensorState]):
+        """Carga el estado desde un checkpoint (sin pisar sensores con datos más nuevos)"""
+        with self.lock:
+            for sensor_id, state in states.items():
+                current = self.sensors.get(sensor_id)
+                if current is None or (current.last_ts or 0) < (state.last_ts or 0):
+                    self.sensors[sensor_id] = state
+            for barra_id in self.bars:
+                self._evaluate_bar(barra_id)
@@ -0,0 +1,71 @@
+from collections import deque
+import threading
+from typing import Dict, Iterable, List
+
+from flask import g, has_app_context
+
+
+# Claves en flask.g de los registros pendientes del request actual: los que se
+# insertan en el commit y los que se encolan para el escritor después del commit
+_PENDING_KEY = 'silo_audit_pending'
+_QUEUED_KEY = 'silo_audit_queued'
+
+
+def add_pending(entry: Dict, queued: bool = False):
+    """Agrega un registro a la unidad de trabajo del contexto actual"""
+    if not has_app_context():
+        raise RuntimeError("La auditoría de silos requiere un contexto de aplicación")
+    g.setdefault(_QUEUED_KEY if queued else _PENDING_KEY, []).append(entry)
+
+
+def take_pending(queued: bool = False) -> List[Dict]:
+    """Saca los registros pendientes del contexto actual (lista vacía si no hay)"""
+    if not has_app_context():
+        return []
+    return g.pop(_QUEUED_KEY if queued else _PENDING_KEY, None) or []
+
+
+class AuditQueue:
+    """
+    Cola en memoria de registros de auditoría para escritura asíncrona.
+
+    Los cambios masivos encolan sus registros (recién cuando se confirma la
+    transacción del cambio) y un hilo en segundo plano los inserta en lotes. Si la cola supera `max_size` se descartan los más viejos
+    (y se cuentan), para no crecer sin límite si la BD no responde. Los registros
+    encolados se pierden si el proceso termina antes de escribirlos.
+    """
+
+    def __init__(self, max_size: int = 100000):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self._rows = deque()
+        self.written = 0
+        self.dropped = 0
+
+    def put(self, rows: Iterable[Dict]):
+        with self.lock:
+            self._rows.extend(rows)
+            while len(self._rows) > self.max_size:
+                self._rows.popleft()
+                self.dropped += 1
+
+    def take(self, max_rows: int) -> List[Dict]:
+        with self.lock:
+            return [self._rows.popleft() for _ in range(min(max_rows, len(self._rows)))]
+
+    def requeue(self, rows: List[Dict]):
+        """Devuelve al frente de la cola un lote que no se pudo escribir"""
+        with self.lock:
+            self._rows.extendleft(reversed(rows))
+
+    def mark_written(self, count: int):
+        with self.lock:
+            self.written += count
+
+    def __len__(self):
+        with self.lock:
+            return len(self._rows)
+
+    def status(self) -> Dict:
+        with self.lock:
+            return {'pending': len(self._rows), 'written': self.written, 'dropped': self.dropped}
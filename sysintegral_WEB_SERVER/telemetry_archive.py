@@ -0,0 +1,190 @@
+from datetime import datetime
+import gzip
+import heapq
+import json
+import logging
+import os
+import threading
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class TelemetryArchive:
+    """
+    Archivo frío de telemetría en disco.
+
+    Los registros se guardan en archivos NDJSON comprimidos con gzip, separados por
+    tabla, mes y establecimiento:
+
+        <base_dir>/<tabla>/<YYYY-MM>/est_<id>/part-<primer_id>-<ultimo_id>.ndjson.gz
+
+    El archivo manifest.json lista todas las partes escritas y, mientras un bloque
+    se está archivando, el bloque pendiente (rango de IDs y fecha de corte). Eso
+    permite retomar el proceso si se interrumpe entre la escritura del archivo y
+    el borrado de las filas en la base de datos.
+    """
+
+    MANIFEST_VERSION = 1
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+        self.lock = threading.Lock()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.base_dir, 'manifest.json')
+
+    def load_manifest(self) -> Dict:
+        """Lee el manifiesto (o devuelve uno vacío si todavía no existe)"""
+        if not os.path.exists(self.manifest_path):
+            return {'version': self.MANIFEST_VERSION, 'parts': [], 'pending': None}
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_manifest(self, manifest: Dict):
+        """Escribe el manifiesto de forma atómica (archivo temporal + rename)"""
+        os.makedirs(self.base_dir, exist_ok=True)
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def get_pending(self) -> Optional[Dict]:
+        """Devuelve el bloque que quedó a medio archivar, si existe"""
+        with self.lock:
+            return self.load_manifest().get('pending')
+
+    def write_part(self, table: str, month: str, establishment_id: Optional[int], rows: List[Dict]) -> Dict:
+        """
+        Escribe un archivo de parte con las filas indicadas y devuelve su entrada
+        de manifiesto. Las filas deben traer 'id' y 'timestamp' (ISO 8601).
+        El nombre del archivo depende del rango de IDs, por lo que reescribir el
+        mismo bloque tras una caída produce el mismo archivo.
+        """
+        est_dir = f"est_{establishment_id}" if establishment_id is not None else 'est_none'
+        first_id = rows[0]['id']
+        last_id = rows[-1]['id']
+        relative_path = os.path.join(table, month, est_dir, f"part-{first_id}-{last_id}.ndjson.gz")
+        full_path = os.path.join(self.base_dir, relative_path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+        tmp_path = full_path + '.tmp'
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row, separators=(',', ':')))
+                f.write('\n')
+        os.replace(tmp_path, full_path)
+
+        return {
+            'table': table,
+            'month': month,
+            'establishment_id': establishment_id,
+            'file': relative_path,
+            'rows': len(rows),
+            'first_id': first_id,
+            'last_id': last_id,
+            'min_timestamp': min(r['timestamp'] for r in rows),
+            'max_timestamp': max(r['timestamp'] for r in rows)
+        }
+
+    def begin_chunk(self, table: str, parts: List[Dict], min_id: int, max_id: int, cutoff: datetime):
+        """Registra las partes escritas y marca el bloque como pendiente de borrado en la BD"""
+        with self.lock:
+            manifest = self.load_manifest()
+            written = {p['file'] for p in parts}
+            manifest['parts'] = [p for p in manifest['parts'] if p['file'] not in written] + parts
+            manifest['pending'] = {
+                'table': table,
+                'min_id': min_id,
+                'max_id': max_id,
+                'cutoff': cutoff.isoformat()
+            }
+            self._save_manifest(manifest)
+
+    def complete_chunk(self):
+        """Limpia la marca de bloque pendiente una vez borradas las filas de la BD"""
+        with self.lock:
+            manifest = self.load_manifest()
+            manifest['pending'] = None
+            manifest['updated_at'] = datetime.now().isoformat()
+            self._save_manifest(manifest)
+
+    def _selected_parts(self, table: str, start_iso: Optional[str], end_iso: Optional[str],
+                        establishment_id: Optional[int]) -> List[Dict]:
+        """Partes de la tabla cuyo rango de fechas (y establecimiento, si se indica) se solapa con la consulta"""
+        with self.lock:
+            parts = [p for p in self.load_manifest()['parts'] if p['table'] == table]
+        return [
+            part for part in parts
+            if (establishment_id is None or part['establishment_id'] == establishment_id)
+            and not (start_iso and part['max_timestamp'] < start_iso)
+            and not (end_iso and part['min_timestamp'] > end_iso)
+        ]
+
+    def _iter_part(self, part: Dict, start_iso: Optional[str], end_iso: Optional[str],
+                   predicate: Optional[Callable[[Dict], bool]]) -> Iterator[Dict]:
+        """Filas de una parte dentro del rango, con 'timestamp' todavía en ISO 8601"""
+        full_path = os.path.join(self.base_dir, part['file'])
+        if not os.path.exists(full_path):
+            logger.warning("Parte de archivo no encontrada: %s", full_path)
+            return
+        with gzip.open(full_path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                row = json.loads(line)
+                if start_iso and row['timestamp'] < start_iso:
+                    continue
+                if end_iso and row['timestamp'] > end_iso:
+                    continue
+                if predicate and not predicate(row):
+                    continue
+                yield row
+
+    def iter_rows(self, table: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                  establishment_id: Optional[int] = None,
+                  predicate: Optional[Callable[[Dict], bool]] = None) -> Iterator[Dict]:
+        """
+        Recorre las filas archivadas de una tabla dentro del rango [start, end], en
+        el orden de las partes. Solo se abren las partes que se solapan con la
+        consulta. El campo 'timestamp' se devuelve como datetime.
+        """
+        start_iso = start.isoformat() if start else None
+        end_iso = end.isoformat() if end else None
+        for part in self._selected_parts(table, start_iso, end_iso, establishment_id):
+            for row in self._iter_part(part, start_iso, end_iso, predicate):
+                row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+                yield row
+
+    def iter_rows_ordered(self, table: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                          establishment_id: Optional[int] = None,
+                          predicate: Optional[Callable[[Dict], bool]] = None) -> Iterator[Dict]:
+        """
+        Igual que iter_rows pero ordenado por timestamp, sin cargar todo el rango.
+
+        Cada parte se ordena por separado (está ordenada por ID, casi siempre
+        también por fecha) y se mezcla con las demás; una parte recién se abre
+        cuando la mezcla llega a su fecha mínima, así que en memoria solo están
+        las partes que se solapan en el tiempo.
+        """
+        start_iso = start.isoformat() if start else None
+        end_iso = end.isoformat() if end else None
+        parts = sorted(self._selected_parts(table, start_iso, end_iso, establishment_id),
+                       key=lambda p: p['min_timestamp'])
+
+        heap = []  # (timestamp ISO, orden de la parte, fila, resto de la parte)
+        next_part = 0
+        while heap or next_part < len(parts):
+            while next_part < len(parts) and (not heap or parts[next_part]['min_timestamp'] <= heap[0][0]):
+                rows = iter(sorted(self._iter_part(parts[next_part], start_iso, end_iso, predicate),
+                                   key=lambda r: r['timestamp']))
+                row = next(rows, None)
+                if row is not None:
+                    heapq.heappush(heap, (row['timestamp'], next_part, row, rows))
+                next_part += 1
+            if not heap:
+                continue
+            _, order, row, rows = heapq.heappop(heap)
+            following = next(rows, None)
+            if following is not None:
+                heapq.heappush(heap, (following['timestamp'], order, following, rows))
+            row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+            yield row
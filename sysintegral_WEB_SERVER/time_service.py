@@ -0,0 +1,115 @@
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+import threading
+from typing import Optional, Tuple
+
+import pytz
+
+
+LOCAL_TZ_NAME = 'America/Argentina/Buenos_Aires'
+
+
+@lru_cache(maxsize=None)
+def get_zone(name: str):
+    """Zona horaria de pytz, creada una sola vez por nombre"""
+    return pytz.timezone(name)
+
+
+LOCAL_TZ = get_zone(LOCAL_TZ_NAME)
+UTC = pytz.UTC
+
+
+class Clock:
+    """
+    Reloj de la aplicación. Por defecto devuelve la hora del sistema; se puede
+    congelar en un instante (y adelantar a mano) para benchmarks y pruebas
+    deterministas.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._frozen: Optional[datetime] = None
+
+    def now(self) -> datetime:
+        """Hora actual en UTC (aware)"""
+        with self.lock:
+            if self._frozen is not None:
+                return self._frozen
+        return datetime.now(UTC)
+
+    def freeze(self, when: Optional[datetime] = None):
+        """Congela el reloj en `when` (naive = hora local) o en la hora actual"""
+        when = datetime.now(UTC) if when is None else to_utc(when)
+        with self.lock:
+            self._frozen = when
+
+    def advance(self, seconds: float):
+        """Adelanta un reloj congelado"""
+        with self.lock:
+            if self._frozen is None:
+                raise RuntimeError("El reloj no está congelado")
+            self._frozen += timedelta(seconds=seconds)
+
+    def unfreeze(self):
+        with self.lock:
+            self._frozen = None
+
+    @contextmanager
+    def frozen(self, when: Optional[datetime] = None):
+        self.freeze(when)
+        try:
+            yield self
+        finally:
+            self.unfreeze()
+
+
+clock = Clock()
+
+
+def now_utc() -> datetime:
+    return clock.now()
+
+
+def now_local() -> datetime:
+    """Hora actual de Argentina (aware)"""
+    return clock.now().astimezone(LOCAL_TZ)
+
+
+def now_naive() -> datetime:
+    """Hora actual de Argentina sin zona horaria, el formato en que se guarda en la BD"""
+    return now_local().replace(tzinfo=None)
+
+
+def today() -> date:
+    return now_local().date()
+
+
+def localize(dt: datetime) -> datetime:
+    """
+    Devuelve `dt` con zona horaria de Argentina. Los datetime naive (como los que
+    vienen de la BD) se interpretan como hora local; los aware se convierten.
+    """
+    if dt.tzinfo is None:
+        return LOCAL_TZ.localize(dt)
+    return dt.astimezone(LOCAL_TZ)
+
+
+def to_utc(dt: datetime) -> datetime:
+    return localize(dt).astimezone(UTC)
+
+
+def to_storage(dt: datetime) -> datetime:
+    """Convierte un datetime al formato de la BD (naive, hora local)"""
+    return localize(dt).replace(tzinfo=None)
+
+
+def hour_bucket(dt: datetime) -> datetime:
+    """Inicio de la hora que contiene a `dt` (conserva la zona horaria, si tiene)"""
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def day_bounds(day: date) -> Tuple[datetime, datetime]:
+    """Inicio y fin (naive, hora local) de un día, para filtrar columnas DateTime"""
+    start = datetime(day.year, day.month, day.day)
+    return start, start + timedelta(days=1) - timedelta(microseconds=1)
@@ -0,0 +1,229 @@
+from bisect import bisect_right
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Un punto de la serie: (segundos epoch, valor)
+Point = Tuple[int, float]
+# Una muestra a guardar: (segundos epoch, valor, payload crudo o None)
+Sample = Tuple[int, float, Any]
+
+
+class DeadbandCompressor:
+    """
+    Compresión por banda muerta: se guarda un punto solo si se aleja más de
+    `tolerance` del último punto guardado, o si pasaron `max_interval` segundos
+    desde él. La serie se reconstruye con interpolación escalonada.
+    """
+
+    def __init__(self, tolerance: float, max_interval: int):
+        self.tolerance = tolerance
+        self.max_interval = max_interval
+        self.last: Optional[Point] = None
+
+    def add(self, t: int, value: float, payload: Any = None) -> List[Sample]:
+        if self.last is not None and t <= self.last[0]:
+            # Lectura fuera de orden: se guarda tal cual sin tocar el estado
+            return [(t, value, payload)]
+        if (self.last is None
+                or abs(value - self.last[1]) > self.tolerance
+                or t - self.last[0] >= self.max_interval):
+            self.last = (t, value)
+            return [(t, value, payload)]
+        return []
+
+    @property
+    def held_since(self) -> Optional[int]:
+        return None  # no retiene muestras: cada una se guarda o se descarta al llegar
+
+    def flush(self) -> List[Sample]:
+        return []
+
+
+class SwingingDoorCompressor:
+    """
+    Compresión swinging door (SDT): a partir del último punto guardado se abren dos
+    "puertas" a +/- `tolerance`. Mientras exista una recta desde ese punto que pase
+    a menos de `tolerance` de todas las muestras recibidas, no se guarda nada.
+    Cuando las puertas se cruzan se guarda la muestra anterior y se reinicia desde
+    ella. La serie se reconstruye con interpolación lineal entre puntos guardados.
+    """
+
+    def __init__(self, tolerance: float, max_interval: int):
+        self.tolerance = tolerance
+        self.max_interval = max_interval
+        self.archived: Optional[Point] = None  # último punto guardado
+        self.held: Optional[Sample] = None     # última muestra recibida (con su payload), todavía sin guardar
+        self.slope_upper = float('inf')
+        self.slope_lower = float('-inf')
+
+    def _open_doors(self, origin, t: int, value: float):
+        dt = t - origin[0]
+        self.slope_upper = (value + self.tolerance - origin[1]) / dt
+        self.slope_lower = (value - self.tolerance - origin[1]) / dt
+
+    def add(self, t: int, value: float, payload: Any = None) -> List[Sample]:
+        last_t = self.held[0] if self.held else (self.archived[0] if self.archived else None)
+        if last_t is not None and t <= last_t:
+            return [(t, value, payload)]
+
+        if self.archived is None:
+            self.archived = (t, value)
+            return [(t, value, payload)]
+
+        if self.held is None:
+            if t - self.archived[0] >= self.max_interval:
+                self.archived = (t, value)
+                return [(t, value, payload)]
+            self._open_doors(self.archived, t, value)
+            self.held = (t, value, payload)
+            return []
+
+        dt = t - self.archived[0]
+        upper = min(self.slope_upper, (value + self.tolerance - self.archived[1]) / dt)
+        lower = max(self.slope_lower, (value - self.tolerance - self.archived[1]) / dt)
+
+        if lower > upper or dt >= self.max_interval:
+            emitted = self.held
+            self.archived = emitted[:2]
+            self._open_doors(emitted, t, value)
+            self.held = (t, value, payload)
+            return [emitted]
+
+        self.slope_upper, self.slope_lower = upper, lower
+        self.held = (t, value, payload)
+        return []
+
+    @property
+    def held_since(self) -> Optional[int]:
+        """Instante de la muestra retenida (None si no hay)"""
+        return self.held[0] if self.held else None
+
+    def flush(self) -> List[Sample]:
+        """Devuelve la muestra retenida (para guardarla antes de descartar el estado)"""
+        if self.held is None:
+            return []
+        emitted = self.held
+        self.archived, self.held = emitted[:2], None
+        self.slope_upper, self.slope_lower = float('inf'), float('-inf')
+        return [emitted]
+
+
+ALGORITHMS = {
+    'deadband': DeadbandCompressor,
+    'swinging_door': SwingingDoorCompressor
+}
+
+# Interpolación que reconstruye la serie dentro de la tolerancia para cada algoritmo
+RECONSTRUCTION = {
+    'none': 'linear',
+    'deadband': 'step',
+    'swinging_door': 'linear'
+}
+
+
+class CompressionRegistry:
+    """
+    Estado de compresión por sensor, en memoria del proceso.
+
+    Supone que todas las lecturas de un sensor pasan por el mismo proceso. Con
+    varios workers cada uno vería un subconjunto intercalado de las muestras: con
+    deadband solo se guardan puntos de más, pero con swinging door las rectas de
+    cada worker no cubren las muestras que vio el otro y la serie reconstruida
+    puede salirse de la tolerancia. Por eso la compresión requiere un único
+    proceso recibiendo /api/temperature_reading.
+
+    Swinging door retiene la última muestra hasta saber si hace falta guardarla:
+    `flush` devuelve las retenidas (todas, o las que llevan más de `max_age`
+    segundos esperando) para que se guarden aunque el sensor deje de reportar.
+    """
+
+    def __init__(self, algorithm: str = 'none', tolerance: float = 0.2, max_interval: int = 900):
+        if algorithm != 'none' and algorithm not in ALGORITHMS:
+            raise ValueError(f"Algoritmo de compresión desconocido: {algorithm}")
+        self.algorithm = algorithm
+        self.tolerance = tolerance
+        self.max_interval = max_interval
+        self.lock = threading.Lock()
+        self._compressors: Dict[int, object] = {}
+        # Hora de llegada (monotónica) de la muestra retenida de cada sensor
+        self._held_at: Dict[int, float] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.algorithm != 'none'
+
+    def add(self, sensor_id: int, t: int, value: float, payload: Any = None) -> List[Sample]:
+        """Procesa una muestra y devuelve las muestras (con su payload) que hay que guardar"""
+        if not self.enabled:
+            return [(t, value, payload)]
+        with self.lock:
+            compressor = self._compressors.get(sensor_id)
+            if compressor is None:
+                compressor = ALGORITHMS[self.algorithm](self.tolerance, self.max_interval)
+                self._compressors[sensor_id] = compressor
+            emitted = compressor.add(t, value, payload)
+            if compressor.held_since is None:
+                self._held_at.pop(sensor_id, None)
+            else:
+                self._held_at[sensor_id] = time.monotonic()
+            return emitted
+
+    def flush(self, max_age: Optional[float] = None) -> List[Tuple[int, Sample]]:
+        """
+        Libera las muestras retenidas (las que esperan hace más de `max_age`
+        segundos, o todas) y devuelve [(sensor_id, muestra)] para guardarlas.
+        """
+        now = time.monotonic()
+        flushed = []
+        with self.lock:
+            for sensor_id, held_at in list(self._held_at.items()):
+                if max_age is not None and now - held_at < max_age:
+                    continue
+                flushed.extend((sensor_id, sample) for sample in self._compressors[sensor_id].flush())
+                del self._held_at[sensor_id]
+        return flushed
+
+    def reset(self, sensor_id: Optional[int] = None) -> List[Tuple[int, Sample]]:
+        """Descarta el estado de un sensor (o de todos); devuelve las muestras retenidas para guardarlas"""
+        with self.lock:
+            sensor_ids = list(self._compressors) if sensor_id is None else [sensor_id]
+            flushed = []
+            for sid in sensor_ids:
+                compressor = self._compressors.pop(sid, None)
+                self._held_at.pop(sid, None)
+                if compressor is not None:
+                    flushed.extend((sid, sample) for sample in compressor.flush())
+            return flushed
+
+
+def resample(points: List[Point], start: int, end: int, step: int, method: str = 'linear',
+             max_gap: Optional[int] = None) -> List[Tuple[int, Optional[float]]]:
+    """
+    Reconstruye la serie en instantes regulares [start, end] cada `step` segundos.
+
+    `method` es 'step' (se mantiene el último valor) o 'linear'. Si dos puntos
+    guardados están separados más de `max_gap` segundos se considera que no hubo
+    datos en el medio y el valor es None; lo mismo antes del primer punto y
+    después de `max_gap` segundos del último.
+    """
+    if method not in ('step', 'linear'):
+        raise ValueError(f"Método de interpolación desconocido: {method}")
+    times = [p[0] for p in points]
+    result = []
+    t = start
+    while t <= end:
+        idx = bisect_right(times, t) - 1
+        value = None
+        if idx >= 0:
+            t0, v0 = points[idx]
+            if idx + 1 < len(points):
+                t1, v1 = points[idx + 1]
+                if max_gap is None or t1 - t0 <= max_gap:
+                    value = v0 if method == 'step' else v0 + (v1 - v0) * (t - t0) / (t1 - t0)
+            elif t == t0 or max_gap is None or t - t0 <= max_gap:
+                value = v0
+        result.append((t, value))
+        t += step
+    return result
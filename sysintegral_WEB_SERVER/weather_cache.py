@@ -3,7 +3,7 @@ import threading
 import time
 from typing import Dict, Optional
 import requests
-import pytz
+import time_service
 
 class WeatherCache:
     def __init__(self, max_establishments: int = 20):
@@ -80,8 +80,8 @@ class WeatherCache:
         Obtiene datos meteorológicos para un establecimiento usando la API de MET Norway
         y los combina con datos actuales de OpenWeatherMap, asegurando que la hora actual esté representada.
         """
-        utc_tz = pytz.utc
-        argentina_tz = pytz.timezone('America/Argentina/Buenos_Aires')
+        utc_tz = time_service.UTC
+        argentina_tz = time_service.LOCAL_TZ
 
         # 1. Fetch MET Norway data
         raw_met_data_points = []
@@ -125,7 +125,7 @@ class WeatherCache:
 
         # 3. Determine current target UTC hour (rounded down)
             # Para determinar la hora UTC actual redondeada que corresponde al inicio de la hora local actual:
-        current_utc_time = datetime.now(utc_tz) # Hora UTC actual, ej: 18:55:57 UTC
+        current_utc_time = time_service.now_utc() # Hora UTC actual, ej: 18:55:57 UTC
         current_argentina_time_ref = current_utc_time.astimezone(argentina_tz) # Convertida a local, ej: 15:55:57 GMT-3
         
         # Redondear la hora local al inicio de la hora